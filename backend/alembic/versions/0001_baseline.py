@@ -0,0 +1,54 @@
+"""Baseline schema: users and workflows
+
+Revision ID: 0001_baseline
+Revises: 
+Create Date: 2025-06-20 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0001_baseline'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Databases created by the old create_all() at startup already have these tables
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if "users" not in tables:
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("username", sa.String(), unique=True),
+            sa.Column("password", sa.String()),
+            sa.Column("gmail_access_token", sa.String()),
+            sa.Column("gmail_refresh_token", sa.String()),
+            sa.Column("gmail_token_expiry", sa.DateTime()),
+        )
+    else:
+        # Some early databases predate the Gmail token columns
+        columns = {column["name"] for column in sa.inspect(op.get_bind()).get_columns("users")}
+        for name, column_type in (("gmail_access_token", sa.String()), ("gmail_refresh_token", sa.String()),
+                                  ("gmail_token_expiry", sa.DateTime())):
+            if name not in columns:
+                op.add_column("users", sa.Column(name, column_type))
+    if "workflows" not in tables:
+        op.create_table(
+            "workflows",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("name", sa.String()),
+            sa.Column("workflow_json", sa.Text()),
+            sa.Column("owner_id", sa.Integer(), sa.ForeignKey("users.id")),
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("workflows")
+    op.drop_table("users")
@@ -0,0 +1,33 @@
+"""Workflow version and updated_at (plan cache keys)
+
+Revision ID: 0002_workflow_version
+Revises: 0001_baseline
+Create Date: 2025-07-01 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0002_workflow_version'
+down_revision: Union[str, Sequence[str], None] = '0001_baseline'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    columns = {column["name"] for column in sa.inspect(op.get_bind()).get_columns("workflows")}
+    if "version" not in columns:
+        op.add_column("workflows", sa.Column("version", sa.Integer(), nullable=False, server_default="1"))
+    if "updated_at" not in columns:
+        op.add_column("workflows", sa.Column("updated_at", sa.DateTime()))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("workflows") as batch:
+        batch.drop_column("updated_at")
+        batch.drop_column("version")
@@ -0,0 +1,45 @@
+"""Workflow runs with per-step progress and checkpoints
+
+Revision ID: 0003_workflow_runs
+Revises: 0002_workflow_version
+Create Date: 2025-07-02 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0003_workflow_runs'
+down_revision: Union[str, Sequence[str], None] = '0002_workflow_version'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if "workflow_runs" in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        "workflow_runs",
+        sa.Column("id", sa.String(), primary_key=True),
+        sa.Column("workflow_id", sa.String()),
+        sa.Column("workflow_version", sa.String()),
+        sa.Column("owner_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("status", sa.String()),
+        sa.Column("workflow_json", sa.Text()),
+        sa.Column("steps_json", sa.Text()),
+        sa.Column("context_json", sa.Text()),
+        sa.Column("error", sa.Text()),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("started_at", sa.DateTime()),
+        sa.Column("finished_at", sa.DateTime()),
+    )
+    op.create_index("ix_workflow_runs_workflow_id", "workflow_runs", ["workflow_id"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_workflow_runs_workflow_id", table_name="workflow_runs")
+    op.drop_table("workflow_runs")
@@ -0,0 +1,39 @@
+"""Gmail historyId cursors per user and workflow
+
+Revision ID: 0004_gmail_cursors
+Revises: 0003_workflow_runs
+Create Date: 2025-07-10 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0004_gmail_cursors'
+down_revision: Union[str, Sequence[str], None] = '0003_workflow_runs'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if "gmail_cursors" in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        "gmail_cursors",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("workflow_id", sa.String()),
+        sa.Column("history_id", sa.String()),
+        sa.Column("updated_at", sa.DateTime()),
+        sa.UniqueConstraint("user_id", "workflow_id"),
+    )
+    op.create_index("ix_gmail_cursors_user_id", "gmail_cursors", ["user_id"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_gmail_cursors_user_id", table_name="gmail_cursors")
+    op.drop_table("gmail_cursors")
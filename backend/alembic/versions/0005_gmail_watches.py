@@ -0,0 +1,39 @@
+"""Gmail push watches per user
+
+Revision ID: 0005_gmail_watches
+Revises: 0004_gmail_cursors
+Create Date: 2025-07-15 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0005_gmail_watches'
+down_revision: Union[str, Sequence[str], None] = '0004_gmail_cursors'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if "gmail_watches" in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        "gmail_watches",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), unique=True),
+        sa.Column("email_address", sa.String()),
+        sa.Column("history_id", sa.String()),
+        sa.Column("expiration", sa.DateTime()),
+        sa.Column("updated_at", sa.DateTime()),
+    )
+    op.create_index("ix_gmail_watches_email_address", "gmail_watches", ["email_address"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_gmail_watches_email_address", table_name="gmail_watches")
+    op.drop_table("gmail_watches")
@@ -0,0 +1,37 @@
+"""Run durations, step timings and the run history index
+
+Revision ID: 0006_run_history
+Revises: 0005_gmail_watches
+Create Date: 2025-08-01 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0006_run_history'
+down_revision: Union[str, Sequence[str], None] = '0005_gmail_watches'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    columns = {column["name"] for column in inspector.get_columns("workflow_runs")}
+    if "duration_ms" not in columns:
+        op.add_column("workflow_runs", sa.Column("duration_ms", sa.Integer()))
+    if "step_timings_json" not in columns:
+        op.add_column("workflow_runs", sa.Column("step_timings_json", sa.Text()))
+    if "ix_workflow_runs_workflow_created" not in {index["name"] for index in inspector.get_indexes("workflow_runs")}:
+        op.create_index("ix_workflow_runs_workflow_created", "workflow_runs", ["workflow_id", "created_at"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_workflow_runs_workflow_created", table_name="workflow_runs")
+    with op.batch_alter_table("workflow_runs") as batch:
+        batch.drop_column("step_timings_json")
+        batch.drop_column("duration_ms")
@@ -0,0 +1,42 @@
+"""Workflow step_count for listings, indexed owner_id
+
+Revision ID: 0007_workflow_summaries
+Revises: 0006_run_history
+Create Date: 2025-08-05 00:00:00
+
+"""
+import json
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0007_workflow_summaries'
+down_revision: Union[str, Sequence[str], None] = '0006_run_history'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if "step_count" not in {column["name"] for column in inspector.get_columns("workflows")}:
+        op.add_column("workflows", sa.Column("step_count", sa.Integer()))
+    if "ix_workflows_owner_id" not in {index["name"] for index in inspector.get_indexes("workflows")}:
+        op.create_index("ix_workflows_owner_id", "workflows", ["owner_id"])
+
+    # Plain UPDATEs: version and updated_at stay as they were (the version keys the plan cache)
+    workflows = sa.table("workflows", sa.column("id"), sa.column("workflow_json"), sa.column("step_count"))
+    rows = bind.execute(sa.select(workflows.c.id, workflows.c.workflow_json).where(workflows.c.step_count.is_(None)))
+    for row in rows.all():
+        steps = json.loads(row.workflow_json or "{}").get("workflow") or []
+        bind.execute(sa.update(workflows).where(workflows.c.id == row.id).values(step_count=len(steps)))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_workflows_owner_id", table_name="workflows")
+    with op.batch_alter_table("workflows") as batch:
+        batch.drop_column("step_count")
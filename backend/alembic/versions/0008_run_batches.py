@@ -0,0 +1,30 @@
+"""OpenAI Batch API jobs of waiting runs
+
+Revision ID: 0008_run_batches
+Revises: 0007_workflow_summaries
+Create Date: 2025-08-20 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0008_run_batches'
+down_revision: Union[str, Sequence[str], None] = '0007_workflow_summaries'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    columns = {column["name"] for column in sa.inspect(op.get_bind()).get_columns("workflow_runs")}
+    if "pending_batches_json" not in columns:
+        op.add_column("workflow_runs", sa.Column("pending_batches_json", sa.Text()))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("workflow_runs") as batch:
+        batch.drop_column("pending_batches_json")
@@ -0,0 +1,30 @@
+"""Answers collected from the OpenAI Batch API jobs of a run
+
+Revision ID: 0009_run_batch_answers
+Revises: 0008_run_batches
+Create Date: 2025-08-25 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0009_run_batch_answers'
+down_revision: Union[str, Sequence[str], None] = '0008_run_batches'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    columns = {column["name"] for column in sa.inspect(op.get_bind()).get_columns("workflow_runs")}
+    if "batch_answers_json" not in columns:
+        op.add_column("workflow_runs", sa.Column("batch_answers_json", sa.Text()))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("workflow_runs") as batch:
+        batch.drop_column("batch_answers_json")
@@ -0,0 +1,212 @@
+# backend/benchmarks/bench_engine.py
+"""
+Micro-benchmarks for the workflow engine and the registered step handlers.
+
+Runs synthetic DAGs (10/100/1000 steps, several shapes) through plan compilation
+and execution with the real STEP_REGISTRY handlers, backed by in-process fakes
+for Gmail, Notion, OpenAI and Redis. Prints (or writes) a JSON report.
+
+    cd backend
+    python -m benchmarks.bench_engine --output ../bench_output.txt
+    python -m benchmarks.bench_engine --compare ../bench_output.txt
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import math
+import platform
+import random
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+import services.llm_batch as llm_batch
+import services.run_log as run_log
+import services.step_cache as step_cache
+import services.step_registry as step_registry
+from benchmarks.fakes import FakeRedis, FakeServices
+from services.executor import execute_plan
+from services.plan import PlanCache, compile_workflow
+from services.step_registry import STEP_REGISTRY
+
+SIZES = (10, 100, 1000)
+SHAPES = ("chain", "fanout", "layered", "random")
+
+
+def install_fakes(services, redis_client):
+    """Points the service modules at the in-process fakes."""
+    step_registry.check_new_email = services.check_new_email
+    step_registry.iter_new_email = services.iter_new_email
+    step_registry.get_valid_gmail_token = services.get_valid_gmail_token
+    step_registry.create_notion_page = services.create_notion_page
+    llm_batch.get_async_openai_client = services.openai_client
+    run_log.r = redis_client
+    step_cache.r = redis_client
+
+
+def build_workflow(size, shape, seed=0, step_cache_enabled=False):
+    """Synthetic workflow: one Gmail trigger followed by alternating OpenAI/Notion actions."""
+    rng = random.Random(seed)
+    steps = [{"id": "s0", "type": "trigger", "service": "gmail", "action": "new_email", "incremental": False}]
+    for i in range(1, size):
+        service = "openai" if i % 2 else "notion"
+        step = {"id": f"s{i}", "type": "action", "service": service, "action": "run"}
+        if service == "openai":
+            step["prompt"] = f"Summarize for step {i}:"
+            step["cache"] = step_cache_enabled
+        steps.append(step)
+
+    edges = []
+    if shape == "chain":
+        edges = [{"source": f"s{i - 1}", "target": f"s{i}"} for i in range(1, size)]
+    elif shape == "fanout":
+        edges = [{"source": "s0", "target": f"s{i}"} for i in range(1, size)]
+    elif shape == "layered":
+        width = max(1, int(math.sqrt(size)))
+        for i in range(1, size):
+            layer_start = ((i - 1) // width) * width + 1
+            if layer_start == 1:
+                parents = [0]
+            else:
+                previous = range(layer_start - width, layer_start)
+                parents = rng.sample(list(previous), min(2, len(previous)))
+            edges += [{"source": f"s{p}", "target": f"s{i}"} for p in parents]
+    elif shape == "random":
+        for i in range(1, size):
+            parents = rng.sample(range(i), min(i, rng.randint(1, 3)))
+            edges += [{"source": f"s{p}", "target": f"s{i}"} for p in parents]
+    else:
+        raise ValueError(f"Unknown shape: {shape}")
+    return {"workflow": steps, "edges": edges}
+
+
+def _timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def _summary(samples):
+    ordered = sorted(samples)
+    return {
+        "min_ms": round(ordered[0], 4),
+        "median_ms": round(statistics.median(ordered), 4),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 4),
+        "max_ms": round(ordered[-1], 4),
+    }
+
+
+def bench_case(size, shape, repeat, max_workers, latency_ms, step_cache_enabled):
+    services = FakeServices(latency_ms=latency_ms)
+    install_fakes(services, FakeRedis())
+    workflow = build_workflow(size, shape, step_cache_enabled=step_cache_enabled)
+    steps, edges = workflow["workflow"], workflow["edges"]
+    tokens = {"gmail_token": "fake", "notion_token": "fake", "user": None}
+
+    planning = _timed(lambda: compile_workflow(steps, edges, STEP_REGISTRY), repeat)
+    cache = PlanCache()
+    cache.put("bench", 1, compile_workflow(steps, edges, STEP_REGISTRY))
+    cached_planning = _timed(lambda: cache.get_or_compile("bench", 1, lambda: workflow, STEP_REGISTRY), repeat)
+
+    plan = cache.get("bench", 1)
+
+    def run_once():
+        log = run_log.RunLogger(f"bench:{shape}:{size}", client=run_log.r)
+        try:
+            asyncio.run(execute_plan(plan, tokens, log=log, max_workers=max_workers))
+        finally:
+            log.close()
+
+    run_once()  # Warm-up (thread pool, imports)
+    runs = _timed(run_once, repeat)
+
+    tracemalloc.start()
+    run_once()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "size": size,
+        "shape": shape,
+        "levels": len(plan.levels),
+        "run": _summary(runs),
+        "planning": _summary(planning),
+        "cached_planning": _summary(cached_planning),
+        "alloc_peak_kib": round(peak / 1024, 1),
+        "alloc_retained_kib": round(current / 1024, 1),
+        "outbound_calls": {name: count // (repeat + 2) for name, count in services.calls.items()},
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline):
+    """Prints the median run/planning time of each case relative to a baseline report."""
+    previous = {(case["size"], case["shape"]): case for case in baseline["results"]}
+    for case in report["results"]:
+        old = previous.get((case["size"], case["shape"]))
+        if not old:
+            continue
+        for metric in ("run", "planning"):
+            ratio = case[metric]["median_ms"] / max(old[metric]["median_ms"], 1e-9)
+            flag = "  <-- slower" if ratio > 1.1 else ""
+            print(f"{case['shape']:>8} {case['size']:>5} {metric:>9}: "
+                  f"{old[metric]['median_ms']:.3f} -> {case[metric]['median_ms']:.3f} ms ({ratio:.2f}x){flag}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    parser.add_argument("--shapes", nargs="+", default=list(SHAPES), choices=SHAPES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-workers", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=1.0, help="simulated latency of each fake API call")
+    parser.add_argument("--step-cache", action="store_true", help="let OpenAI steps use the step result cache")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    parser.add_argument("--compare", help="baseline JSON report to compare against")
+    args = parser.parse_args(argv)
+
+    results = []
+    for size in args.sizes:
+        for shape in args.shapes:
+            # Handlers print debug lines; keep them out of the report
+            with contextlib.redirect_stdout(io.StringIO()):
+                results.append(bench_case(size, shape, args.repeat, args.max_workers, args.latency_ms, args.step_cache))
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "repeat": args.repeat,
+            "max_workers": args.max_workers,
+            "latency_ms": args.latency_ms,
+            "step_cache": args.step_cache,
+            "timestamp": time.time(),
+        },
+        "results": results,
+    }
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    elif not args.compare:
+        print(text)
+    return report
+
+
+if __name__ == "__main__":
+    main()
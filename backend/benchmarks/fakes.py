@@ -0,0 +1,156 @@
+# backend/benchmarks/fakes.py
+# In-process stand-ins for Gmail, Notion, OpenAI and Redis used by the benchmarks.
+import asyncio
+import fnmatch
+import json
+import re
+import time
+from types import SimpleNamespace
+
+
+class FakeRedis:
+    """Tiny in-memory subset of the redis-py client API used by the services."""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+        return True
+
+    def delete(self, *keys):
+        return sum(1 for key in keys if self.data.pop(key, None) is not None)
+
+    def rpush(self, key, *values):
+        self.data.setdefault(key, []).extend(values)
+        return len(self.data[key])
+
+    def llen(self, key):
+        return len(self.data.get(key, []))
+
+    def lrange(self, key, start, end):
+        values = self.data.get(key, [])
+        return values[start:] if end == -1 else values[start:end + 1]
+
+    def xadd(self, key, fields, maxlen=None, approximate=True):
+        entries = self.data.setdefault(key, [])
+        entry_id = f"{len(entries) + 1}-0"
+        entries.append((entry_id, dict(fields)))
+        if maxlen is not None:
+            del entries[:-maxlen]
+        return entry_id
+
+    def xrange(self, key, min="-", max="+", count=None):
+        start = 0 if min == "-" else int(min.split("-")[0])
+        entries = [entry for entry in self.data.get(key, []) if int(entry[0].split("-")[0]) >= start]
+        return entries[:count]
+
+    def hincrby(self, key, field, amount=1):
+        table = self.data.setdefault(key, {})
+        table[field] = int(table.get(field, 0)) + amount
+        return table[field]
+
+    def hincrbyfloat(self, key, field, amount=1.0):
+        table = self.data.setdefault(key, {})
+        table[field] = float(table.get(field, 0)) + amount
+        return table[field]
+
+    def hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+    def zadd(self, key, mapping):
+        self.data.setdefault(key, {}).update(mapping)
+        return len(mapping)
+
+    def zcard(self, key):
+        return len(self.data.get(key, {}))
+
+    def zpopmin(self, key, count=1):
+        members = sorted(self.data.get(key, {}).items(), key=lambda item: item[1])[:count]
+        for member, _ in members:
+            del self.data[key][member]
+        return members
+
+    def expire(self, key, seconds):
+        return key in self.data
+
+    def keys(self, pattern="*"):
+        return [key for key in self.data if fnmatch.fnmatch(key, pattern)]
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        results = [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+        self.calls = []
+        return results
+
+
+def fake_emails(count=10):
+    return [
+        {
+            "from": f"sender{i}@example.com",
+            "subject": f"Benchmark email {i}",
+            "body": "Lorem ipsum dolor sit amet, consectetur adipiscing elit."[:100],
+            "date": "2025-01-01T00:00:00",
+        }
+        for i in range(count)
+    ]
+
+
+class FakeServices:
+    """Fake Gmail/Notion/OpenAI backends with a fixed simulated I/O latency."""
+
+    def __init__(self, latency_ms=1.0, email_count=10):
+        self.latency = latency_ms / 1000
+        self.email_count = email_count
+        self.calls = {"gmail": 0, "notion": 0, "openai": 0}
+
+    def check_new_email(self, token=None, full=False):
+        self.calls["gmail"] += 1
+        time.sleep(self.latency)
+        return fake_emails(self.email_count)
+
+    def iter_new_email(self, token=None, full=False):
+        for email in fake_emails(self.email_count):
+            self.calls["gmail"] += 1
+            time.sleep(self.latency)
+            yield email
+
+    def get_valid_gmail_token(self, user):
+        return "fake-gmail-token"
+
+    def create_notion_page(self, token, title="New Page", content="", parent_id=None, parent_type="page_id"):
+        self.calls["notion"] += 1
+        time.sleep(self.latency)
+        return {"object": "page", "id": f"page-{self.calls['notion']}", "title": title}
+
+    def openai_client(self, api_key=None, **kwargs):
+        services = self
+
+        async def create(**params):
+            services.calls["openai"] += 1
+            await asyncio.sleep(services.latency)
+            prompt = params["messages"][0]["content"]
+            content = f"Summary of {len(prompt)} chars"
+            if params.get("response_format"):  # Coalesced multi-item request
+                count = int(re.search(r"each of the (\d+) items", prompt).group(1))
+                content = json.dumps({"results": [content] * count})
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+        return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
@@ -1,4 +1,6 @@
+import os
 from celery import Celery
+from celery.signals import worker_init, worker_process_init, worker_process_shutdown
 
 celery_app = Celery(
     "everything_connected",
@@ -6,4 +8,34 @@ celery_app = Celery(
     backend="redis://localhost:6379/0"
 )
 
+# Gmail watches expire after 7 days; renew the ones close to expiry twice a day.
+# Runs waiting on OpenAI Batch API jobs are checked every OPENAI_BATCH_POLL_SECONDS.
+celery_app.conf.beat_schedule = {
+    "renew-gmail-watches": {
+        "task": "tasks.renew_gmail_watches_task",
+        "schedule": 12 * 3600,
+    },
+    "resume-waiting-runs": {
+        "task": "tasks.resume_waiting_runs_task",
+        "schedule": float(os.environ.get("OPENAI_BATCH_POLL_SECONDS", "60")),
+    },
+}
+
+@worker_init.connect
+@worker_process_init.connect
+def start_worker_metrics(**kwargs):
+    # Steps run in the pool children (prefork) or in the worker itself (solo/threads), so each
+    # of those processes pushes its metrics to Redis, where the API's /metrics merges them
+    from services.metrics import start_metrics_flusher
+    start_metrics_flusher()
+
+
+@worker_process_shutdown.connect
+def flush_worker_metrics(**kwargs):
+    from services.metrics import flush_metrics
+    try:
+        flush_metrics()
+    except Exception as e:
+        print("Metrics flush failed:", e)
+
 import tasks  # <-- Add this line to ensure tasks are registered
\ No newline at end of file
@@ -1,8 +1,9 @@
 # backend/database.py
 # Placeholder for future DB integration
+import os
+
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from models.db import Base
 
 DATABASE_URL = "sqlite:///./test.db"
 
@@ -10,7 +11,17 @@ engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 def init_db():
-    Base.metadata.create_all(bind=engine)
+    # The schema is managed by Alembic (`alembic upgrade head` from backend/); only check it here
+    try:
+        from alembic.migration import MigrationContext
+        from alembic.script import ScriptDirectory
+    except ImportError:
+        return
+    script = ScriptDirectory(os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic"))
+    with engine.connect() as conn:
+        current = MigrationContext.configure(conn).get_current_revision()
+    if current != script.get_current_head():
+        print(f"Database schema is at {current}, expected {script.get_current_head()}: run `alembic upgrade head`")
 
     
 def save_to_db(data):
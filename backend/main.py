@@ -1,4 +1,5 @@
 # backend/main.py
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from routers import workflows, auth
 from fastapi.middleware.cors import CORSMiddleware
@@ -7,10 +8,21 @@ from dotenv import load_dotenv
 import os
 from routers import notion_oauth
 from starlette.middleware.sessions import SessionMiddleware
+from fastapi.responses import Response
+from services import metrics
+import redis
 
 load_dotenv()
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app):
+    # With several API processes a scrape reaches only one, so the others flush on their own
+    metrics.start_metrics_flusher()
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
 import secrets
 
 secret_key = os.environ.get("SESSION_SECRET_KEY", "dev-secret-key")
@@ -31,6 +43,18 @@ app.include_router(workflows.router, prefix="/workflows")
 app.include_router(auth.router)
 app.include_router(notion_oauth.router)
 
+
+@app.get("/metrics")
+def metrics_endpoint():
+    # Prometheus scrape endpoint: step latency histograms and outbound call counters,
+    # summed over this API and every Celery worker process (they all flush to Redis)
+    try:
+        body = metrics.render_shared()
+    except redis.RedisError as e:
+        print("Shared metrics unavailable, serving this process only:", e)
+        body = metrics.render()
+    return Response(body, media_type=metrics.CONTENT_TYPE)
+
 GOOGLE_CLIENT_ID = os.environ.get("GOOGLE_OAUTH_CLIENT_ID")
 GOOGLE_CLIENT_SECRET = os.environ.get("GOOGLE_OAUTH_CLIENT_SECRET")
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
\ No newline at end of file
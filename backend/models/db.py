@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, UniqueConstraint, Index
 from sqlalchemy.orm import declarative_base, relationship
+from datetime import datetime
 
 
 
@@ -22,6 +23,53 @@ class WorkflowDB(Base):
     id = Column(Integer, primary_key=True)
     name = Column(String)
     workflow_json = Column(Text)  # Store workflow+edges as JSON string
+    owner_id = Column(Integer, ForeignKey("users.id"), index=True)
+    version = Column(Integer, nullable=False, default=1)  # Bumped on every update, keys the plan cache
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    step_count = Column(Integer)  # Kept next to the JSON so listings don't have to parse it
+
+    owner = relationship("UserDB", back_populates="workflows")
+
+    __mapper_args__ = {"version_id_col": version}
+
+class WorkflowRunDB(Base):
+    __tablename__ = "workflow_runs"
+    id = Column(String, primary_key=True)  # Run id (uuid4)
+    workflow_id = Column(String, index=True)  # Saved workflow id, or "default" for ad-hoc runs
+    workflow_version = Column(String)  # WorkflowDB.version, or a content hash for ad-hoc runs
     owner_id = Column(Integer, ForeignKey("users.id"))
+    status = Column(String, default="queued")  # queued, running, waiting, succeeded, failed
+    workflow_json = Column(Text)  # Snapshot of the workflow+edges that was run
+    steps_json = Column(Text)  # {step_id: status} progress map
+    context_json = Column(Text)  # Final (or partial) context
+    error = Column(Text)
+    created_at = Column(DateTime)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    duration_ms = Column(Integer)  # started_at -> finished_at of the last attempt
+    step_timings_json = Column(Text)  # {step_id: milliseconds}
+    pending_batches_json = Column(Text)  # OpenAI Batch API jobs a "waiting" run resumes after (BatchPending.jobs)
+    batch_answers_json = Column(Text)  # {batch_key: answer} collected from the run's finished Batch API jobs
+
+    __table_args__ = (Index("ix_workflow_runs_workflow_created", "workflow_id", "created_at"),)  # Run history pages
+
 
-    owner = relationship("UserDB", back_populates="workflows")
\ No newline at end of file
+class GmailCursorDB(Base):
+    __tablename__ = "gmail_cursors"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    workflow_id = Column(String)  # Each workflow consumes the mailbox independently
+    history_id = Column(String)  # Gmail historyId the next sync starts from
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (UniqueConstraint("user_id", "workflow_id"),)
+
+
+class GmailWatchDB(Base):
+    __tablename__ = "gmail_watches"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), unique=True)
+    email_address = Column(String, index=True)  # Mailbox named in push notifications
+    history_id = Column(String)  # Latest historyId seen in a notification
+    expiration = Column(DateTime)  # Gmail stops publishing after this unless the watch is renewed
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
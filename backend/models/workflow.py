@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Optional, Any
+from typing import Dict, List, Optional, Any
 
 class Step(BaseModel):
     id: str  # <-- Add this line
@@ -7,6 +7,23 @@ class Step(BaseModel):
     service: str
     action: str
     parentId: Optional[str] = None
+    # notion "create_pages": parent kind ("page_id" or "database_id") and how items map to properties
+    parentType: Optional[str] = None
+    titleProperty: Optional[str] = None
+    propertyMap: Optional[Dict[str, str]] = None  # item key -> text property name
+    stream: bool = False  # trigger yields items one by one, downstream steps run per item
+    incremental: bool = True  # gmail trigger: only mail that arrived since the last run
+    format: Optional[str] = None  # gmail trigger: "full" fetches bodies up front instead of lazily
+    # "map" steps apply `substep` to every element of the list in context[items]
+    items: Optional[str] = None  # context key of the list, defaults to "trigger_data"
+    substep: Optional["Step"] = None
+    concurrency: Optional[int] = None  # max items processed at once
+    ordered: bool = True  # collect results in input order (False: completion order)
+    batch: Optional[str] = None  # openai: "offline" uses the Batch API (scheduled runs) instead of live requests
+    cache: Optional[bool] = None  # False: never serve this step from the step cache
+    cache_ttl: Optional[int] = None  # seconds a cached result stays valid, instead of the handler's default
+
+Step.model_rebuild()
 
 class Workflow(BaseModel):
     name: str                   # 🔹 add this line
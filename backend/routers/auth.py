@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from models.user import User
 from models.db import UserDB
 from database import SessionLocal
+from services.workflow_store import list_workflows
 
 router = APIRouter()
 
@@ -29,9 +30,10 @@ def login(user: User, db: Session = Depends(get_db)):
     db_user = db.query(UserDB).filter_by(username=user.username).first()
     if not db_user or db_user.password != user.password:
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    # Load workflows for this user
-    workflows = db_user.workflows
+    # First page of workflow summaries; definitions are fetched when a workflow is opened
+    workflows, next_cursor = list_workflows(db, db_user.id)
     return {
         "token": user.username,
-        "workflows": [w.workflow_json for w in workflows]
+        "workflows": workflows,
+        "next_cursor": next_cursor,
     }
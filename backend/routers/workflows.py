@@ -2,34 +2,41 @@
 
 from services.tool_registry import tool_registry
 from fastapi import APIRouter, HTTPException, Depends, Request, WebSocket, Body
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from models.workflow import Workflow
-from models.db import WorkflowDB, UserDB
+from models.db import WorkflowDB, UserDB, WorkflowRunDB
 from database import SessionLocal
 from services.gmail import check_new_email
 from services.notion import create_notion_page
+import hmac
 import json
-from tasks import run_workflow_task 
-import openai
-
-from openai import OpenAI
-import redis
+from tasks import run_workflow_task, execute_run_task
 import asyncio
+import redis
 import requests
 
 import os
 import logging
-import uuid
 from datetime import datetime, timedelta
 
+from services.run_log import log_to_redis, read_run_log
+from services.log_hub import get_log_hub
+from services.runner import create_run, run_to_dict, list_runs
+from services.workflow_store import (
+    get_user_id, list_workflows, step_count, workflow_definition, workflow_summary,
+)
+from services.plan import compile_workflow
 from services.step_registry import STEP_REGISTRY
+from services.step_cache import cache_key, get_cached, set_cached, cache_stats
+from services.llm_batch import get_coalescer
+from services import gmail_push
+from services.token_manager import token_manager
 
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 
 from pydantic import BaseModel
 
-r = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
-
 # Configure logging once, ideally in main.py
 logging.basicConfig(
     level=logging.INFO,
@@ -38,10 +45,6 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
-def log_to_redis(workflow_id, message):
-    print(f"[LOG] [{workflow_id}] {message}")  # Debug print
-    r.rpush(f"workflow:{workflow_id}:log", message)
-
 class ScheduleRequest(BaseModel):
     workflow_id: int
     schedule: int
@@ -82,114 +85,127 @@ def schedule_workflow(req: ScheduleRequest):
 
 @router.get("/user/{username}")
 def get_user_workflows(username: str, db: Session = Depends(get_db)):
-    user = db.query(UserDB).filter_by(username=username).first()
-    if not user:
+    # Every workflow with its full definition; listings should use /user/{username}/list instead
+    user_id = get_user_id(db, username)
+    if user_id is None:
         raise HTTPException(status_code=404, detail="User not found")
-    
-     # Attach DB id to each workflow
-    workflows = []
-    for wf in user.workflows:
-        wf_data = json.loads(wf.workflow_json)
-        wf_data['id'] = wf.id
-        workflows.append(wf_data)
-    print(f"[BACKEND] Returning workflows for {username}: {json.dumps(workflows, indent=2)}")  # <-- LOG
-
+    workflows = [workflow_definition(wf) for wf in
+                 db.query(WorkflowDB).filter_by(owner_id=user_id).order_by(WorkflowDB.id)]
+    print(f"[BACKEND] Returning {len(workflows)} workflows for {username}")
     return workflows
 
+@router.get("/user/{username}/list")
+def list_user_workflows(username: str, limit: int = 50, cursor: str = None, db: Session = Depends(get_db)):
+    # Workflow summaries (id, name, step_count, version, updated_at); pass next_cursor back as cursor
+    user_id = get_user_id(db, username)
+    if user_id is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    try:
+        workflows, next_cursor = list_workflows(db, user_id, min(max(limit, 1), 200), cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return {"workflows": workflows, "next_cursor": next_cursor}
+
+@router.get("/definition/{workflow_id}")
+def get_workflow_definition(workflow_id: int, db: Session = Depends(get_db)):
+    wf = db.query(WorkflowDB).filter_by(id=workflow_id).first()
+    if not wf:
+        raise HTTPException(status_code=404, detail="Workflow not found")
+    return workflow_definition(wf)
+
 
 @router.post("/save")
 def save_workflow(workflow: Workflow, db: Session = Depends(get_db)):
     user = db.query(UserDB).filter_by(username=workflow.owner).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    wf_json = json.dumps(workflow.dict())
-    db_wf = WorkflowDB(name=workflow.name, workflow_json=wf_json, owner=user)
+    wf_data = workflow.dict()
+    try:
+        # Validation only: runs execute (and cache their plans) in the Celery workers
+        compile_workflow(wf_data["workflow"], wf_data["edges"], STEP_REGISTRY)
+    except (KeyError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid workflow: {str(e)}")
+    db_wf = WorkflowDB(name=workflow.name, workflow_json=json.dumps(wf_data), owner=user,
+                       step_count=step_count(wf_data))
     db.add(db_wf)
     db.commit()
-    return {"message": "Workflow saved"}
+    return {"message": "Workflow saved", "workflow": workflow_summary(db_wf)}
 
 @router.post("/run")
 def run_workflow(workflow: dict, request: Request, db: Session = Depends(get_db)):
-    request_id = str(uuid.uuid4())
-    workflow_id = workflow.get("id", "default")
-    log_to_redis(workflow_id, "------------------------------------------------------")
-    log_to_redis(workflow_id, "Workflow started.")
-    log_to_redis(workflow_id, str(workflow.get("workflow", [])))
-
+    # Persist a run record and hand the execution to a Celery worker
     gmail_token = request.headers.get("x-gmail-token")
     notion_token = request.headers.get("x-notion-token")
-    context = {}  # Initialize the mutable context dictionary
 
     # Fetch user from workflow['owner'] or session
     username = workflow.get("owner")
     user = db.query(UserDB).filter_by(username=username).first() if username else None
 
-    tokens = {
-        "gmail_token": gmail_token,
-        "notion_token": notion_token,
-        "user": user,  # Pass the user object
-    }    
-    steps = workflow.get("workflow", [])
-    log_to_redis(workflow_id, str(steps))
-    edges = workflow.get("edges", [])  # Get all edges
-
-    # Build graph representation
-    graph = {step["id"]: [] for step in steps}
-    for edge in edges:
-        source = edge["source"]
-        target = edge["target"]
-        graph[source].append(target)
-
-    # Perform topological sorting
-    def topological_sort(graph):
-        visited = set()
-        stack = []
-        result = []
-
-        def dfs(node):
-            if node in visited:
-                return
-            visited.add(node)
-            for neighbor in graph.get(node, []):
-                dfs(neighbor)
-            stack.append(node)
-
-        for node in graph:
-            dfs(node)
-
-        while stack:
-            result.append(stack.pop())
-        return result
-
-    execution_order = topological_sort(graph)
-    log_to_redis(workflow_id, f"Execution order: {execution_order}")
-
-    # Execute steps in order
-    for step_id in execution_order:
-        step = next((s for s in steps if s["id"] == step_id), None)
-        log_to_redis(workflow_id, f"step {step.get('service')}")
-        if not step:
-            continue
-        handler = STEP_REGISTRY.get((step.get("type"), step.get("service")))
-        if handler:
-            try:
-                result = handler(step, context, tokens)  # Pass context to each step
-                if result:
-                    context[f"{step.get('id')}_result"] = result  # Store step output in context
-                log_to_redis(workflow_id, f"Step {step_id} completed.")
-                log_to_redis(workflow_id, str(result))
-            except Exception as e:
-                log_to_redis(workflow_id, f"Error in step {step_id}: {str(e)}")
-                return {"error": f"Step {step_id} failed: {str(e)}"}
-
-    log_to_redis(workflow_id, "Workflow executed.")
+    run = create_run(db, workflow.get("id", "default"), json.dumps(workflow), user=user)
+    execute_run_task.delay(run.id, gmail_token=gmail_token, notion_token=notion_token)
+    log_to_redis(run.workflow_id, f"Workflow queued (run {run.id}).", run_id=run.id)
     return {
-        "message": "Workflow executed.",
-        "workflow_id": workflow_id,
-        "execution_order": execution_order,  # Return the execution order
-        "context": context,  # Return the final context
+        "message": "Workflow queued.",
+        "workflow_id": run.workflow_id,
+        "run_id": run.id,
+        "status": run.status,
     }
 
+@router.get("/runs")
+def get_runs(workflow_id: str = None, status: str = None, limit: int = 20, cursor: str = None,
+             db: Session = Depends(get_db)):
+    # Run history, newest first; pass next_cursor back as cursor for the following page
+    try:
+        runs, next_cursor = list_runs(db, workflow_id, status, min(max(limit, 1), 100), cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return {"runs": runs, "next_cursor": next_cursor}
+
+@router.get("/runs/{run_id}/log")
+def get_run_log(run_id: str, after: str = None, limit: int = 100, db: Session = Depends(get_db)):
+    # One run's log records after entry id `after`; pass next back as after for the following page
+    if not db.query(WorkflowRunDB.id).filter_by(id=run_id).first():
+        raise HTTPException(status_code=404, detail="Run not found")
+    try:
+        entries, next_after = read_run_log(run_id, after, min(max(limit, 1), 1000))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid log offset")
+    except redis.RedisError as e:
+        raise HTTPException(status_code=503, detail=f"Run log unavailable: {e}")
+    return {"run_id": run_id, "entries": [{"id": entry_id, **record} for entry_id, record in entries], "next": next_after}
+
+@router.get("/runs/{run_id}")
+def get_run(run_id: str, db: Session = Depends(get_db)):
+    run = db.query(WorkflowRunDB).filter_by(id=run_id).first()
+    if not run:
+        raise HTTPException(status_code=404, detail="Run not found")
+    return run_to_dict(run)
+
+@router.post("/runs/{run_id}/resume")
+def resume_run(run_id: str, request: Request, db: Session = Depends(get_db)):
+    # Restart a failed run from its first incomplete step, reusing the checkpointed context;
+    # a waiting run continues (with this request's tokens) if its OpenAI batch jobs are done
+    run = db.query(WorkflowRunDB).filter_by(id=run_id).first()
+    if not run:
+        raise HTTPException(status_code=404, detail="Run not found")
+    # Claim the run in one UPDATE so concurrent resumes (or the beat's resume_waiting_runs) can't both queue it
+    claimed = db.query(WorkflowRunDB).filter(
+        WorkflowRunDB.id == run_id, WorkflowRunDB.status.in_(("failed", "waiting"))
+    ).update({"status": "queued"}, synchronize_session=False)
+    db.commit()
+    if not claimed:
+        db.refresh(run)
+        raise HTTPException(status_code=409, detail=f"Run is {run.status}, only failed or waiting runs can be resumed")
+    db.refresh(run)
+    execute_run_task.delay(
+        run.id,
+        gmail_token=request.headers.get("x-gmail-token"),
+        notion_token=request.headers.get("x-notion-token"),
+        resume=True,
+    )
+    log_to_redis(run.workflow_id, f"Workflow resume queued (run {run.id}).", run_id=run.id)
+    return {"message": "Workflow resume queued.", "run_id": run.id, "status": run.status}
+
 @router.delete("/delete/{workflow_id}")
 def delete_workflow(workflow_id: int, db: Session = Depends(get_db)):
     wf = db.query(WorkflowDB).filter_by(id=workflow_id).first()
@@ -200,22 +216,30 @@ def delete_workflow(workflow_id: int, db: Session = Depends(get_db)):
     return {"message": "Workflow deleted"}
 
 @router.websocket("/ws/workflow_log/{workflow_id}")
-async def websocket_workflow_log(websocket: WebSocket, workflow_id: str):
+async def websocket_workflow_log(websocket: WebSocket, workflow_id: str, after: str = None):
+    # Each frame is a log record {"id", "message", "level", "ts", "run_id", "step", "size"};
+    # reconnect with ?after=<last id> to resume without missing lines
     print(f"[WS] Connection attempt for workflow_id: {workflow_id}")
     await websocket.accept()
-    last_index = r.llen(f"workflow:{workflow_id}:log")  # Start at the end
+
+    async def send_logs():
+        async for entry_id, record in get_log_hub().subscribe(workflow_id, after):
+            await websocket.send_text(json.dumps({"id": entry_id, **record}))
+
+    async def wait_for_disconnect():
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    # Watch the socket too, so a viewer that leaves while the log is quiet is unsubscribed right away
+    tasks = [asyncio.ensure_future(send_logs()), asyncio.ensure_future(wait_for_disconnect())]
     try:
-        while True:
-            logs = r.lrange(f"workflow:{workflow_id}:log", last_index, -1)
-            if logs:
-                for log in logs:
-                    print(f"[WS] Sending log to client: {log}")
-                    await websocket.send_text(log)
-                last_index += len(logs)
-            await asyncio.sleep(1)
-    except Exception as e:
-        print(f"[WS] Exception: {e}")
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.exception():
+                print(f"[WS] Exception: {task.exception()}")
     finally:
+        for task in tasks:
+            task.cancel()
         print(f"[WS] Connection closed for workflow_id: {workflow_id}")
 
 
@@ -251,23 +275,97 @@ def twilio_stub():
 
 # OpenAI routes
 
+def _sse(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+async def _generate_events(prompt, key, cached):
+    # Server-sent events: "delta" per generated piece, then "done" with the full result (or "error")
+    if cached is not None:
+        yield _sse("delta", {"delta": cached})
+        yield _sse("done", {"result": cached})
+        return
+    parts = []
+    try:
+        async for delta in get_coalescer().backend.stream(prompt, 300):
+            parts.append(delta)
+            yield _sse("delta", {"delta": delta})
+    except Exception as e:
+        yield _sse("error", {"error": str(e)})
+        return
+    result = "".join(parts)
+    yield _sse("done", {"result": result})
+    try:
+        await asyncio.to_thread(set_cached, key, result)
+    except redis.RedisError as e:
+        print("Step cache unavailable:", e)
+
 @router.post("/tools/openai/generate")
-def openai_generate(prompt: str = Body(...), api_key: str = Body(None)):
-    client = OpenAI(api_key=OPENAI_API_KEY)
+async def openai_generate(request: Request, prompt: str = Body(...), api_key: str = Body(None), stream: bool = Body(False)):
+    # {"stream": true} (or Accept: text/event-stream) streams tokens as SSE; otherwise one JSON response
+    key = cache_key("openai", "generate", {"model": "gpt-4.1-mini", "max_tokens": 300}, prompt)
+    cached = None
     try:
-        response = client.chat.completions.create(
-            model="gpt-4.1-mini",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.6,
-            max_tokens=300
+        hit, value = await asyncio.to_thread(get_cached, "openai", "generate", key)
+        if hit:
+            cached = value
+    except redis.RedisError as e:
+        print("Step cache unavailable:", e)
+    if stream or "text/event-stream" in request.headers.get("accept", ""):
+        return StreamingResponse(
+            _generate_events(prompt, key, cached),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
         )
-        return {"result": response.choices[0].message.content}
+    if cached is not None:
+        return {"result": cached}
+    try:
+        # Never coalesced: a shared multi-item request would mix different users' prompts
+        result = await get_coalescer().backend.complete(prompt, 300)
     except Exception as e:
         return {"error": str(e)}
+    try:
+        await asyncio.to_thread(set_cached, key, result)
+    except redis.RedisError as e:
+        print("Step cache unavailable:", e)
+    return {"result": result}
+
+@router.get("/cache/stats")
+def step_cache_stats():
+    return cache_stats()
 
 
 # Gmail routes 
 
+@router.post("/gmail/push")
+def gmail_push_notification(envelope: dict, token: str = None, db: Session = Depends(get_db)):
+    # Pub/Sub push endpoint for Gmail watch notifications. Any 2xx acks the message,
+    # so only answer an error when a redelivery could succeed.
+    # Without a configured secret anyone could queue runs for any mailbox, so refuse everything
+    if not gmail_push.GMAIL_PUSH_TOKEN or not hmac.compare_digest(token or "", gmail_push.GMAIL_PUSH_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid push token")
+    try:
+        email_address, history_id = gmail_push.decode_notification(envelope)
+    except ValueError as e:
+        print(e)
+        return {"runs": []}  # Retrying a malformed message won't fix it
+    run_ids = gmail_push.dispatch_notification(
+        db, email_address, history_id, enqueue=lambda run_id: execute_run_task.delay(run_id)
+    )
+    return {"runs": run_ids}
+
+@router.post("/gmail/watch/{username}")
+def gmail_watch(username: str, db: Session = Depends(get_db)):
+    user = db.query(UserDB).filter_by(username=username).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    try:
+        watch = gmail_push.start_watch(db, user)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not watch:
+        raise HTTPException(status_code=502, detail="Gmail watch request failed")
+    return {"email_address": watch.email_address, "history_id": watch.history_id, "expiration": watch.expiration.isoformat()}
+
 
 @router.post("/exchange_gmail_code")
 async def exchange_gmail_code(data: dict, db: Session = Depends(get_db)):
@@ -291,6 +389,7 @@ async def exchange_gmail_code(data: dict, db: Session = Depends(get_db)):
         if expires_in:
             user.gmail_token_expiry = datetime.utcnow() + timedelta(seconds=expires_in)
         db.commit()
+        token_manager.invalidate("gmail", user.id)
 
         return {
             "gmail_access_token": user.gmail_access_token,
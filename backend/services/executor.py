@@ -0,0 +1,301 @@
+# backend/services/executor.py
+import asyncio
+import inspect
+import os
+import reprlib
+import threading
+import time
+
+from services.llm_batch import BatchPending
+from services.metrics import record_step
+from services.plan import compile_workflow
+
+# Max number of steps running at the same time within one dependency level
+MAX_WORKERS = int(os.environ.get("WORKFLOW_MAX_WORKERS", "8"))
+# Default number of items a map step processes at the same time
+MAP_CONCURRENCY = int(os.environ.get("WORKFLOW_MAP_CONCURRENCY", "5"))
+
+# Bounded repr for logging step results: whole email lists would otherwise be stringified per step
+_preview = reprlib.Repr()
+_preview.maxstring = 200
+_preview.maxother = 200
+_preview.maxlist = _preview.maxdict = 5
+
+
+class StepExecutionError(Exception):
+    """Raised when a step handler fails; carries the id of the failing step."""
+
+    def __init__(self, step_id, error):
+        super().__init__(f"Step {step_id} failed: {error}")
+        self.step_id = step_id
+        self.error = error
+
+
+async def run_handler(handler, step, context, tokens):
+    """
+    Runs a step handler. Coroutine handlers are awaited on the event loop,
+    legacy blocking handlers are offloaded to a worker thread.
+    """
+    start = time.perf_counter()
+    try:
+        if inspect.iscoroutinefunction(handler):
+            result = await handler(step, context, tokens)
+        else:
+            result = await asyncio.to_thread(handler, step, context, tokens)
+    except BatchPending:
+        raise  # Not a failure: the step finishes when its batch does
+    except Exception:
+        record_step(step, time.perf_counter() - start, error=True)
+        raise
+    record_step(step, time.perf_counter() - start)
+    return result
+
+
+async def iterate_items(source, queue_size):
+    """
+    Async-iterates over what a streaming handler returned: an async generator is
+    consumed directly, a sync generator is pulled on a worker thread. The buffer
+    between producer and consumers holds at most `queue_size` items.
+    """
+    if inspect.isasyncgen(source):
+        async for item in source:
+            yield item
+        return
+
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=queue_size)
+    done = object()
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for item in source:
+                if stop.is_set():
+                    return
+                # Blocks the producer thread while the buffer is full
+                asyncio.run_coroutine_threadsafe(queue.put((item, None)), loop).result()
+        except Exception as e:
+            asyncio.run_coroutine_threadsafe(queue.put((done, e)), loop).result()
+            return
+        asyncio.run_coroutine_threadsafe(queue.put((done, None)), loop).result()
+
+    producer = loop.run_in_executor(None, produce)
+    try:
+        while True:
+            item, error = await queue.get()
+            if item is done:
+                break
+            yield item
+    finally:
+        # Consumer stopped early: unblock the producer thread and let it exit
+        stop.set()
+        while not producer.done():
+            while not queue.empty():
+                queue.get_nowait()
+            await asyncio.sleep(0.01)
+    await producer
+    if error:
+        raise error
+
+
+async def run_stream(plan, source_id, context, tokens, log, on_step, max_workers):
+    """
+    Runs a streaming source step: every item it yields flows through the downstream
+    consumer steps right away, up to `max_workers` items at a time. Each consumer's
+    per-item outputs are collected, in item order, under "<id>_result".
+    The source's recorded duration covers producing all of its items.
+    Returns the number of items streamed.
+    """
+    consumers = plan.stream_sources[source_id]
+    step = plan.steps_by_id[source_id]
+    start = time.perf_counter()
+    try:
+        source = plan.handlers[source_id](step, context, tokens)
+    except Exception:
+        record_step(step, time.perf_counter() - start, error=True)
+        raise
+    outputs = {step_id: {} for step_id in consumers}
+    for step_id in consumers:
+        on_step(step_id, "running")
+
+    async def process(index, item):
+        # Each item gets its own view of the context, as if the trigger returned only that item
+        item_context = dict(context)
+        item_context["trigger_data"] = [item]
+        item_context["item"] = item
+        for step_id in consumers:
+            handler = plan.handlers[step_id]
+            if not handler:
+                continue
+            consumer = plan.steps_by_id[step_id]
+            try:
+                if consumer.get("type") == "map":
+                    result = await run_map(consumer, handler, item_context, tokens, log)
+                else:
+                    result = await run_handler(handler, consumer, item_context, tokens)
+            except Exception as e:
+                raise StepExecutionError(step_id, e)
+            if result:
+                item_context[f"{step_id}_result"] = result
+            outputs[step_id][index] = result
+        log(f"Item {index} from step {source_id} processed.")
+
+    pending = set()
+    count = 0
+    items = iterate_items(source, max_workers)
+    try:
+        async for item in items:
+            if len(pending) >= max_workers:
+                finished, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in finished:
+                    task.result()  # Surface the first failure
+            pending.add(asyncio.create_task(process(count, item)))
+            count += 1
+        if pending:
+            await asyncio.gather(*pending)
+    except Exception as e:
+        # A failing consumer is recorded against its own step, not the source
+        record_step(step, time.perf_counter() - start, error=not isinstance(e, StepExecutionError))
+        for task in pending:
+            task.cancel()
+        for step_id in consumers:
+            on_step(step_id, "failed")
+        raise
+    finally:
+        await items.aclose()
+    record_step(step, time.perf_counter() - start)
+
+    for step_id in consumers:
+        results = [outputs[step_id][index] for index in sorted(outputs[step_id])]
+        if results:
+            context[f"{step_id}_result"] = results
+        on_step(step_id, "completed")
+        log(f"Step {step_id} completed for {count} streamed items.")
+    return count
+
+
+async def run_map(step, handler, context, tokens, log):
+    """
+    Runs a map step: applies the sub-step handler to every element of
+    context[step["items"]] (default "trigger_data"), at most step["concurrency"]
+    items at a time. A failing item does not stop the others; each entry of the
+    returned list is {"index", "result"} or {"index", "error"}, in input order
+    unless step["ordered"] is false (then in completion order). If items wait
+    on Batch API jobs the whole step waits (raises BatchPending).
+    """
+    items = context.get(step.get("items") or "trigger_data") or []
+    if not isinstance(items, list):
+        items = [items]
+    substep = dict(step["substep"])
+    substep.setdefault("id", f"{step['id']}_item")
+    concurrency = step.get("concurrency") or MAP_CONCURRENCY
+    if substep.get("batch") == "offline":
+        concurrency = len(items)  # Offline items only queue into a Batch API job: let them all into one
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    results = []
+    waiting = []
+
+    async def apply(index, item):
+        # Each item gets its own view of the context, as if the trigger returned only that item
+        item_context = dict(context)
+        item_context["trigger_data"] = [item]
+        item_context["item"] = item
+        async with semaphore:
+            try:
+                entry = {"index": index, "result": await run_handler(handler, substep, item_context, tokens)}
+            except BatchPending as e:
+                waiting.append(e)
+                return
+            except Exception as e:
+                log(f"Error in step {step['id']} item {index}: {str(e)}")
+                entry = {"index": index, "error": str(e)}
+        results.append(entry)
+
+    await asyncio.gather(*(apply(index, item) for index, item in enumerate(items)))
+    if waiting:
+        raise BatchPending.merge(waiting)
+    if step.get("ordered", True):
+        results.sort(key=lambda entry: entry["index"])
+    failed = sum(1 for entry in results if "error" in entry)
+    log(f"Map step {step['id']} processed {len(results)} items, {failed} failed.")
+    return results
+
+
+async def execute_workflow(steps, edges, tokens, registry, **kwargs):
+    """Compiles the workflow without caching and runs it (see execute_plan)."""
+    plan = compile_workflow(steps, edges, registry)
+    return await execute_plan(plan, tokens, **kwargs)
+
+
+async def execute_plan(plan, tokens, context=None, log=print, max_workers=MAX_WORKERS, on_step=None, completed=()):
+    """
+    Runs a compiled plan level by level. Steps of the same level run concurrently,
+    at most `max_workers` at a time; each result is stored in context under
+    "<id>_result". `on_step(step_id, status)` is called as steps start
+    ("running"), finish ("completed"), fail ("failed") or wait on Batch API
+    jobs ("waiting"); after a level with waiting steps BatchPending is raised.
+    Steps listed in `completed` are skipped; their output is expected to be in
+    `context` already (resuming from a checkpoint). Streaming sources run their
+    downstream steps per item (see run_stream), so those are not scheduled again.
+    Returns (execution_order, context).
+    """
+    on_step = on_step or (lambda step_id, status: None)
+    context = {} if context is None else context
+    if completed:
+        log(f"Resuming, already completed: {sorted(completed)}")
+    streamed = {step_id for consumers in plan.stream_sources.values() for step_id in consumers}
+    levels = [
+        [step_id for step_id in level if step_id not in completed and step_id not in streamed]
+        for level in plan.levels
+    ]
+    levels = [level for level in levels if level]
+    log(f"Execution levels: {levels}")
+    semaphore = asyncio.Semaphore(max(1, max_workers))
+
+    async def run_step(step_id):
+        step = plan.steps_by_id[step_id]
+        log(f"step {step.get('service')}")
+        handler = plan.handlers[step_id]
+        if not handler:
+            return None
+        if step.get("type") == "map":
+            on_step(step_id, "running")
+            return await run_map(step, handler, context, tokens, log)
+        if step_id in plan.stream_sources:
+            on_step(step_id, "running")
+            count = await run_stream(plan, step_id, context, tokens, log, on_step, max(1, max_workers))
+            return {"items": count}
+        async with semaphore:
+            on_step(step_id, "running")
+            return await run_handler(handler, step, context, tokens)  # Pass context to each step
+
+    for level in levels:
+        # Wait for the whole level before surfacing a failure so no step is left running
+        results = await asyncio.gather(*(run_step(step_id) for step_id in level), return_exceptions=True)
+        failure = None
+        waiting = []
+        for step_id, result in zip(level, results):
+            pending = result.error if isinstance(result, StepExecutionError) else result  # Streamed consumers
+            if isinstance(pending, BatchPending):
+                log(f"Step {step_id} is waiting for OpenAI batch jobs.")
+                waiting.append(pending)
+                on_step(step_id, "waiting")
+                continue
+            if isinstance(result, Exception):
+                log(f"Error in step {step_id}: {str(result)}")
+                if not isinstance(result, StepExecutionError):
+                    result = StepExecutionError(step_id, result)
+                failure = failure or result
+                on_step(step_id, "failed")
+                continue
+            if result:
+                context[f"{step_id}_result"] = result  # Store step output in context
+            on_step(step_id, "completed")
+            log(f"Step {step_id} completed.")
+            log(_preview.repr(result))
+        if failure:
+            raise failure
+        if waiting:
+            raise BatchPending.merge(waiting)
+
+    return list(plan.order), context
@@ -1,81 +1,310 @@
 # backend/services/gmail.py
 import os
-import requests
+import re
+import json
 import base64
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
 from requests_oauthlib import OAuth2Session
 from models.db import UserDB
-from datetime import datetime, timedelta
+from datetime import datetime
+from services.metrics import track_call
+from services.http_pool import get_session
+from services.token_manager import token_manager
 
 GOOGLE_CLIENT_ID = os.environ.get("GOOGLE_OAUTH_CLIENT_ID")
 GOOGLE_CLIENT_SECRET = os.environ.get("GOOGLE_OAUTH_CLIENT_SECRET")
 
-def check_new_email(token=None):
-    if token:
-        headers = {
-            "Authorization": f"Bearer {token}"
-        }
-        resp = requests.get(
-            "https://gmail.googleapis.com/gmail/v1/users/me/messages",
+# Overridable so the fetch layer can be pointed at a local fake Gmail server
+GMAIL_API_BASE = os.environ.get("GMAIL_API_BASE", "https://gmail.googleapis.com")
+GMAIL_BATCH_SIZE = 50  # Gmail recommends at most 50 requests per batch
+GMAIL_FETCH_CONCURRENCY = int(os.environ.get("GMAIL_FETCH_CONCURRENCY", "5"))
+GMAIL_SYNC_MAX_MESSAGES = int(os.environ.get("GMAIL_SYNC_MAX_MESSAGES", "100"))
+PRIMARY_LABELS = {"INBOX", "CATEGORY_PERSONAL"}  # history equivalent of "category:primary"
+FULL_PARAMS = {"format": "full"}
+# Headers, snippet and date only; bodies are fetched lazily (see LazyEmail)
+METADATA_PARAMS = {
+    "format": "metadata",
+    "metadataHeaders": ["From", "Subject"],
+    "fields": "id,snippet,internalDate,payload/headers",
+}
+
+def list_message_ids(headers):
+    resp = get_session("gmail").get(
+        f"{GMAIL_API_BASE}/gmail/v1/users/me/messages",
+        headers=headers,
+        params={"maxResults": 10, "q": "category:primary"},
+    )
+    if resp.status_code != 200:
+        print("Failed to fetch Gmail messages:", resp.text)
+        return None
+
+    messages = resp.json().get("messages", [])
+    print(f"Found {len(messages)} messages.")
+    return [msg["id"] for msg in messages]
+
+def get_profile(headers):
+    """Mailbox profile: emailAddress, historyId, messagesTotal."""
+    resp = get_session("gmail").get(
+        f"{GMAIL_API_BASE}/gmail/v1/users/me/profile",
+        headers=headers,
+    )
+    if resp.status_code != 200:
+        print("Failed to fetch Gmail profile:", resp.text)
+        return None
+    return resp.json()
+
+def get_history_id(headers):
+    """Current historyId of the mailbox (the cursor to start incremental syncs from)."""
+    profile = get_profile(headers)
+    return profile.get("historyId") if profile else None
+
+def watch_mailbox(headers, topic_name, label_ids=("INBOX",)):
+    """
+    Asks Gmail to publish mailbox changes to the Pub/Sub topic `topic_name`.
+    Returns {"historyId", "expiration"} (expiration in ms since epoch) or None.
+    """
+    resp = get_session("gmail").post(
+        f"{GMAIL_API_BASE}/gmail/v1/users/me/watch",
+        headers=headers,
+        json={"topicName": topic_name, "labelIds": list(label_ids), "labelFilterBehavior": "include"},
+    )
+    if resp.status_code != 200:
+        print(f"Failed to start Gmail watch ({resp.status_code}):", resp.text)
+        return None
+    return resp.json()
+
+def list_history_message_ids(headers, start_history_id):
+    """
+    Ids of primary-inbox messages added since `start_history_id`, newest first, and the
+    new cursor. Returns None when the cursor is too old (Gmail answers 404) or on errors.
+    At most GMAIL_SYNC_MAX_MESSAGES (oldest first, whole history records) are returned per
+    call; the cursor then only moves past those, so the next sync picks up the rest.
+    """
+    message_ids = []
+    latest = start_history_id
+    page_token = None
+    while True:
+        params = {"startHistoryId": start_history_id, "historyTypes": "messageAdded"}
+        if page_token:
+            params["pageToken"] = page_token
+        resp = get_session("gmail").get(
+            f"{GMAIL_API_BASE}/gmail/v1/users/me/history",
             headers=headers,
-            params={"maxResults": 10, "q": "category:primary"}
-        )
+            params=params,
+            )
         if resp.status_code != 200:
-            print("Failed to fetch Gmail messages:", resp.text)
+            print(f"Failed to fetch Gmail history ({resp.status_code}):", resp.text)
             return None
+        data = resp.json()
+        for record in data.get("history", []):
+            added = []
+            for item in record.get("messagesAdded", []):
+                message = item.get("message", {})
+                if (PRIMARY_LABELS <= set(message.get("labelIds", PRIMARY_LABELS))
+                        and message["id"] not in message_ids and message["id"] not in added):
+                    added.append(message["id"])
+            if message_ids and len(message_ids) + len(added) > GMAIL_SYNC_MAX_MESSAGES:
+                return list(reversed(message_ids)), latest  # Stop before this record
+            message_ids.extend(added)
+            latest = record.get("id", latest)
+        page_token = data.get("nextPageToken")
+        if not page_token:
+            return list(reversed(message_ids)), data.get("historyId", latest)
 
-        messages = resp.json().get("messages", [])
-        print(f"Found {len(messages)} messages.")
-        if not messages:
-            return []
+def new_message_ids(headers, history_id=None):
+    """
+    Returns (message_ids, new_history_id). With a cursor only messages added since
+    then are listed; without one, or when it expired, falls back to the latest messages.
+    """
+    if history_id:
+        result = list_history_message_ids(headers, history_id)
+        if result is not None:
+            return result
+        print("Gmail history cursor expired, falling back to a full list")
+    latest = get_history_id(headers)  # Read the cursor first so nothing slips in between
+    return list_message_ids(headers), latest
+
+def get_message(msg_id, headers, params=None):
+    msg_detail = get_session("gmail").get(
+        f"{GMAIL_API_BASE}/gmail/v1/users/me/messages/{msg_id}",
+        headers=headers,
+        params=params or {"format": "full"},
+    )
+    if msg_detail.status_code != 200:
+        print(f"Failed to fetch Gmail message detail for {msg_id}: {msg_detail.text}")
+        return None
+    return msg_detail.json()
 
-        emails = []
-        for msg in messages:
-            msg_id = msg["id"]
-            msg_detail = requests.get(
-                f"https://gmail.googleapis.com/gmail/v1/users/me/messages/{msg_id}",
-                headers=headers,
-                params={"format": "full"}
+def fetch_email(msg_id, headers, full=False):
+    if full:
+        message = get_message(msg_id, headers, FULL_PARAMS)
+        return parse_email(message) if message else None
+    message = get_message(msg_id, headers, METADATA_PARAMS)
+    return parse_metadata(message, headers) if message else None
+
+def batch_get_messages(message_ids, headers, params=None):
+    """
+    Fetches message details through Gmail's multipart batch endpoint, one HTTP
+    round trip per GMAIL_BATCH_SIZE ids. Returns {msg_id: message_json}; ids the
+    batch could not serve (e.g. rate limited items) are left out.
+    """
+    query = urlencode(params or {"format": "full"}, doseq=True)
+    results = {}
+    for start in range(0, len(message_ids), GMAIL_BATCH_SIZE):
+        chunk = message_ids[start:start + GMAIL_BATCH_SIZE]
+        boundary = "batch_everything_connected"
+        body = "".join(
+            f"--{boundary}\r\n"
+            "Content-Type: application/http\r\n"
+            f"Content-ID: <item-{msg_id}>\r\n\r\n"
+            f"GET /gmail/v1/users/me/messages/{msg_id}?{query}\r\n"
+            "Accept: application/json\r\n\r\n"
+            for msg_id in chunk
+        ) + f"--{boundary}--\r\n"
+        resp = get_session("gmail").post(
+            f"{GMAIL_API_BASE}/batch/gmail/v1",
+            headers={**headers, "Content-Type": f"multipart/mixed; boundary={boundary}"},
+            data=body.encode("utf-8"),
             )
-            if msg_detail.status_code != 200:
-                print(f"Failed to fetch Gmail message detail for {msg_id}: {msg_detail.text}")
+        if resp.status_code != 200:
+            print(f"Gmail batch request failed: {resp.status_code} {resp.text[:200]}")
+            continue
+        for msg_id, (status, payload) in parse_batch_response(resp).items():
+            if status == 200:
+                results[msg_id] = json.loads(payload)
+            else:
+                print(f"Gmail batch item {msg_id} failed with {status}")
+    return results
+
+def parse_batch_response(resp):
+    """Splits a multipart/mixed batch response into {msg_id: (status, body)}."""
+    match = re.search(r'boundary="?([^";]+)"?', resp.headers.get("Content-Type", ""))
+    if not match:
+        raise RuntimeError("Gmail batch response has no multipart boundary")
+    parts = {}
+    for part in resp.text.split(f"--{match.group(1)}"):
+        part = part.replace("\r\n", "\n").strip()
+        if not part or part == "--":
+            continue
+        outer_headers, _, inner = part.partition("\n\n")
+        content_id = re.search(r"Content-ID:\s*<response-item-(.+?)>", outer_headers, re.IGNORECASE)
+        if not content_id:
+            continue
+        inner_headers, _, payload = inner.partition("\n\n")
+        status = int(inner_headers.split("\n", 1)[0].split()[1])
+        parts[content_id.group(1)] = (status, payload)
+    return parts
+
+def get_messages(message_ids, headers, params=None):
+    """
+    Fetches message details for `message_ids`, in order, skipping failures.
+    Uses the batch endpoint and falls back to bounded concurrent GETs for
+    anything the batch did not return.
+    """
+    try:
+        found = batch_get_messages(message_ids, headers, params)
+    except Exception as e:
+        print("Gmail batch fetch failed, falling back to concurrent requests:", e)
+        found = {}
+    missing = [msg_id for msg_id in message_ids if not found.get(msg_id)]
+    if missing:
+        with ThreadPoolExecutor(max_workers=GMAIL_FETCH_CONCURRENCY) as pool:
+            for msg_id, message in zip(missing, pool.map(lambda i: get_message(i, headers, params), missing)):
+                found[msg_id] = message
+    return [found[msg_id] for msg_id in message_ids if found.get(msg_id)]
+
+def _header(payload, name, default):
+    return next((h["value"] for h in payload.get("headers", []) if h["name"] == name), default)
+
+def _date(message):
+    internal_date = message.get("internalDate")
+    if internal_date:
+        # Convert from ms to seconds, then to datetime
+        return datetime.fromtimestamp(int(internal_date) / 1000).isoformat()
+    return None
+
+def parse_body(message):
+    body = ""
+    parts = message.get("payload", {}).get("parts", [])
+    for part in parts:
+        if part.get("mimeType") == "text/plain":
+            data = part.get("body", {}).get("data", "")
+            try:
+                decoded = base64.urlsafe_b64decode(data.encode("ASCII")).decode("utf-8")
+                body = decoded.strip()
+                break
+            except Exception:
                 continue
+    if not body:
+        body = message.get("snippet", "")
+    return body[:100]
 
-            payload = msg_detail.json().get("payload", {})
-            headers_list = payload.get("headers", [])
-            sender = next((h["value"] for h in headers_list if h["name"] == "From"), "(Unknown Sender)")
-            subject = next((h["value"] for h in headers_list if h["name"] == "Subject"), "(No Subject)")
-            body = ""
-            parts = payload.get("parts", [])
-            for part in parts:
-                if part.get("mimeType") == "text/plain":
-                    data = part.get("body", {}).get("data", "")
-                    try:
-                        decoded = base64.urlsafe_b64decode(data.encode("ASCII")).decode("utf-8")
-                        body = decoded.strip()
-                        break
-                    except Exception:
-                        continue
-            if not body:
-                body = msg_detail.json().get("snippet", "")
-
-            # --- Add date/time ---
-            internal_date = msg_detail.json().get("internalDate")
-            if internal_date:
-                # Convert from ms to seconds, then to datetime
-                dt = datetime.fromtimestamp(int(internal_date) / 1000)
-                date_str = dt.isoformat()
-            else:
-                date_str = None
+def parse_email(message):
+    payload = message.get("payload", {})
+    return {
+        "from": _header(payload, "From", "(Unknown Sender)"),
+        "subject": _header(payload, "Subject", "(No Subject)"),
+        "body": parse_body(message),
+        "date": _date(message),
+    }
+
+class LazyEmail(dict):
+    """
+    Email record built from a format=metadata message: id, from, subject, snippet, date.
+    "body" is downloaded (format=full) the first time a step reads it, so records that
+    are only serialized, cached or routed never pay for the full payload.
+    """
+
+    def __init__(self, fields, headers):
+        super().__init__(fields)
+        self._auth_headers = headers
+
+    def __missing__(self, key):
+        if key != "body":
+            raise KeyError(key)
+        load_bodies([self])
+        return dict.__getitem__(self, "body")
+
+    def get(self, key, default=None):
+        if key == "body" and key not in self:
+            return self["body"]
+        return super().get(key, default)
 
-            emails.append({
-                "from": sender,
-                "subject": subject,
-                "body": body[:100],
-                "date": date_str  # <-- Add this line
-            })
+def parse_metadata(message, headers):
+    payload = message.get("payload", {})
+    return LazyEmail({
+        "id": message.get("id"),
+        "from": _header(payload, "From", "(Unknown Sender)"),
+        "subject": _header(payload, "Subject", "(No Subject)"),
+        "snippet": message.get("snippet", ""),
+        "date": _date(message),
+    }, headers)
 
-        return emails
+def load_bodies(emails):
+    """
+    Fills in "body" on lazy email records that haven't been read yet, with one
+    batched format=full fetch per mailbox instead of one request per email.
+    """
+    if isinstance(emails, dict):
+        emails = [emails]
+    by_mailbox = {}
+    for email in emails or []:
+        if isinstance(email, LazyEmail) and "body" not in email:
+            by_mailbox.setdefault(email._auth_headers["Authorization"], []).append(email)
+    for group in by_mailbox.values():
+        messages = get_messages([email["id"] for email in group], group[0]._auth_headers, FULL_PARAMS)
+        found = {message.get("id"): message for message in messages}
+        for email in group:
+            message = found.get(email["id"])
+            email["body"] = parse_body(message) if message else email.get("snippet", "")
 
+def _parse_all(message_ids, headers, full):
+    if full:
+        return [parse_email(message) for message in get_messages(message_ids, headers, FULL_PARAMS)]
+    return [parse_metadata(message, headers) for message in get_messages(message_ids, headers, METADATA_PARAMS)]
+
+def _test_emails():
     # Fallback: Simulate polling Gmail (for testing)
     print("Checking Gmail for new email (no token)...")
     return [
@@ -86,26 +315,70 @@ def check_new_email(token=None):
         for i in range(10)
     ]
 
-def get_valid_gmail_token(user: UserDB):
-    # Check expiry
-    if user.gmail_token_expiry < datetime.utcnow():
-        # Refresh token
-        extra = {
-            'client_id': GOOGLE_CLIENT_ID,
-            'client_secret': GOOGLE_CLIENT_SECRET,
+def check_new_email(token=None, full=False):
+    """Latest primary-inbox emails. Bodies load lazily unless `full` is set."""
+    if token:
+        headers = {
+            "Authorization": f"Bearer {token}"
         }
-        oauth = OAuth2Session(GOOGLE_CLIENT_ID, token={
-            'refresh_token': user.gmail_refresh_token,
-            'token_type': 'Bearer',
-            'expires_in': -30,  # force refresh
-        })
-        token = oauth.refresh_token(
+        message_ids = list_message_ids(headers)
+        if message_ids is None:
+            return None
+
+        if not message_ids:
+            return []
+        return _parse_all(message_ids, headers, full)
+
+    return _test_emails()
+
+def check_new_email_since(token, history_id=None, full=False):
+    """
+    Incremental variant of check_new_email: returns (emails, new_history_id) where
+    emails are only the messages added since `history_id`.
+    """
+    headers = {
+        "Authorization": f"Bearer {token}"
+    }
+    message_ids, latest = new_message_ids(headers, history_id)
+    if message_ids is None:
+        return None, history_id
+    if not message_ids:
+        return [], latest or history_id
+    return _parse_all(message_ids, headers, full), latest or history_id
+
+def iter_new_email(token=None, full=False):
+    """Like check_new_email, but yields each email as soon as its details are fetched."""
+    if not token:
+        yield from _test_emails()
+        return
+    headers = {
+        "Authorization": f"Bearer {token}"
+    }
+    for msg_id in list_message_ids(headers) or []:
+        email = fetch_email(msg_id, headers, full)
+        if email:
+            yield email
+
+def refresh_gmail_token(refresh_token):
+    """Exchanges a Google refresh token for a new access token (dict with access_token, expires_in)."""
+    extra = {
+        'client_id': GOOGLE_CLIENT_ID,
+        'client_secret': GOOGLE_CLIENT_SECRET,
+    }
+    oauth = OAuth2Session(GOOGLE_CLIENT_ID, token={
+        'refresh_token': refresh_token,
+        'token_type': 'Bearer',
+        'expires_in': -30,  # force refresh
+    })
+    with track_call("google_oauth"):
+        return oauth.refresh_token(
             'https://oauth2.googleapis.com/token',
-            refresh_token=user.gmail_refresh_token,
+            refresh_token=refresh_token,
             **extra
         )
-        # Update DB
-        user.gmail_access_token = token['access_token']
-        user.gmail_token_expiry = datetime.utcnow() + timedelta(seconds=token['expires_in'])
-        # Save user to DB here
-    return user.gmail_access_token
+
+token_manager.register("gmail", refresh_gmail_token, "gmail_access_token", "gmail_refresh_token", "gmail_token_expiry")
+
+def get_valid_gmail_token(user: UserDB):
+    # Cached per user; expired tokens are refreshed once (single flight) and saved to the DB
+    return token_manager.get_token("gmail", user)
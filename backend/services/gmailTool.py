@@ -1,9 +1,9 @@
 from abc import ABC
 from typing import Dict, Any
 from authlib.integrations.starlette_client import OAuth
-import requests
 
 from .ToolInterface import ToolInterface
+from services.http_pool import get_session
 
 class GmailTool(ToolInterface):
     def __init__(self):
@@ -36,7 +36,7 @@ class GmailTool(ToolInterface):
             data = {
                 "raw": params["email_data"],  # Base64-encoded email content
             }
-            response = requests.post(
+            response = get_session("gmail").post(
                 "https://www.googleapis.com/gmail/v1/users/me/messages/send",
                 headers=headers,
                 json=data,
@@ -46,7 +46,7 @@ class GmailTool(ToolInterface):
             raise ValueError(f"Unsupported action: {action}")
 
     def revoke_token(self, token: str) -> None:
-        requests.post(
+        get_session("google_oauth").post(
             "https://oauth2.googleapis.com/revoke",
             params={"token": token},
             headers={"Content-Type": "application/x-www-form-urlencoded"},
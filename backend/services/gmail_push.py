@@ -0,0 +1,117 @@
+# backend/services/gmail_push.py
+# Gmail push notifications (users.watch -> Pub/Sub -> webhook): start runs of the
+# workflows triggered by a mailbox when mail arrives, instead of polling for it.
+import base64
+import json
+import os
+from datetime import datetime, timedelta
+
+from models.db import GmailWatchDB, UserDB, WorkflowDB, WorkflowRunDB
+from services.gmail import get_profile, get_valid_gmail_token, watch_mailbox
+from services.run_log import log_to_redis
+from services.runner import create_run
+
+GMAIL_PUSH_TOPIC = os.environ.get("GMAIL_PUSH_TOPIC")  # projects/<project>/topics/<topic>
+GMAIL_PUSH_TOKEN = os.environ.get("GMAIL_PUSH_TOKEN")  # Shared secret expected as ?token= on the push URL
+GMAIL_WATCH_RENEW_BEFORE = timedelta(hours=int(os.environ.get("GMAIL_WATCH_RENEW_BEFORE_HOURS", "24")))
+
+
+def decode_notification(envelope):
+    """
+    Unwraps a Pub/Sub push envelope ({"message": {"data": base64(json)}}) into
+    (email_address, history_id). Raises ValueError on malformed payloads.
+    """
+    try:
+        data = json.loads(base64.b64decode(envelope["message"]["data"]))
+        return data["emailAddress"], str(data["historyId"])
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Malformed Gmail notification: {e}")
+
+
+def _newer(history_id, seen):
+    try:
+        return seen is None or int(history_id) > int(seen)
+    except ValueError:
+        return True
+
+
+def find_mailbox_user(db, email_address):
+    watch = db.query(GmailWatchDB).filter_by(email_address=email_address).first()
+    if watch:
+        return db.query(UserDB).filter_by(id=watch.user_id).first(), watch
+    # Users who signed in with Google have their address as username
+    return db.query(UserDB).filter_by(username=email_address).first(), None
+
+
+def gmail_triggered_workflows(db, user):
+    """The user's saved workflows that start with a Gmail trigger."""
+    workflows = []
+    for wf in db.query(WorkflowDB).filter_by(owner_id=user.id).all():
+        steps = json.loads(wf.workflow_json).get("workflow", [])
+        if any(step.get("type") == "trigger" and step.get("service") == "gmail" for step in steps):
+            workflows.append(wf)
+    return workflows
+
+
+def dispatch_notification(db, email_address, history_id, enqueue):
+    """
+    Creates a run for every Gmail-triggered workflow of the mailbox owner and passes
+    each run id to `enqueue`. Returns the run ids. Redelivered or out-of-order
+    notifications (historyId not newer than the last one seen) are ignored, and a
+    workflow that already has a queued run is skipped: its Gmail trigger syncs from
+    the history cursor, so the queued run picks up this mail too.
+    """
+    user, watch = find_mailbox_user(db, email_address)
+    if not user:
+        print(f"Gmail notification for unknown mailbox {email_address}")
+        return []
+    if watch:
+        if not _newer(history_id, watch.history_id):
+            return []
+        watch.history_id = history_id
+        db.commit()
+
+    run_ids = []
+    for wf in gmail_triggered_workflows(db, user):
+        queued = db.query(WorkflowRunDB).filter_by(workflow_id=str(wf.id), status="queued").first()
+        if queued:
+            continue
+        run = create_run(db, wf.id, wf.workflow_json, user=user, workflow_version=wf.version)
+        enqueue(run.id)
+        log_to_redis(run.workflow_id, f"Workflow queued by new Gmail mail (run {run.id}).", run_id=run.id)
+        run_ids.append(run.id)
+    return run_ids
+
+
+def start_watch(db, user, topic_name=None):
+    """Subscribes the user's mailbox to push notifications and records the watch."""
+    topic_name = topic_name or GMAIL_PUSH_TOPIC
+    if not topic_name:
+        raise ValueError("GMAIL_PUSH_TOPIC is not configured")
+    headers = {"Authorization": f"Bearer {get_valid_gmail_token(user)}"}
+    result = watch_mailbox(headers, topic_name)
+    if result is None:
+        return None
+    watch = db.query(GmailWatchDB).filter_by(user_id=user.id).first()
+    if not watch:
+        profile = get_profile(headers) or {}
+        watch = GmailWatchDB(user_id=user.id, email_address=profile.get("emailAddress", user.username))
+        db.add(watch)
+    watch.history_id = str(result.get("historyId"))
+    watch.expiration = datetime.utcfromtimestamp(int(result["expiration"]) / 1000)
+    db.commit()
+    return watch
+
+
+def renew_watches(db, topic_name=None):
+    """Re-issues watches that expire within GMAIL_WATCH_RENEW_BEFORE (Gmail watches last 7 days)."""
+    due = datetime.utcnow() + GMAIL_WATCH_RENEW_BEFORE
+    renewed = 0
+    for watch in db.query(GmailWatchDB).filter(GmailWatchDB.expiration < due).all():
+        user = db.query(UserDB).filter_by(id=watch.user_id).first()
+        try:
+            if user and start_watch(db, user, topic_name):
+                renewed += 1
+        except Exception as e:
+            print(f"Failed to renew Gmail watch for user {watch.user_id}:", e)
+    return renewed
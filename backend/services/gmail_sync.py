@@ -0,0 +1,49 @@
+# backend/services/gmail_sync.py
+# Per user/workflow Gmail historyId cursors, so polling only fetches new mail.
+from database import SessionLocal
+from models.db import GmailCursorDB
+from services.gmail import check_new_email_since, fetch_email, new_message_ids
+
+
+def load_cursor(user_id, workflow_id):
+    db = SessionLocal()
+    try:
+        cursor = db.query(GmailCursorDB).filter_by(user_id=user_id, workflow_id=str(workflow_id)).first()
+        return cursor.history_id if cursor else None
+    finally:
+        db.close()
+
+
+def save_cursor(user_id, workflow_id, history_id):
+    db = SessionLocal()
+    try:
+        cursor = db.query(GmailCursorDB).filter_by(user_id=user_id, workflow_id=str(workflow_id)).first()
+        if not cursor:
+            cursor = GmailCursorDB(user_id=user_id, workflow_id=str(workflow_id))
+            db.add(cursor)
+        cursor.history_id = str(history_id)
+        db.commit()
+    finally:
+        db.close()
+
+
+def sync_new_email(user, token, workflow_id, full=False):
+    """Returns the emails that arrived since the last sync of this user/workflow and advances the cursor."""
+    history_id = load_cursor(user.id, workflow_id)
+    emails, latest = check_new_email_since(token, history_id, full)
+    if latest and latest != history_id:
+        save_cursor(user.id, workflow_id, latest)
+    return emails
+
+
+def iter_synced_email(user, token, workflow_id, full=False):
+    """Streaming variant of sync_new_email: yields each new email as soon as it is fetched."""
+    headers = {"Authorization": f"Bearer {token}"}
+    history_id = load_cursor(user.id, workflow_id)
+    message_ids, latest = new_message_ids(headers, history_id)
+    for msg_id in message_ids or []:
+        email = fetch_email(msg_id, headers, full)
+        if email:
+            yield email
+    if message_ids is not None and latest and latest != history_id:
+        save_cursor(user.id, workflow_id, latest)
@@ -0,0 +1,144 @@
+# backend/services/http_pool.py
+# Process-wide keep-alive connection pools for outbound integrations, one per provider,
+# so steps reuse TLS connections instead of opening a new one per call.
+import asyncio
+import os
+import threading
+import weakref
+from collections import OrderedDict
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from services.metrics import requests_hook
+
+HTTP_POOL_MAXSIZE = int(os.environ.get("HTTP_POOL_MAXSIZE", "20"))  # Keep-alive connections per host
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.environ.get("HTTP_READ_TIMEOUT", "60"))
+HTTP_RETRIES = int(os.environ.get("HTTP_RETRIES", "2"))  # Connection errors / 502-504 on idempotent calls
+NOTION_CLIENT_CACHE_SIZE = int(os.environ.get("NOTION_CLIENT_CACHE_SIZE", "256"))
+
+OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
+
+_lock = threading.Lock()
+_sessions = {}  # provider -> requests.Session
+_notion_clients = OrderedDict()  # token -> notion_client.Client (LRU)
+_notion_transport = None  # Shared connection pool; each token gets its own httpx.Client on top
+_openai_client = None
+_async_openai_clients = weakref.WeakKeyDictionary()  # event loop -> AsyncOpenAI
+
+
+class _TimeoutSession(requests.Session):
+    """requests.Session that applies the pool's default timeout when a call doesn't pass one."""
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+        return super().request(method, url, **kwargs)
+
+
+def _httpx_limits():
+    return httpx.Limits(max_connections=HTTP_POOL_MAXSIZE, max_keepalive_connections=HTTP_POOL_MAXSIZE)
+
+
+def _httpx_timeout():
+    return httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+
+
+def get_session(provider):
+    """
+    Shared requests.Session for `provider` ("gmail", ...). Connections are kept alive
+    and reused across calls and threads; responses are recorded under the provider in /metrics.
+    """
+    session = _sessions.get(provider)
+    if session is not None:
+        return session
+    with _lock:
+        if provider not in _sessions:
+            session = _TimeoutSession()
+            retry = Retry(total=HTTP_RETRIES, backoff_factor=0.3, status_forcelist=(502, 503, 504),
+                          allowed_methods=frozenset({"GET", "HEAD", "OPTIONS"}), raise_on_status=False)
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_MAXSIZE, max_retries=retry)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.hooks["response"].append(requests_hook(provider))
+            _sessions[provider] = session
+        return _sessions[provider]
+
+
+def get_notion_client(token):
+    """
+    notion_client.Client for `token`. Clients are cached per token (LRU) and all of
+    them share one httpx connection pool to api.notion.com. The pool is shared at the
+    transport level because the SDK writes the token into its httpx.Client's headers.
+    """
+    from notion_client import Client
+
+    global _notion_transport
+    with _lock:
+        client = _notion_clients.get(token)
+        if client is not None:
+            _notion_clients.move_to_end(token)
+            return client
+        if _notion_transport is None:
+            _notion_transport = httpx.HTTPTransport(limits=_httpx_limits())
+        try:
+            # Retries are done by the rate limiter in services/notion.py
+            client = Client(auth=token, client=httpx.Client(transport=_notion_transport), retry=False)
+        except TypeError:  # notion-client < 3 has no retry option (and doesn't retry)
+            client = Client(auth=token, client=httpx.Client(transport=_notion_transport))
+        _notion_clients[token] = client
+        while len(_notion_clients) > NOTION_CLIENT_CACHE_SIZE:
+            _notion_clients.popitem(last=False)  # Not closed: that would close the shared transport
+        return client
+
+
+def get_openai_client():
+    """Shared synchronous OpenAI client (thread-safe, pooled)."""
+    from openai import OpenAI
+
+    global _openai_client
+    with _lock:
+        if _openai_client is None:
+            _openai_client = OpenAI(
+                api_key=OPENAI_API_KEY,
+                http_client=httpx.Client(limits=_httpx_limits(), timeout=_httpx_timeout()),
+            )
+        return _openai_client
+
+
+def get_async_openai_client():
+    """
+    Shared AsyncOpenAI client for the running event loop. httpx async pools are bound
+    to the loop that opened them, so each loop gets its own client.
+    """
+    from openai import AsyncOpenAI
+
+    loop = asyncio.get_running_loop()
+    with _lock:
+        client = _async_openai_clients.get(loop)
+        if client is None:
+            client = AsyncOpenAI(
+                api_key=OPENAI_API_KEY,
+                http_client=httpx.AsyncClient(limits=_httpx_limits(), timeout=_httpx_timeout()),
+            )
+            _async_openai_clients[loop] = client
+        return client
+
+
+def close_all():
+    """Closes every pooled connection (worker shutdown / tests)."""
+    global _notion_transport, _openai_client
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+        _notion_clients.clear()
+        if _notion_transport is not None:
+            _notion_transport.close()
+            _notion_transport = None
+        if _openai_client is not None:
+            _openai_client.close()
+            _openai_client = None
+        _async_openai_clients.clear()
@@ -0,0 +1,271 @@
+# backend/services/llm_batch.py
+# Coalesces concurrent OpenAI completions that share an instruction into one
+# multi-item request (or one Batch API job) and splits the answers back.
+import asyncio
+import hashlib
+import json
+import os
+import weakref
+
+from services.http_pool import get_async_openai_client
+from services.metrics import track_call
+
+OPENAI_MODEL = "gpt-4.1-mini"
+OPENAI_BATCH_WINDOW = float(os.environ.get("OPENAI_BATCH_WINDOW_MS", "50")) / 1000  # Max wait to gather a group
+OPENAI_BATCH_MAX_ITEMS = int(os.environ.get("OPENAI_BATCH_MAX_ITEMS", "10"))
+OPENAI_BATCH_MAX_OUTPUT_TOKENS = 16000
+# Offline (Batch API) groups: nobody waits on the job, so gather longer and larger
+OPENAI_BATCH_OFFLINE_WINDOW = float(os.environ.get("OPENAI_BATCH_OFFLINE_WINDOW_MS", "1000")) / 1000
+OPENAI_BATCH_OFFLINE_MAX_ITEMS = int(os.environ.get("OPENAI_BATCH_OFFLINE_MAX_ITEMS", "1000"))
+
+
+class BatchPending(Exception):
+    """
+    Offline completions went out as Batch API jobs that finish later (up to 24h).
+    `jobs` is a JSON-serializable list of {"job": backend job, "keys": [batch_key per prompt]};
+    the run saves it and is resumed with collect_batches() answers once the jobs are done.
+    """
+
+    def __init__(self, jobs):
+        super().__init__(f"Waiting for {len(jobs)} OpenAI batch job(s)")
+        self.jobs = jobs
+
+    @classmethod
+    def merge(cls, errors):
+        jobs = {}
+        for error in errors:
+            for entry in error.jobs:
+                jobs.setdefault(json.dumps(entry["job"]), entry)
+        return cls(list(jobs.values()))
+
+
+def batch_key(prompt, max_tokens):
+    return hashlib.sha256(f"{max_tokens}\n{prompt}".encode("utf-8")).hexdigest()
+
+
+def single_prompt(instruction, text):
+    return f"{instruction}\n\n{text}" if instruction else text
+
+
+def multi_prompt(instruction, texts):
+    task = (f"{instruction}\n\nApply the instruction above to each of the {len(texts)} items below independently."
+            if instruction else f"Respond to each of the {len(texts)} items below independently.")
+    items = "\n\n".join(f"### Item {i}\n{text}" for i, text in enumerate(texts, 1))
+    return (f"{task}\nReturn a JSON object {{\"results\": [...]}} with exactly {len(texts)} strings, "
+            f"one answer per item, in item order.\n\n{items}")
+
+
+def parse_multi(answer, count):
+    """The per-item answers of a multi_prompt completion, or None if they can't be trusted."""
+    try:
+        results = json.loads(answer)["results"]
+    except (TypeError, ValueError, KeyError):
+        return None
+    if not isinstance(results, list) or len(results) != count:
+        return None
+    return [result if isinstance(result, str) else json.dumps(result) for result in results]
+
+
+class OpenAIBackend:
+    """Chat completions and Batch API jobs through the pooled AsyncOpenAI client."""
+
+    def __init__(self, model=OPENAI_MODEL, temperature=0.6):
+        self.model = model
+        self.temperature = temperature
+
+    async def complete(self, prompt, max_tokens, json_mode=False):
+        params = {}
+        if json_mode:
+            params["response_format"] = {"type": "json_object"}
+        with track_call("openai"):
+            response = await get_async_openai_client().chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=self.temperature,
+                max_tokens=max_tokens,
+                **params,
+            )
+        return response.choices[0].message.content
+
+    async def stream(self, prompt, max_tokens):
+        """Yields the completion text piece by piece as the model generates it."""
+        with track_call("openai"):
+            stream = await get_async_openai_client().chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=self.temperature,
+                max_tokens=max_tokens,
+                stream=True,
+            )
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+
+    async def submit_batch(self, prompts, max_tokens):
+        lines = [
+            json.dumps({
+                "custom_id": f"item-{i}",
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": self.model,
+                    "messages": [{"role": "user", "content": prompt}],
+                    "temperature": self.temperature,
+                    "max_tokens": max_tokens,
+                },
+            })
+            for i, prompt in enumerate(prompts)
+        ]
+        client = get_async_openai_client()
+        with track_call("openai"):
+            upload = await client.files.create(file=("batch.jsonl", "\n".join(lines).encode("utf-8")), purpose="batch")
+            batch = await client.batches.create(
+                input_file_id=upload.id, endpoint="/v1/chat/completions", completion_window="24h"
+            )
+        return batch.id, len(prompts)
+
+    async def batch_results(self, job):
+        """Answers in prompt order (None for items that failed), or None while the job is still running."""
+        batch_id, count = job
+        client = get_async_openai_client()
+        with track_call("openai"):
+            batch = await client.batches.retrieve(batch_id)
+        if batch.status in ("failed", "expired", "cancelled"):
+            raise RuntimeError(f"OpenAI batch {batch_id} {batch.status}")
+        if batch.status != "completed":
+            return None
+        with track_call("openai"):
+            output = await client.files.content(batch.output_file_id)
+        answers = {}
+        for line in output.text.splitlines():
+            if line.strip():
+                record = json.loads(line)
+                body = (record.get("response") or {}).get("body") or {}
+                if body.get("choices"):
+                    answers[record["custom_id"]] = body["choices"][0]["message"]["content"]
+        return [answers.get(f"item-{i}") for i in range(count)]
+
+
+class Coalescer:
+    """
+    `await submit(instruction, text)` returns the completion of single_prompt(instruction, text).
+    Calls with the same owner and instruction arriving within `window` seconds (at most
+    `max_items`) go out as one multi-item JSON request, so one user's data never shares a
+    request with another's; if its answer can't be split, the items are
+    retried one by one. mode="offline" sends the group as one Batch API job instead and
+    raises BatchPending rather than waiting for it, which suits scheduled runs that can
+    trade latency for cost; pass the collected `answers` when the step runs again.
+    """
+
+    def __init__(self, backend=None, window=OPENAI_BATCH_WINDOW, max_items=OPENAI_BATCH_MAX_ITEMS,
+                 offline_window=OPENAI_BATCH_OFFLINE_WINDOW, offline_max_items=OPENAI_BATCH_OFFLINE_MAX_ITEMS):
+        self.backend = backend or OpenAIBackend()
+        self.window = window
+        self.max_items = max_items
+        self.offline_window = offline_window
+        self.offline_max_items = offline_max_items
+        self._pending = {}  # (owner, instruction, max_tokens, mode) -> [(text, future)]
+        self._timers = {}
+        self._tasks = set()
+
+    async def submit(self, instruction, text, max_tokens=300, mode="live", coalesce=True, owner=None, answers=None):
+        if not coalesce and mode == "live":  # Large prompts (map-reduce chunks) go out on their own
+            return await self.backend.complete(single_prompt(instruction, text), max_tokens)
+        if mode == "offline" and answers:
+            answer_key = batch_key(single_prompt(instruction, text), max_tokens)
+            if answer_key in answers:
+                if answers[answer_key] is None:
+                    raise RuntimeError("No answer in the OpenAI batch output")
+                return answers[answer_key]
+        if mode == "offline":
+            window, max_items = self.offline_window, self.offline_max_items
+        else:
+            window, max_items = self.window, self.max_items
+        loop = asyncio.get_running_loop()
+        key = (owner, instruction, max_tokens, mode)
+        future = loop.create_future()
+        group = self._pending.setdefault(key, [])
+        group.append((text, future))
+        if len(group) >= max_items:
+            self._flush(key)
+        elif key not in self._timers:
+            self._timers[key] = loop.call_later(window, self._flush, key)
+        return await future
+
+    def _flush(self, key):
+        timer = self._timers.pop(key, None)
+        if timer:
+            timer.cancel()
+        group = self._pending.pop(key, None)
+        if group:
+            task = asyncio.ensure_future(self._run(key, group))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, key, group):
+        _, instruction, max_tokens, mode = key
+        texts = [text for text, _ in group]
+        try:
+            if mode == "offline":
+                results = await self._offline(instruction, texts, max_tokens)
+            else:
+                results = await self._live(instruction, texts, max_tokens)
+        except Exception as e:
+            results = [e] * len(group)
+        for (_, future), result in zip(group, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def _live(self, instruction, texts, max_tokens):
+        async def one(text):
+            try:
+                return await self.backend.complete(single_prompt(instruction, text), max_tokens)
+            except Exception as e:
+                return e
+
+        if len(texts) == 1:
+            return [await one(texts[0])]
+        answer = await self.backend.complete(
+            multi_prompt(instruction, texts), min(max_tokens * len(texts), OPENAI_BATCH_MAX_OUTPUT_TOKENS), json_mode=True
+        )
+        results = parse_multi(answer, len(texts))
+        if results is None:
+            print(f"Could not split a {len(texts)}-item OpenAI answer, retrying the items one by one")
+            results = await asyncio.gather(*(one(text) for text in texts))
+        return results
+
+    async def _offline(self, instruction, texts, max_tokens):
+        prompts = [single_prompt(instruction, text) for text in texts]
+        job = await self.backend.submit_batch(prompts, max_tokens)
+        pending = BatchPending([{"job": job, "keys": [batch_key(prompt, max_tokens) for prompt in prompts]}])
+        return [pending] * len(texts)
+
+
+async def collect_batches(jobs, backend=None):
+    """
+    {batch_key: answer (None if the item failed)} for the jobs of a BatchPending, or None
+    while any of them is still running. Raises if a job failed or expired.
+    """
+    backend = backend or get_coalescer().backend
+    answers = {}
+    for entry in jobs:
+        results = await backend.batch_results(entry["job"])
+        if results is None:
+            return None
+        answers.update(zip(entry["keys"], results))
+    return answers
+
+
+_coalescers = weakref.WeakKeyDictionary()  # event loop -> Coalescer (futures and timers are loop-bound)
+
+
+def get_coalescer():
+    loop = asyncio.get_running_loop()
+    coalescer = _coalescers.get(loop)
+    if coalescer is None:
+        coalescer = _coalescers[loop] = Coalescer()
+    return coalescer
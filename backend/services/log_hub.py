@@ -0,0 +1,119 @@
+# backend/services/log_hub.py
+# Fans workflow log streams out to WebSocket viewers: one blocking XREAD per workflow,
+# however many sockets are attached, so new lines are pushed as soon as they're written.
+import asyncio
+import os
+import weakref
+
+import redis
+import redis.asyncio as aioredis
+
+from services.run_log import REDIS_URL, log_key, stream_id
+
+LOG_HUB_BLOCK_MS = int(os.environ.get("LOG_HUB_BLOCK_MS", "5000"))  # How long one XREAD waits for new entries
+LOG_HUB_QUEUE_SIZE = int(os.environ.get("LOG_HUB_QUEUE_SIZE", "1000"))  # Pending lines per viewer
+LOG_HUB_BATCH = 100  # Entries per XREAD / XRANGE
+
+
+class LogHub:
+    """
+    `async for entry_id, record in hub.subscribe(workflow_id, after)` yields the workflow's
+    log records (see run_log.log_record) as they are written. `after` is the last entry id the viewer has seen
+    (None: only new lines, "0": everything kept); the backlog is read from the stream
+    before live lines, without gaps or duplicates. Viewers that fall too far behind
+    catch up from Redis instead of growing their queue.
+    """
+
+    def __init__(self, client=None, block_ms=LOG_HUB_BLOCK_MS, queue_size=LOG_HUB_QUEUE_SIZE):
+        self.client = client or aioredis.Redis.from_url(REDIS_URL, decode_responses=True)
+        self.block_ms = block_ms
+        self.queue_size = queue_size
+        self._subscribers = {}  # workflow_id -> set of asyncio.Queue
+        self._readers = {}  # workflow_id -> (reader task, future of its start id)
+
+    async def subscribe(self, workflow_id, after=None):
+        key = log_key(workflow_id)
+        queue = asyncio.Queue(self.queue_size)
+        self._subscribers.setdefault(workflow_id, set()).add(queue)
+        try:
+            if workflow_id not in self._readers:
+                started = asyncio.get_running_loop().create_future()
+                self._readers[workflow_id] = (asyncio.ensure_future(self._read(workflow_id, key, started)), started)
+            # The reader delivers everything after its start id, so reading the backlog afterwards leaves no gap
+            await self._readers[workflow_id][1]
+            last = await self._last_id(key) if after is None else after
+            async for entry in self._backlog(key, last):
+                last = entry[0]
+                yield entry
+            while True:
+                entry = await queue.get()
+                if entry is None:  # Fell behind: the reader dropped our queue, catch up from the stream
+                    async for entry in self._backlog(key, last):
+                        last = entry[0]
+                        yield entry
+                elif stream_id(entry[0]) > stream_id(last):
+                    last = entry[0]
+                    yield entry
+        finally:
+            subscribers = self._subscribers.get(workflow_id, set())
+            subscribers.discard(queue)
+            if not subscribers:
+                self._subscribers.pop(workflow_id, None)
+                reader = self._readers.pop(workflow_id, None)
+                if reader:
+                    reader[0].cancel()
+
+    async def _last_id(self, key):
+        entries = await self.client.xrevrange(key, count=1)
+        return entries[0][0] if entries else "0-0"
+
+    async def _backlog(self, key, after):
+        while True:
+            entries = [(entry_id, fields) for entry_id, fields in
+                       await self.client.xrange(key, min=after, count=LOG_HUB_BATCH + 1)
+                       if stream_id(entry_id) > stream_id(after)]
+            for entry_id, fields in entries:
+                yield entry_id, fields
+            if not entries:
+                return
+            after = entries[-1][0]
+
+    async def _read(self, workflow_id, key, started):
+        try:
+            last = await self._last_id(key)
+        except Exception as e:
+            started.set_exception(e)
+            return
+        started.set_result(last)
+        while True:
+            try:
+                response = await self.client.xread({key: last}, count=LOG_HUB_BATCH, block=self.block_ms)
+            except redis.RedisError as e:
+                print(f"[WS] Log stream read failed for workflow {workflow_id}: {e}")
+                await asyncio.sleep(1)
+                continue
+            for _, entries in response or []:
+                for entry_id, fields in entries:
+                    last = entry_id
+                    for queue in list(self._subscribers.get(workflow_id, ())):
+                        self._deliver(queue, (entry_id, fields))
+
+    @staticmethod
+    def _deliver(queue, entry):
+        try:
+            queue.put_nowait(entry)
+        except asyncio.QueueFull:
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(None)
+
+
+_hubs = weakref.WeakKeyDictionary()  # event loop -> LogHub (redis.asyncio connections are loop-bound)
+
+
+def get_log_hub():
+    loop = asyncio.get_running_loop()
+    hub = _hubs.get(loop)
+    if hub is None:
+        hub = _hubs[loop] = LogHub()
+    return hub
@@ -0,0 +1,232 @@
+# backend/services/metrics.py
+# Minimal metrics registry with Prometheus text exposition. Every process (API, each
+# Celery pool child) pushes its deltas to Redis, and /metrics renders the merged totals.
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+METRICS_FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", "5"))  # Seconds between pushes to Redis
+SHARED_KEY = "metrics:{}"  # Redis hash per metric: JSON [label values..., slot] -> total
+
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_metrics = {}  # name -> metric, in registration order
+_flushed = {}  # name -> {label key: slots} already added to Redis by this process
+_owner_pid = os.getpid()  # A forked child inherits the parent's registry; see start_metrics_flusher
+_flusher_pid = None
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in labels.values())
+    return "{" + ",".join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + "}"
+
+
+def _number(value):
+    return int(value) if float(value).is_integer() else value
+
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(str(labels.get(name, "")) for name in self.labelnames), 0)
+
+    def slots(self):
+        return {key: [value] for key, value in self._values.items()}
+
+    def render(self, states=None):
+        states = self.slots() if states is None else states
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for key, (value,) in sorted(states.items()):
+            lines.append(f"{self.name}{_format_labels(dict(zip(self.labelnames, key)))} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}  # label key -> [bucket counts..., count, sum]
+
+    def observe(self, amount, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with _lock:
+            state = self._values.setdefault(key, [0] * len(self.buckets) + [0, 0.0])
+            for i, bound in enumerate(self.buckets):
+                if amount <= bound:
+                    state[i] += 1
+            state[-2] += 1
+            state[-1] += amount
+
+    def count(self, **labels):
+        state = self._values.get(tuple(str(labels.get(name, "")) for name in self.labelnames))
+        return state[-2] if state else 0
+
+    def slots(self):
+        return {key: list(state) for key, state in self._values.items()}
+
+    def render(self, states=None):
+        states = self.slots() if states is None else states
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for key, state in sorted(states.items()):
+            labels = dict(zip(self.labelnames, key))
+            for bound, bucket_count in zip(self.buckets, state):
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': bound})} {_number(bucket_count)}")
+            lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': '+Inf'})} {_number(state[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {_number(state[-2])}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {state[-1]}")
+        return lines
+
+
+def counter(name, help_text, labelnames=()):
+    return _metrics.setdefault(name, Counter(name, help_text, labelnames))
+
+
+def histogram(name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return _metrics.setdefault(name, Histogram(name, help_text, labelnames, buckets))
+
+
+def render():
+    """This process's metrics only."""
+    with _lock:
+        lines = [line for metric in _metrics.values() for line in metric.render()]
+    return "\n".join(lines) + "\n"
+
+
+def _snapshot():
+    with _lock:
+        return {name: metric.slots() for name, metric in _metrics.items()}
+
+
+def _shared_client(client):
+    if client is not None:
+        return client
+    from services.run_log import r
+    return r
+
+
+def flush_metrics(client=None):
+    """Adds what this process recorded since its last flush to the shared totals in Redis."""
+    global _flushed
+    client = _shared_client(client)
+    with _flush_lock:
+        snapshot = _snapshot()
+        pipe = client.pipeline(transaction=False)
+        pending = False
+        for name, states in snapshot.items():
+            flushed = _flushed.get(name, {})
+            for key, state in states.items():
+                for slot, (now, before) in enumerate(zip(state, flushed.get(key, [0] * len(state)))):
+                    if now != before:
+                        pipe.hincrbyfloat(SHARED_KEY.format(name), json.dumps([*key, slot]), now - before)
+                        pending = True
+        if pending:
+            pipe.execute()
+        _flushed = snapshot
+
+
+def render_shared(client=None):
+    """Metrics of every process that flushes to the same Redis (API and Celery workers)."""
+    client = _shared_client(client)
+    flush_metrics(client)
+    lines = []
+    for name, metric in list(_metrics.items()):
+        states = {}
+        for field, total in client.hgetall(SHARED_KEY.format(name)).items():
+            *key, slot = json.loads(field)
+            slot_count = len(metric.buckets) + 2 if isinstance(metric, Histogram) else 1
+            states.setdefault(tuple(key), [0] * slot_count)[slot] = float(total)
+        lines += metric.render(states)
+    return "\n".join(lines) + "\n"
+
+
+def start_metrics_flusher(interval=METRICS_FLUSH_INTERVAL, client=None):
+    """
+    Flushes this process's metrics every `interval` seconds from a daemon thread.
+    Call it in each process that records metrics; Celery prefork children need their
+    own flusher, since tasks run there and not in the parent.
+    """
+    global _flushed, _flusher_pid, _flush_lock
+    if _flusher_pid == os.getpid():
+        return
+    if os.getpid() != _owner_pid:
+        _flush_lock = threading.Lock()  # The parent's flusher may have held it at fork time
+        _flushed = _snapshot()  # Forked: what the parent recorded is the parent's to report
+    _flusher_pid = os.getpid()
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                flush_metrics(client)
+            except Exception as e:
+                print("Metrics flush failed:", e)
+
+    threading.Thread(target=run, name="metrics-flusher", daemon=True).start()
+
+
+STEP_DURATION = histogram(
+    "workflow_step_duration_seconds", "Wall time of workflow step handlers", ("type", "service", "action")
+)
+STEP_ERRORS = counter(
+    "workflow_step_errors_total", "Workflow step handlers that raised", ("type", "service", "action")
+)
+OUTBOUND_DURATION = histogram(
+    "outbound_request_duration_seconds", "Latency of calls to external tools", ("tool",)
+)
+OUTBOUND_REQUESTS = counter(
+    "outbound_requests_total", "Calls to external tools", ("tool", "outcome")
+)
+OUTBOUND_BYTES = counter(
+    "outbound_response_bytes_total", "Response bytes received from external tools", ("tool",)
+)
+
+
+def record_step(step, seconds, error=False):
+    labels = {"type": step.get("type"), "service": step.get("service"), "action": step.get("action")}
+    STEP_DURATION.observe(seconds, **labels)
+    if error:
+        STEP_ERRORS.inc(**labels)
+
+
+def record_call(tool, seconds, nbytes=0, error=False):
+    OUTBOUND_DURATION.observe(seconds, tool=tool)
+    OUTBOUND_REQUESTS.inc(tool=tool, outcome="error" if error else "ok")
+    if nbytes:
+        OUTBOUND_BYTES.inc(nbytes, tool=tool)
+
+
+@contextmanager
+def track_call(tool):
+    """Times a call to an external tool: `with track_call("notion"): ...`"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        record_call(tool, time.perf_counter() - start, error=True)
+        raise
+    record_call(tool, time.perf_counter() - start)
+
+
+def requests_hook(tool):
+    """`requests` response hook recording latency, status and body size for `tool`."""
+    def hook(response, *args, **kwargs):
+        record_call(tool, response.elapsed.total_seconds(), len(response.content or b""), error=response.status_code >= 400)
+    return hook
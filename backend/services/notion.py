@@ -1,5 +1,95 @@
 # backend/services/notion.py
-from notion_client import Client
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from notion_client.errors import HTTPResponseError, RequestTimeoutError
+from services.metrics import track_call
+from services.http_pool import get_notion_client
+
+# Notion allows an average of 3 requests per second per integration, with short bursts.
+# The limiter lives in each process: with N Celery worker processes set this to 3 / N.
+NOTION_RATE_PER_SECOND = float(os.environ.get("NOTION_RATE_PER_SECOND", "3"))
+NOTION_BURST = int(os.environ.get("NOTION_BURST", "5"))
+NOTION_MAX_RETRIES = int(os.environ.get("NOTION_MAX_RETRIES", "5"))
+NOTION_MAX_BACKOFF = 30.0  # seconds
+NOTION_MAX_CHILDREN = 100  # Blocks per pages.create / blocks.children.append request
+NOTION_TEXT_LIMIT = 2000  # Characters per rich text object
+NOTION_BULK_CONCURRENCY = int(os.environ.get("NOTION_BULK_CONCURRENCY", "4"))  # Pages in flight; the bucket sets the pace
+
+class TokenBucket:
+    """Thread-safe token bucket: `acquire()` blocks until a request may be sent."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.paused_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Holds back every request on this bucket, e.g. for a 429's Retry-After."""
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+_buckets = {}  # token -> TokenBucket (Notion rate limits per integration token), per process
+_buckets_lock = threading.Lock()
+
+def _bucket(token):
+    with _buckets_lock:
+        if token not in _buckets:
+            _buckets[token] = TokenBucket(NOTION_RATE_PER_SECOND, NOTION_BURST)
+        return _buckets[token]
+
+def _retry_delay(error, attempt):
+    headers = getattr(error, "headers", None) or {}
+    try:
+        return min(float(headers.get("retry-after")), NOTION_MAX_BACKOFF)
+    except (TypeError, ValueError):
+        return min(NOTION_MAX_BACKOFF, 0.5 * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+def notion_request(token, call, *args, **kwargs):
+    """
+    Sends one Notion API call (e.g. `client.pages.create`) through the token's rate
+    limiter. 429s wait for Retry-After and pause the whole token, and connection
+    failures (nothing was sent) are retried with exponential backoff. 5xx and timeouts
+    are not: the call may have been applied already, and creating or appending again
+    could duplicate the page or its blocks.
+    """
+    bucket = _bucket(token)
+    for attempt in range(NOTION_MAX_RETRIES + 1):
+        bucket.acquire()
+        try:
+            with track_call("notion"):
+                return call(*args, **kwargs)
+        except (HTTPResponseError, RequestTimeoutError, httpx.ConnectError) as e:
+            status = getattr(e, "status", None)
+            retryable = status == 429 or isinstance(e, httpx.ConnectError)
+            if attempt == NOTION_MAX_RETRIES or not retryable:
+                raise
+            delay = _retry_delay(e, attempt)
+            print(f"Notion request failed ({status or type(e).__name__}), retrying in {delay:.1f}s")
+            if status == 429:
+                bucket.pause(delay)
+            else:
+                time.sleep(delay)
 
 def extract_notion_uuid(raw_id):
     # Handles URLs and slugs, returns just the 32-char UUID (with or without dashes)
@@ -15,16 +105,9 @@ def extract_notion_uuid(raw_id):
         return match.group(1)
     return raw_id
 
-def create_notion_page(token, title="New Page", content="Created from EverythingConnected", parent_id=None, parent_type="page_id"):
-    notion = Client(auth=token)
-    if not parent_id:
-        print("No parent_id provided for Notion page creation.")
-        return None
-    # Extract UUID
-    notion_uuid = extract_notion_uuid(parent_id)
+def paragraph_blocks(content):
     # Split content into 2000-char chunks
-    max_len = 2000
-    paragraphs = [
+    return [
         {
             "object": "block",
             "type": "paragraph",
@@ -32,28 +115,88 @@ def create_notion_page(token, title="New Page", content="Created from Everything
                 "rich_text": [
                     {
                         "type": "text",
-                        "text": {"content": content[i:i+max_len]},
+                        "text": {"content": content[i:i+NOTION_TEXT_LIMIT]},
                     }
                 ]
             },
         }
-        for i in range(0, len(content), max_len)
+        for i in range(0, len(content), NOTION_TEXT_LIMIT)
     ]
+
+def create_page(token, title, content, parent_id, parent_type="page_id", properties=None):
+    """
+    Creates a page (or a database row with parent_type="database_id") and returns it.
+    Content beyond NOTION_MAX_CHILDREN blocks is appended in follow-up batches.
+    Raises on failure.
+    """
+    notion = get_notion_client(token)
+    blocks = paragraph_blocks(content)
+    if properties is None:
+        properties = {
+            "title": [
+                {
+                    "type": "text",
+                    "text": {"content": title},
+                }
+            ]
+        }
+    new_page = notion_request(
+        token,
+        notion.pages.create,
+        parent={parent_type: extract_notion_uuid(parent_id)},
+        properties=properties,
+        children=blocks[:NOTION_MAX_CHILDREN],
+    )
+    for start in range(NOTION_MAX_CHILDREN, len(blocks), NOTION_MAX_CHILDREN):
+        notion_request(token, notion.blocks.children.append,
+                       block_id=new_page["id"], children=blocks[start:start + NOTION_MAX_CHILDREN])
+    return new_page
+
+def create_notion_page(token, title="New Page", content="Created from EverythingConnected", parent_id=None, parent_type="page_id"):
+    if not parent_id:
+        print("No parent_id provided for Notion page creation.")
+        return None
     try:
-        parent = {parent_type: notion_uuid}
-        new_page = notion.pages.create(
-            parent=parent,
-            properties={
-                "title": [
-                    {
-                        "type": "text",
-                        "text": {"content": title},
-                    }
-                ]
-            },
-            children=paragraphs,
-        )
-        return new_page
+        return create_page(token, title, content, parent_id, parent_type)
     except Exception as e:
         print("Notion create page error:", e)
         return None
+
+def _rich_text(value):
+    return [{"type": "text", "text": {"content": str(value)[:NOTION_TEXT_LIMIT]}}]
+
+def item_page(item, index, parent_type="page_id", title_property="title", property_map=None):
+    """(title, content, properties) for one list item, e.g. an email from the Gmail trigger."""
+    if isinstance(item, dict):
+        title = item.get("subject") or item.get("title") or f"Item {index + 1}"
+        content = item.get("body") or item.get("content") or item.get("snippet") or ""
+    else:
+        item, title, content = {}, f"Item {index + 1}", str(item)
+    # Page parents take the title as a bare rich text list, database rows as a typed property
+    properties = {title_property: _rich_text(title) if parent_type == "page_id" else {"title": _rich_text(title)}}
+    for key, name in (property_map or {}).items():
+        if item.get(key) is not None:
+            properties[name] = {"rich_text": _rich_text(item[key])}
+    return title, content, properties
+
+def create_pages(token, items, parent_id, parent_type="page_id", concurrency=NOTION_BULK_CONCURRENCY,
+                 title_property=None, property_map=None):
+    """
+    Creates one page per item under `parent_id` (database rows with parent_type="database_id").
+    Up to `concurrency` pages are in flight while the per-token rate limiter paces them.
+    Returns [{"index", "result"} | {"index", "error"}] in input order; failures don't stop the rest.
+    `property_map` maps item keys to text properties of the database (e.g. {"from": "Sender"}).
+    """
+    title_property = title_property or ("Name" if parent_type == "database_id" else "title")
+
+    def create(index, item):
+        title, content, properties = item_page(item, index, parent_type, title_property, property_map)
+        try:
+            page = create_page(token, title, content, parent_id, parent_type, properties)
+            return {"index": index, "result": {"id": page.get("id"), "url": page.get("url")}}
+        except Exception as e:
+            print(f"Notion create page error (item {index}):", e)
+            return {"index": index, "error": str(e)}
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        return list(pool.map(create, range(len(items)), items))
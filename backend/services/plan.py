@@ -0,0 +1,179 @@
+# backend/services/plan.py
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Any, Callable, Mapping, Optional, Tuple
+
+# Max number of compiled plans kept in memory per process
+PLAN_CACHE_SIZE = int(os.environ.get("WORKFLOW_PLAN_CACHE_SIZE", "256"))
+
+
+@dataclass(frozen=True)
+class WorkflowPlan:
+    """Immutable, validated execution plan for one version of a workflow."""
+    levels: Tuple[Tuple[str, ...], ...]
+    order: Tuple[str, ...]
+    steps_by_id: Mapping[str, dict]
+    handlers: Mapping[str, Optional[Callable[..., Any]]]
+    # Streaming source step id -> downstream step ids (plan order) that consume its items
+    stream_sources: Mapping[str, Tuple[str, ...]] = field(default_factory=lambda: MappingProxyType({}))
+
+
+def build_levels(steps, edges):
+    """
+    Groups step ids into dependency levels (Kahn's algorithm).
+    Every step in a level only depends on steps from earlier levels,
+    so all steps of one level can run at the same time.
+    """
+    step_ids = [step["id"] for step in steps]
+    graph = {step_id: [] for step_id in step_ids}
+    indegree = {step_id: 0 for step_id in step_ids}
+    for edge in edges:
+        source = edge["source"]
+        target = edge["target"]
+        if source not in graph or target not in graph:
+            continue  # Edge points at a step that is not in this workflow
+        graph[source].append(target)
+        indegree[target] += 1
+
+    levels = []
+    current = [step_id for step_id in step_ids if indegree[step_id] == 0]
+    while current:
+        levels.append(current)
+        following = []
+        for step_id in current:
+            for neighbor in graph[step_id]:
+                indegree[neighbor] -= 1
+                if indegree[neighbor] == 0:
+                    following.append(neighbor)
+        current = following
+
+    if sum(len(level) for level in levels) != len(step_ids):
+        raise ValueError("Workflow contains a cycle")
+    return levels
+
+
+def compile_workflow(steps, edges, registry):
+    """
+    Validates a workflow and compiles it into a WorkflowPlan.
+    Raises ValueError for duplicate step ids, dangling edges or cycles.
+    """
+    steps_by_id = {}
+    for step in steps:
+        if step["id"] in steps_by_id:
+            raise ValueError(f"Duplicate step id: {step['id']}")
+        steps_by_id[step["id"]] = step
+    for edge in edges:
+        for end in ("source", "target"):
+            if edge.get(end) not in steps_by_id:
+                raise ValueError(f"Edge {end} points at unknown step: {edge.get(end)}")
+
+    levels = build_levels(steps, edges)
+    order = tuple(step_id for level in levels for step_id in level)
+    handlers = {}
+    stream_sources = {}
+    for step_id, step in steps_by_id.items():
+        key = (step.get("type"), step.get("service"))
+        if step.get("type") == "map":
+            # Map steps are run by the engine; bind the handler of the per-item sub-step
+            substep = step.get("substep")
+            if not substep:
+                raise ValueError(f"Map step {step_id} has no substep")
+            handlers[step_id] = registry.get((substep.get("type"), substep.get("service")))
+        elif step.get("stream") and registry.get(key + ("stream",)):
+            # Item-streaming mode: the source yields records, downstream steps run per record
+            handlers[step_id] = registry[key + ("stream",)]
+            stream_sources[step_id] = _stream_consumers(step_id, order, edges)
+        else:
+            handlers[step_id] = registry.get(key)
+    streamed = {step_id for consumers in stream_sources.values() for step_id in consumers}
+    if streamed & set(stream_sources):
+        raise ValueError("Streaming steps cannot be nested")
+    return WorkflowPlan(
+        levels=tuple(tuple(level) for level in levels),
+        order=order,
+        steps_by_id=MappingProxyType(steps_by_id),
+        handlers=MappingProxyType(handlers),
+        stream_sources=MappingProxyType(stream_sources),
+    )
+
+
+def _stream_consumers(source_id, order, edges):
+    """
+    Returns every step downstream of a streaming source, in plan order. They run once
+    per streamed item, so they may only depend on the source or on each other.
+    """
+    parents = {}
+    for edge in edges:
+        parents.setdefault(edge["target"], set()).add(edge["source"])
+    consumers = []
+    chain = {source_id}
+    for step_id in order:
+        if step_id in chain or not parents.get(step_id, set()) & chain:
+            continue
+        if not parents[step_id] <= chain:
+            raise ValueError(f"Step {step_id} mixes streamed and non-streamed inputs")
+        consumers.append(step_id)
+        chain.add(step_id)
+    return tuple(consumers)
+
+
+def content_version(workflow_json):
+    """Version key for workflows that are not saved in the DB (ad-hoc runs)."""
+    return hashlib.sha1(workflow_json.encode("utf-8")).hexdigest()
+
+
+class PlanCache:
+    """Bounded LRU of compiled plans keyed by (workflow_id, version)."""
+
+    def __init__(self, maxsize=PLAN_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._plans = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, workflow_id, version):
+        key = (str(workflow_id), str(version))
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is not None:
+                self._plans.move_to_end(key)
+            return plan
+
+    def put(self, workflow_id, version, plan):
+        key = (str(workflow_id), str(version))
+        with self._lock:
+            self._plans[key] = plan
+            self._plans.move_to_end(key)
+            while len(self._plans) > self.maxsize:
+                self._plans.popitem(last=False)
+
+    def get_or_compile(self, workflow_id, version, load_workflow, registry):
+        """
+        Returns the cached plan, compiling it on a miss. `load_workflow()` is only
+        called on a miss and must return the workflow dict (with workflow/edges).
+        """
+        plan = self.get(workflow_id, version)
+        if plan is None:
+            workflow = load_workflow()
+            plan = compile_workflow(workflow.get("workflow", []), workflow.get("edges", []), registry)
+            self.put(workflow_id, version, plan)
+        return plan
+
+    def invalidate(self, workflow_id):
+        """Drops every cached version of a workflow."""
+        with self._lock:
+            for key in [key for key in self._plans if key[0] == str(workflow_id)]:
+                del self._plans[key]
+
+    def clear(self):
+        with self._lock:
+            self._plans.clear()
+
+    def __len__(self):
+        return len(self._plans)
+
+
+plan_cache = PlanCache()
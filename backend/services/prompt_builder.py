@@ -0,0 +1,107 @@
+# backend/services/prompt_builder.py
+# Compact, token-budgeted prompt assembly for OpenAI steps, with map-reduce
+# summarization when the input doesn't fit.
+import asyncio
+import math
+import os
+
+try:
+    import tiktoken
+except ImportError:  # Optional: fall back to a characters-per-token estimate
+    tiktoken = None
+
+PROMPT_TOKEN_BUDGET = int(os.environ.get("PROMPT_TOKEN_BUDGET", "12000"))  # Input tokens per request
+PROMPT_CHUNK_TOKENS = int(os.environ.get("PROMPT_CHUNK_TOKENS", "3000"))  # Input tokens per map call
+PROMPT_MAP_CONCURRENCY = int(os.environ.get("PROMPT_MAP_CONCURRENCY", "4"))
+CHARS_PER_TOKEN = 4  # Rough average for English text when tiktoken isn't installed
+
+_encoding = None
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None and tiktoken is not None:
+        _encoding = tiktoken.get_encoding("o200k_base")  # gpt-4.1 / gpt-4o family
+    return _encoding
+
+
+def count_tokens(text):
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def truncate_tokens(text, max_tokens):
+    encoding = _get_encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text)
+        return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+    return text[:max_tokens * CHARS_PER_TOKEN]
+
+
+def serialize_record(record):
+    """One record as compact text: emails as a header line plus body, other dicts as key: value."""
+    if not isinstance(record, dict):
+        return str(record)
+    if "subject" in record or "from" in record:
+        header = " | ".join(
+            f"{label}: {record[key]}" for key, label in (("from", "From"), ("subject", "Subject"), ("date", "Date"))
+            if record.get(key)
+        )
+        body = record.get("body") or record.get("snippet") or ""
+        return f"{header}\n{body}".strip()
+    return " | ".join(f"{key}: {value}" for key, value in record.items() if value not in (None, "", [], {}))
+
+
+def serialize_records(records):
+    if not isinstance(records, list):
+        records = [records]
+    return [serialize_record(record) for record in records]
+
+
+def fits(instruction, texts, budget=PROMPT_TOKEN_BUDGET):
+    return count_tokens(instruction) + sum(count_tokens(text) + 1 for text in texts) <= budget
+
+
+def chunk_texts(texts, chunk_tokens=PROMPT_CHUNK_TOKENS):
+    """Greedily packs texts into chunks of at most `chunk_tokens`; oversized texts are truncated."""
+    chunks, current, size = [], [], 0
+    for text in texts:
+        tokens = count_tokens(text)
+        if tokens > chunk_tokens:
+            text, tokens = truncate_tokens(text, chunk_tokens), chunk_tokens
+        if current and size + tokens > chunk_tokens:
+            chunks.append("\n\n".join(current))
+            current, size = [], 0
+        current.append(text)
+        size += tokens + 1
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+async def map_reduce(instruction, texts, submit, budget=PROMPT_TOKEN_BUDGET, chunk_tokens=PROMPT_CHUNK_TOKENS,
+                     concurrency=PROMPT_MAP_CONCURRENCY):
+    """
+    Answers `instruction` over texts too large for one request: each chunk is condensed
+    by a map call (at most `concurrency` at once), then the partial results are combined,
+    reducing again in rounds while they still exceed the budget.
+    `submit(instruction, text)` is awaited for every model call.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def condense(index, count, chunk):
+        map_instruction = (f"This is part {index} of {count} of a larger input. Extract everything from it "
+                           f"that is needed for the following task, as compact notes:\n{instruction}")
+        async with semaphore:
+            return await submit(map_instruction, chunk)
+
+    notes = texts
+    while True:
+        chunks = chunk_texts(notes, chunk_tokens)
+        notes = await asyncio.gather(*(condense(i, len(chunks), chunk) for i, chunk in enumerate(chunks, 1)))
+        if fits(instruction, notes, budget) or len(chunks) == 1:
+            break
+    parts = "\n\n".join(f"Part {i}:\n{note}" for i, note in enumerate(notes, 1))
+    return await submit(instruction, f"Notes extracted from each part of the input:\n{parts}")
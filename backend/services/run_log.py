@@ -0,0 +1,133 @@
+# backend/services/run_log.py
+import os
+import threading
+import time
+from collections import deque
+
+import redis
+
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+RUN_LOG_FLUSH_INTERVAL = float(os.environ.get("RUN_LOG_FLUSH_INTERVAL", "0.2"))  # Seconds between batched writes
+RUN_LOG_BATCH_SIZE = 200  # Records per pipeline; a full batch is flushed right away
+RUN_LOG_BUFFER_SIZE = 10000  # Records held while Redis is slow; the oldest are dropped beyond that
+RUN_LOG_MAX_MESSAGE = int(os.environ.get("RUN_LOG_MAX_MESSAGE", "2000"))  # Characters kept per record
+RUN_LOG_MAXLEN = int(os.environ.get("RUN_LOG_MAXLEN", "10000"))  # Entries kept per log stream (approximate)
+RUN_LOG_TTL = int(os.environ.get("RUN_LOG_TTL", str(7 * 24 * 3600)))  # Idle log streams expire after a week
+
+r = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+
+
+def log_key(workflow_id):
+    # A Redis Stream: entry ids let WebSocket viewers resume where they left off
+    return f"workflow:{workflow_id}:log_stream"
+
+
+def run_log_key(run_id):
+    # Each run also gets its own stream, so concurrent runs of a workflow don't interleave
+    return f"run:{run_id}:log"
+
+
+def stream_id(entry_id):
+    ms, _, seq = entry_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+def log_record(message, run_id=None, step=None, level="info"):
+    """Stream fields for one log line; `size` is the original length when the message was truncated."""
+    message = str(message)
+    return {
+        "message": message if len(message) <= RUN_LOG_MAX_MESSAGE else message[:RUN_LOG_MAX_MESSAGE] + "…",
+        "level": level,
+        "ts": f"{time.time():.3f}",
+        "run_id": "" if run_id is None else str(run_id),
+        "step": step or "",
+        "size": str(len(message)),
+    }
+
+
+def write_records(client, entries):
+    """Appends [(key, record)] in one pipelined round trip, trimming and refreshing the TTL of each stream."""
+    pipe = client.pipeline(transaction=False)
+    for key, record in entries:
+        pipe.xadd(key, record, maxlen=RUN_LOG_MAXLEN, approximate=True)
+    for key in {key for key, _ in entries}:
+        pipe.expire(key, RUN_LOG_TTL)
+    pipe.execute()
+
+
+def log_to_redis(workflow_id, message, level="info", run_id=None):
+    # For one-off lines outside a run (queued, resumed...); runs log through RunLogger
+    print(f"[LOG] [{workflow_id}] {message}")  # Debug print
+    record = log_record(message, run_id, level=level)
+    keys = [log_key(workflow_id)] + ([run_log_key(run_id)] if run_id is not None else [])
+    write_records(r, [(key, record) for key in keys])
+
+
+def read_run_log(run_id, after=None, limit=100, client=None):
+    """
+    One page of a run's log: ([(entry_id, record)], next) with the entries after entry id
+    `after` (from the start when None). `next` is the `after` of the following page, or None.
+    """
+    client = client or r
+    start = after or "0-0"
+    start_id = stream_id(start)  # ValueError for a malformed offset, before Redis would reject it
+    entries = [(entry_id, record) for entry_id, record in
+               client.xrange(run_log_key(run_id), min=start, count=limit + 2)
+               if stream_id(entry_id) > start_id]
+    page = entries[:limit]
+    return page, (page[-1][0] if len(entries) > limit else None)
+
+
+class RunLogger:
+    """
+    Structured log of one run: `logger(message)` only buffers a record (run id, step,
+    level, timestamp, size); a background thread writes the buffer to the workflow's
+    log stream (and the run's own stream) in pipelined batches. close() flushes what's left and stops the thread.
+    """
+
+    def __init__(self, workflow_id, run_id=None, client=None, flush_interval=RUN_LOG_FLUSH_INTERVAL,
+                 batch_size=RUN_LOG_BATCH_SIZE):
+        self.keys = [log_key(workflow_id)] + ([run_log_key(run_id)] if run_id is not None else [])
+        self.run_id = run_id
+        self.client = client or r
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.buffer = deque(maxlen=RUN_LOG_BUFFER_SIZE)
+        self.dropped = 0
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=f"run-log-{workflow_id}", daemon=True)
+        self._thread.start()
+
+    def __call__(self, message, step=None, level="info"):
+        if len(self.buffer) == self.buffer.maxlen:
+            self.dropped += 1
+        self.buffer.append(log_record(message, self.run_id, step, level))
+        if len(self.buffer) >= self.batch_size:
+            self._wake.set()
+
+    def flush(self):
+        while self.buffer:
+            batch = []
+            while self.buffer and len(batch) < self.batch_size:
+                record = self.buffer.popleft()
+                batch.extend((key, record) for key in self.keys)
+            try:
+                write_records(self.client, batch)
+            except redis.RedisError as e:
+                print(f"Run log write failed, {len(batch)} records lost: {e}")
+                return
+
+    def close(self):
+        self._closed = True
+        self._wake.set()
+        self._thread.join()
+        self.flush()
+        if self.dropped:
+            print(f"Run log buffer overflowed, {self.dropped} records dropped")
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
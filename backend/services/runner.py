@@ -0,0 +1,267 @@
+# backend/services/runner.py
+import asyncio
+import json
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import load_only
+
+from database import SessionLocal
+from models.db import UserDB, WorkflowRunDB
+from services.executor import execute_plan, StepExecutionError
+from services.llm_batch import BatchPending, collect_batches
+from services.plan import plan_cache, content_version
+from services.run_log import RunLogger, log_to_redis
+from services.step_registry import STEP_REGISTRY
+
+_loops = threading.local()
+
+
+def run_async(coro):
+    """
+    Runs `coro` on a long-lived event loop owned by the calling thread. Unlike asyncio.run
+    the loop survives between runs, so pooled async clients (OpenAI) keep their connections.
+    """
+    loop = getattr(_loops, "loop", None)
+    if loop is None or loop.is_closed():
+        loop = _loops.loop = asyncio.new_event_loop()
+    return loop.run_until_complete(coro)
+
+
+def create_run(db, workflow_id, workflow_json, user=None, workflow_version=None):
+    """
+    Persists a queued run record and returns it. `workflow_json` is the workflow+edges
+    JSON string; runs of saved workflows pass the WorkflowDB version so the worker can
+    reuse the cached plan, ad-hoc runs are versioned by content hash.
+    """
+    run = WorkflowRunDB(
+        id=str(uuid.uuid4()),
+        workflow_id=str(workflow_id),
+        workflow_version=str(workflow_version) if workflow_version is not None else content_version(workflow_json),
+        owner_id=user.id if user else None,
+        status="queued",
+        workflow_json=workflow_json,
+        steps_json=json.dumps({}),
+        created_at=datetime.utcnow(),
+    )
+    db.add(run)
+    db.commit()
+    return run
+
+
+def run_to_dict(run):
+    return {
+        **run_summary(run),
+        "steps": json.loads(run.steps_json) if run.steps_json else {},
+        "context": json.loads(run.context_json) if run.context_json else None,
+    }
+
+
+def run_summary(run):
+    """The run index entry: status and timings, without the workflow snapshot or context."""
+    return {
+        "run_id": run.id,
+        "workflow_id": run.workflow_id,
+        "status": run.status,
+        "error": run.error,
+        "created_at": run.created_at.isoformat() if run.created_at else None,
+        "started_at": run.started_at.isoformat() if run.started_at else None,
+        "finished_at": run.finished_at.isoformat() if run.finished_at else None,
+        "duration_ms": run.duration_ms,
+        "step_timings": json.loads(run.step_timings_json) if run.step_timings_json else {},
+    }
+
+
+def list_runs(db, workflow_id=None, status=None, limit=20, cursor=None):
+    """
+    One page of runs, newest first: ([run summary], next_cursor). `cursor` is the
+    next_cursor of the previous page (keyset pagination on created_at, id).
+    """
+    query = db.query(WorkflowRunDB).options(load_only(
+        WorkflowRunDB.id, WorkflowRunDB.workflow_id, WorkflowRunDB.status, WorkflowRunDB.error,
+        WorkflowRunDB.created_at, WorkflowRunDB.started_at, WorkflowRunDB.finished_at,
+        WorkflowRunDB.duration_ms, WorkflowRunDB.step_timings_json,
+    ))
+    if workflow_id is not None:
+        query = query.filter(WorkflowRunDB.workflow_id == str(workflow_id))
+    if status:
+        query = query.filter(WorkflowRunDB.status == status)
+    if cursor:
+        created, _, last_id = cursor.partition("|")
+        created = datetime.fromisoformat(created)
+        query = query.filter(or_(
+            WorkflowRunDB.created_at < created,
+            and_(WorkflowRunDB.created_at == created, WorkflowRunDB.id < last_id),
+        ))
+    runs = query.order_by(WorkflowRunDB.created_at.desc(), WorkflowRunDB.id.desc()).limit(limit + 1).all()
+    page = runs[:limit]
+    next_cursor = f"{page[-1].created_at.isoformat()}|{page[-1].id}" if len(runs) > limit else None
+    return [run_summary(run) for run in page], next_cursor
+
+
+def execute_run(run_id, gmail_token=None, notion_token=None, resume=False):
+    """
+    Runs a queued workflow run to completion, recording per-step progress and
+    the final context on the run record. Called from the Celery worker.
+    Every completed step checkpoints the context on the run record; with
+    `resume=True` completed steps are skipped and the saved context is reused.
+    Steps that handed work to the OpenAI Batch API leave the run "waiting" with
+    its jobs saved; resuming it continues once they are done (see resume_waiting_runs).
+    """
+    db = SessionLocal()
+    try:
+        run = db.query(WorkflowRunDB).filter_by(id=run_id).first()
+        if not run:
+            print(f"Run {run_id} not found")
+            return None
+
+        workflow_id = run.workflow_id
+        user = db.query(UserDB).filter_by(id=run.owner_id).first() if run.owner_id else None
+        tokens = {
+            "gmail_token": gmail_token,
+            "notion_token": notion_token,
+            "user": user,  # Pass the user object
+            "workflow_id": workflow_id,  # Scopes per-workflow state such as the Gmail sync cursor
+        }
+        try:
+            plan = plan_cache.get_or_compile(
+                workflow_id, run.workflow_version, lambda: json.loads(run.workflow_json), STEP_REGISTRY
+            )
+        except (KeyError, ValueError) as e:
+            run.status = "failed"
+            run.error = f"Invalid workflow: {str(e)}"
+            run.finished_at = datetime.utcnow()
+            db.commit()
+            log_to_redis(workflow_id, run.error, level="error", run_id=run_id)
+            return run.status
+        # Answers of every Batch API job this run waited on so far: a step may pause more than
+        # once (map_reduce: chunk notes, then the final answer) and needs all of them to finish
+        answers = json.loads(run.batch_answers_json) if resume and run.batch_answers_json else {}
+        if resume and run.pending_batches_json:
+            try:
+                collected = run_async(collect_batches(json.loads(run.pending_batches_json)))
+            except Exception as e:
+                # Failed or expired job: the next resume submits the waiting steps again
+                run.status = "failed"
+                run.error = f"OpenAI batch failed: {str(e)}"
+                run.pending_batches_json = None
+                db.commit()
+                log_to_redis(workflow_id, run.error, level="error", run_id=run_id)
+                return run.status
+            if collected is None:
+                run.status = "waiting"
+                db.commit()
+                return run.status
+            answers.update(collected)
+            run.batch_answers_json = json.dumps(answers)
+            run.pending_batches_json = None
+            db.commit()
+        if answers:
+            tokens["batch_answers"] = answers
+        step_status = {step_id: "pending" for step_id in plan.order}
+        context = {}
+        completed = set()
+        if resume:
+            saved_status = json.loads(run.steps_json) if run.steps_json else {}
+            completed = {step_id for step_id in plan.order if saved_status.get(step_id) == "completed"}
+            context = json.loads(run.context_json) if run.context_json else {}
+            step_status.update({step_id: "completed" for step_id in completed})
+            run.error = None
+
+        step_started = {}
+        step_timings = json.loads(run.step_timings_json) if resume and run.step_timings_json else {}
+
+        def on_step(step_id, status):
+            step_status[step_id] = status
+            run.steps_json = json.dumps(step_status)
+            if status == "running":
+                step_started[step_id] = time.perf_counter()
+            elif step_id in step_started:
+                step_timings[step_id] = round((time.perf_counter() - step_started.pop(step_id)) * 1000)
+                run.step_timings_json = json.dumps(step_timings)
+            if status == "completed":
+                # Checkpoint: the context now holds this step's output
+                run.context_json = json.dumps(context, default=str)
+            db.commit()
+
+        run.status = "running"
+        run.started_at = datetime.utcnow()
+        db.commit()
+        log = RunLogger(workflow_id, run_id)  # Buffered: steps don't wait on Redis for each line
+        log("------------------------------------------------------")
+        log(f"Workflow {'resumed' if resume else 'started'} (run {run_id}).")
+
+        try:
+            run_async(execute_plan(
+                plan,
+                tokens,
+                context=context,
+                log=log,
+                on_step=on_step,
+                completed=completed,
+            ))
+            run.status = "succeeded"
+            log("Workflow executed.")
+        except BatchPending as e:
+            run.status = "waiting"
+            run.pending_batches_json = json.dumps(e.jobs)
+            log(f"Workflow waiting: {str(e)}. It resumes once they are done.")
+        except StepExecutionError as e:
+            run.status = "failed"
+            run.error = str(e)
+            log(f"Workflow failed: {str(e)}", step=e.step_id, level="error")
+        except Exception as e:
+            # Not a step failure (e.g. a checkpoint commit failed): still fail the run so it can be resumed
+            db.rollback()
+            run.status = "failed"
+            run.error = f"Run failed: {str(e)}"
+            run.steps_json = json.dumps(step_status)
+            log(run.error, level="error")
+        finally:
+            log.close()
+
+        run.context_json = json.dumps(context, default=str)
+        if run.status == "failed" and answers:
+            # Let a resume submit the items the Batch API had no answer for again
+            run.batch_answers_json = json.dumps({key: answer for key, answer in answers.items() if answer is not None})
+        elif run.status == "succeeded":
+            run.batch_answers_json = None
+        if run.status != "waiting":
+            run.pending_batches_json = None
+            run.finished_at = datetime.utcnow()
+            run.duration_ms = round((run.finished_at - run.started_at).total_seconds() * 1000)
+        db.commit()
+        return run.status
+    finally:
+        db.close()
+
+
+def resume_waiting_runs():
+    """
+    Resumes every run waiting on OpenAI Batch API jobs; those whose jobs are still
+    running go back to waiting. Called periodically by celery beat. Runs resume with
+    the tokens a scheduled run has (the owner's Gmail token, no request headers).
+    Returns the number of runs that finished (succeeded or failed).
+    """
+    db = SessionLocal()
+    try:
+        run_ids = [run_id for (run_id,) in db.query(WorkflowRunDB.id).filter_by(status="waiting")]
+    finally:
+        db.close()
+    resumed = 0
+    for run_id in run_ids:
+        db = SessionLocal()
+        try:
+            # Claim the run so a concurrent resume (API or another poll) doesn't run it twice
+            claimed = db.query(WorkflowRunDB).filter_by(id=run_id, status="waiting").update(
+                {"status": "queued"}, synchronize_session=False
+            )
+            db.commit()
+        finally:
+            db.close()
+        if claimed and execute_run(run_id, resume=True) != "waiting":
+            resumed += 1
+    return resumed
@@ -0,0 +1,120 @@
+# backend/services/step_cache.py
+import asyncio
+import functools
+import hashlib
+import inspect
+import json
+import os
+import time
+
+import redis
+
+from services.run_log import r
+
+# Opt-in memoization of step results in Redis, keyed by a hash of
+# (service, action, step params, normalized inputs).
+STEP_CACHE_MAX_ENTRIES = int(os.environ.get("STEP_CACHE_MAX_ENTRIES", "1000"))
+STEP_CACHE_DEFAULT_TTL = int(os.environ.get("STEP_CACHE_DEFAULT_TTL", "3600"))  # seconds
+
+ENTRY_KEY = "stepcache:entry:{}"
+INDEX_KEY = "stepcache:index"  # sorted set of entry hashes scored by last access time
+STATS_KEY = "stepcache:stats"
+
+
+def _normalize(value):
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def cache_key(service, action, params, inputs):
+    return hashlib.sha256(_normalize([service, action, params, inputs]).encode("utf-8")).hexdigest()
+
+
+def get_cached(service, action, key):
+    """Returns (hit, value). Counts a hit or miss for service/action."""
+    raw = r.get(ENTRY_KEY.format(key))
+    if raw is None:
+        r.hincrby(STATS_KEY, f"{service}:{action}:misses", 1)
+        return False, None
+    r.zadd(INDEX_KEY, {key: time.time()})
+    r.hincrby(STATS_KEY, f"{service}:{action}:hits", 1)
+    return True, json.loads(raw)
+
+
+def set_cached(key, value, ttl=STEP_CACHE_DEFAULT_TTL):
+    """Stores a JSON-serializable value and evicts least recently used entries past the size limit."""
+    try:
+        raw = json.dumps(value)
+    except (TypeError, ValueError):
+        return  # Not cacheable
+    pipe = r.pipeline()
+    pipe.set(ENTRY_KEY.format(key), raw, ex=ttl)
+    pipe.zadd(INDEX_KEY, {key: time.time()})
+    pipe.zcard(INDEX_KEY)
+    size = pipe.execute()[-1]
+    if size > STEP_CACHE_MAX_ENTRIES:
+        evicted = r.zpopmin(INDEX_KEY, size - STEP_CACHE_MAX_ENTRIES)
+        if evicted:
+            r.delete(*[ENTRY_KEY.format(member) for member, _ in evicted])
+
+
+def cache_stats():
+    stats = r.hgetall(STATS_KEY)
+    return {
+        "entries": r.zcard(INDEX_KEY),
+        "max_entries": STEP_CACHE_MAX_ENTRIES,
+        "counters": {name: int(count) for name, count in stats.items()},
+    }
+
+
+def _step_params(step):
+    # The step id is workflow specific and the cache settings don't change the output;
+    # the rest of the step config does
+    return {k: v for k, v in step.items() if k not in ("id", "parentId", "cache", "cache_ttl")}
+
+
+def cached_step(ttl=STEP_CACHE_DEFAULT_TTL, inputs=lambda step, context: context.get("trigger_data")):
+    """
+    Decorator for step handlers. Results are memoized for `ttl` seconds (a step can
+    override it with "cache_ttl" or opt out with "cache": false). `inputs(step, context)`
+    picks the part of the context the handler actually reads.
+    """
+    def decorator(func):
+        def lookup(step, context):
+            if step.get("cache") is False:
+                return None, False, None
+            key = cache_key(step.get("service"), step.get("action"), _step_params(step), inputs(step, context))
+            try:
+                hit, value = get_cached(step.get("service"), step.get("action"), key)
+            except redis.RedisError as e:
+                print("Step cache unavailable:", e)  # Cache is best effort, run the step
+                return None, False, None
+            return key, hit, value
+
+        def store(step, key, result):
+            if key and result is not None:
+                try:
+                    set_cached(key, result, ttl=int(step.get("cache_ttl") or ttl))  # Saved steps carry None
+                except redis.RedisError as e:
+                    print("Step cache unavailable:", e)
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(step, context, tokens):
+                key, hit, value = await asyncio.to_thread(lookup, step, context)
+                if hit:
+                    return value
+                result = await func(step, context, tokens)
+                await asyncio.to_thread(store, step, key, result)
+                return result
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(step, context, tokens):
+            key, hit, value = lookup(step, context)
+            if hit:
+                return value
+            result = func(step, context, tokens)
+            store(step, key, result)
+            return result
+        return wrapper
+    return decorator
@@ -1,51 +1,111 @@
 from models.db import UserDB
-from services.gmail import check_new_email, get_valid_gmail_token
-from services.notion import create_notion_page
-from openai import OpenAI
-import os
-
-OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
+from services.gmail import check_new_email, iter_new_email, get_valid_gmail_token, load_bodies
+from services.gmail_sync import sync_new_email, iter_synced_email
+from services.notion import create_notion_page, create_pages, NOTION_BULK_CONCURRENCY
+from services.step_cache import cached_step
+from services.llm_batch import get_coalescer
+from services.prompt_builder import fits, map_reduce, serialize_records
+import asyncio
 
 STEP_REGISTRY = {}
 
-def register_step(step_type, service):
+def register_step(step_type, service, stream=False):
+    # Handlers may be plain functions or coroutines (`async def`). The engine
+    # awaits coroutine handlers on the event loop and runs plain ones in a thread.
+    # With stream=True the handler is a (sync or async) generator yielding items;
+    # it is used for steps that set "stream": true, and downstream steps then run once per item.
     def decorator(func):
-        STEP_REGISTRY[(step_type, service)] = func
+        key = (step_type, service, "stream") if stream else (step_type, service)
+        STEP_REGISTRY[key] = func
         return func
     return decorator
 
+def _incremental(step, tokens, gmail_token):
+    # Only mail that arrived since this workflow's last run (historyId cursor); opt out with "incremental": false
+    return bool(gmail_token and tokens.get("user") and step.get("incremental", True))
+
+def _full(step):
+    # Email bodies are fetched lazily when a step reads them; "format": "full" downloads them up front
+    return step.get("format") == "full"
+
 @register_step("trigger", "gmail")
 def handle_gmail_trigger(step, context, tokens):
     user = tokens.get("user")
-    gmail_token = get_valid_gmail_token(user)
-    emails = check_new_email(gmail_token)
+    gmail_token = get_valid_gmail_token(user) if user else tokens.get("gmail_token")
+    if _incremental(step, tokens, gmail_token):
+        emails = sync_new_email(user, gmail_token, tokens.get("workflow_id", "default"), _full(step))
+    else:
+        emails = check_new_email(gmail_token, _full(step))
     if emails:
         context["trigger_data"] = emails
     return emails
 
+@register_step("trigger", "gmail", stream=True)
+def stream_gmail_trigger(step, context, tokens):
+    user = tokens.get("user")
+    gmail_token = get_valid_gmail_token(user) if user else tokens.get("gmail_token")
+    if _incremental(step, tokens, gmail_token):
+        yield from iter_synced_email(user, gmail_token, tokens.get("workflow_id", "default"), _full(step))
+    else:
+        yield from iter_new_email(gmail_token, _full(step))
+
+NOTION_BULK_ACTIONS = {"create_pages", "bulk_create_pages"}
+DEFAULT_NOTION_PARENT = "Try-AI-Meeting-Notes-21fa46cfaac28026912dc2e6a0539ea5"
+
 @register_step("action", "notion")
 def handle_notion_action(step, context, tokens):
     notion_token = tokens.get("notion_token")
+    if step.get("action") in NOTION_BULK_ACTIONS:
+        return bulk_notion_pages(step, context, notion_token)
     trigger_data = context.get("trigger_data")  # Use data from the previous step
     if trigger_data and notion_token:
         title = "new page"
         content =  "Created from EverythingConnected"
         # parent_id = step.get("parentId", "Try-AI-Meeting-Notes-21fa46cfaac28026912dc2e6a0539ea5")
-        return create_notion_page(notion_token, title=title, content=content, parent_id="Try-AI-Meeting-Notes-21fa46cfaac28026912dc2e6a0539ea5")
+        return create_notion_page(notion_token, title=title, content=content, parent_id=DEFAULT_NOTION_PARENT)
+
+def bulk_notion_pages(step, context, notion_token):
+    # One page (or database row, with "parentType": "database_id") per item of the input list
+    items = context.get(step.get("items") or "trigger_data") or []
+    if not isinstance(items, list):
+        items = [items]
+    if not items or not notion_token:
+        return []
+    load_bodies(items)  # Lazy Gmail bodies in one batch rather than one fetch per page
+    return create_pages(
+        notion_token,
+        items,
+        parent_id=step.get("parentId") or DEFAULT_NOTION_PARENT,
+        parent_type=step.get("parentType") or "page_id",
+        concurrency=step.get("concurrency") or NOTION_BULK_CONCURRENCY,
+        title_property=step.get("titleProperty"),
+        property_map=step.get("propertyMap"),
+    )
 
 @register_step("action", "openai")
-def handle_openai_action(step, context, tokens):
+@cached_step(ttl=6 * 3600)
+async def handle_openai_action(step, context, tokens):
     trigger_data = context.get("trigger_data")  # Use data from the Gmail step
     if trigger_data:
         prompt = step.get("prompt", "Summarize the following email:")
-        email_body = trigger_data
-        full_prompt = f"{prompt}\n\nEmail Content:\n{email_body}"
-        client = OpenAI(api_key=OPENAI_API_KEY)
-        response = client.chat.completions.create(
-            model="gpt-4.1-mini",
-            messages=[{"role": "user", "content": full_prompt}],
-            temperature=0.6,
-            max_tokens=300
+        await asyncio.to_thread(load_bodies, trigger_data)  # One batched fetch for the lazy bodies
+        records = serialize_records(trigger_data)
+        # Concurrent OpenAI steps (map items, fan-out branches) of one owner with the same prompt share
+        # one request; "batch": "offline" sends them to the Batch API instead (cheaper, may take hours)
+        mode = "offline" if step.get("batch") == "offline" else "live"
+        user = tokens.get("user")
+        owner = user.id if user else tokens.get("gmail_token")  # Ad-hoc runs: the mailbox the mail came from
+        answers = tokens.get("batch_answers")  # Set when a run waiting on its Batch API jobs resumes
+        coalescer = get_coalescer()
+        if fits(prompt, records):
+            return await coalescer.submit(
+                prompt, "Email Content:\n" + "\n\n".join(records), mode=mode, owner=owner, answers=answers
+            )
+        # Too big for one request: condense chunks concurrently, then answer from the notes
+        return await map_reduce(
+            prompt, records,
+            lambda instruction, text: coalescer.submit(
+                instruction, text, mode=mode, coalesce=False, owner=owner, answers=answers
+            ),
         )
-        return response.choices[0].message.content
     return None
\ No newline at end of file
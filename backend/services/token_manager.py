@@ -0,0 +1,101 @@
+# backend/services/token_manager.py
+# Per-process OAuth access token cache with single-flight refreshes.
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from database import SessionLocal
+from models.db import UserDB
+
+TOKEN_REFRESH_MARGIN = timedelta(seconds=int(os.environ.get("TOKEN_REFRESH_MARGIN_SECONDS", "300")))
+TOKEN_REFRESH_TIMEOUT = float(os.environ.get("TOKEN_REFRESH_TIMEOUT", "30"))  # seconds a caller waits for a refresh
+
+
+class TokenManager:
+    """
+    Caches access tokens per (provider, user id). Concurrent callers needing a refresh
+    share one in-flight request; a token that is still valid but expires within
+    `margin` is returned right away and refreshed in the background. Refreshed tokens
+    are written back to UserDB so other processes (and restarts) reuse them.
+    """
+
+    def __init__(self, session_factory=SessionLocal, margin=TOKEN_REFRESH_MARGIN):
+        self.session_factory = session_factory
+        self.margin = margin
+        self._providers = {}  # provider -> (refresh(refresh_token) -> token dict, (access, refresh, expiry) columns)
+        self._tokens = {}  # (provider, user_id) -> (access_token, expiry)
+        self._inflight = {}  # (provider, user_id) -> Future of the running refresh
+        self._lock = threading.RLock()
+        self._pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="token-refresh")
+
+    def register(self, provider, refresh, access_column, refresh_column, expiry_column):
+        """`refresh(refresh_token)` returns {"access_token", "expires_in"[, "refresh_token"]}."""
+        self._providers[provider] = (refresh, (access_column, refresh_column, expiry_column))
+
+    def get_token(self, provider, user):
+        key = (provider, user.id)
+        now = datetime.utcnow()
+        with self._lock:
+            cached = self._tokens.get(key) or self._from_user(provider, user)
+            if cached[0] and cached[1] and cached[1] > now:
+                self._tokens[key] = cached
+                if cached[1] - now < self.margin:
+                    self._start_refresh(key)  # Proactive; this caller keeps the current token
+                return cached[0]
+            future = self._start_refresh(key)
+        return future.result(timeout=TOKEN_REFRESH_TIMEOUT)
+
+    def invalidate(self, provider, user_id):
+        """Drops the cached token, e.g. after the user re-authorized and new tokens were saved."""
+        with self._lock:
+            self._tokens.pop((provider, user_id), None)
+
+    def _from_user(self, provider, user):
+        access_column, _, expiry_column = self._providers[provider][1]
+        return getattr(user, access_column), getattr(user, expiry_column)
+
+    def _start_refresh(self, key):
+        future = self._inflight.get(key)
+        if future is None:
+            future = self._pool.submit(self._refresh, key)
+            self._inflight[key] = future
+            future.add_done_callback(lambda done: self._finish(key, done))
+        return future
+
+    def _finish(self, key, future):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def _refresh(self, key):
+        provider, user_id = key
+        refresh, (access_column, refresh_column, expiry_column) = self._providers[provider]
+        db = self.session_factory()
+        try:
+            user = db.query(UserDB).filter_by(id=user_id).first()
+            if user is None:
+                raise LookupError(f"User {user_id} not found")
+            access_token, expiry = getattr(user, access_column), getattr(user, expiry_column)
+            # Another worker process may have refreshed it already
+            if not (access_token and expiry and expiry - datetime.utcnow() > self.margin):
+                try:
+                    token = refresh(getattr(user, refresh_column))
+                except Exception as e:
+                    print(f"{provider} token refresh failed for user {user_id}:", e)
+                    raise
+                access_token = token["access_token"]
+                expiry = datetime.utcnow() + timedelta(seconds=int(token["expires_in"]))
+                setattr(user, access_column, access_token)
+                setattr(user, expiry_column, expiry)
+                if token.get("refresh_token"):
+                    setattr(user, refresh_column, token["refresh_token"])
+                db.commit()
+            with self._lock:
+                self._tokens[key] = (access_token, expiry)
+            return access_token
+        finally:
+            db.close()
+
+
+token_manager = TokenManager()
@@ -0,0 +1,49 @@
+# backend/services/workflow_store.py
+# Lightweight workflow listings: summaries come from columns, the JSON definition
+# is only parsed when one workflow is opened.
+import json
+
+from sqlalchemy.orm import load_only
+
+from models.db import UserDB, WorkflowDB
+
+
+def step_count(wf_data):
+    return len(wf_data.get("workflow") or [])
+
+
+def workflow_summary(wf):
+    return {
+        "id": wf.id,
+        "name": wf.name,
+        "step_count": wf.step_count,
+        "version": wf.version,
+        "updated_at": wf.updated_at.isoformat() if wf.updated_at else None,
+    }
+
+
+def list_workflows(db, user_id, limit=50, cursor=None):
+    """
+    One page of a user's workflow summaries, oldest first: ([summary], next_cursor).
+    `cursor` is the next_cursor of the previous page (keyset pagination on id).
+    """
+    query = db.query(WorkflowDB).options(load_only(
+        WorkflowDB.id, WorkflowDB.name, WorkflowDB.step_count, WorkflowDB.version, WorkflowDB.updated_at,
+    )).filter(WorkflowDB.owner_id == user_id)
+    if cursor:
+        query = query.filter(WorkflowDB.id > int(cursor))
+    workflows = query.order_by(WorkflowDB.id).limit(limit + 1).all()
+    page = workflows[:limit]
+    # step_count of older rows is backfilled by migration 0007_workflow_summaries
+    return [workflow_summary(wf) for wf in page], (str(page[-1].id) if len(workflows) > limit else None)
+
+
+def get_user_id(db, username):
+    row = db.query(UserDB.id).filter_by(username=username).first()
+    return row.id if row else None
+
+
+def workflow_definition(wf):
+    wf_data = json.loads(wf.workflow_json)
+    wf_data["id"] = wf.id
+    return wf_data
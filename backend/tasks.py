@@ -1,6 +1,46 @@
 from celery_app import celery_app
+from database import SessionLocal
+from models.db import WorkflowDB
+from services.runner import create_run, execute_run, resume_waiting_runs
+from services.gmail_push import renew_watches
+
+
+@celery_app.task
+def execute_run_task(run_id, gmail_token=None, notion_token=None, resume=False):
+    return execute_run(run_id, gmail_token=gmail_token, notion_token=notion_token, resume=resume)
+
 
 @celery_app.task
 def run_workflow_task(workflow_id):
     print(f"Running workflow {workflow_id}")
-    # Add your workflow execution logic here
\ No newline at end of file
+    # Scheduled runs: create a run record from the saved workflow and execute it here
+    db = SessionLocal()
+    try:
+        wf = db.query(WorkflowDB).filter_by(id=workflow_id).first()
+        if not wf:
+            print(f"Workflow {workflow_id} not found")
+            return None
+        run_id = create_run(db, wf.id, wf.workflow_json, user=wf.owner, workflow_version=wf.version).id
+    finally:
+        db.close()
+    return execute_run(run_id)
+
+
+@celery_app.task
+def renew_gmail_watches_task():
+    # Scheduled by celery beat (see celery_app.beat_schedule)
+    db = SessionLocal()
+    try:
+        renewed = renew_watches(db)
+        print(f"Renewed {renewed} Gmail watches")
+        return renewed
+    finally:
+        db.close()
+
+
+@celery_app.task
+def resume_waiting_runs_task():
+    # Scheduled by celery beat: continues runs whose OpenAI batch jobs have finished
+    resumed = resume_waiting_runs()
+    print(f"Resumed {resumed} runs waiting on OpenAI batches")
+    return resumed
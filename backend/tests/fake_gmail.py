@@ -0,0 +1,137 @@
+import base64
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def make_message(msg_id, subject, body="Hello from the fake Gmail server", sender="alice@example.com"):
+    return {
+        "id": msg_id,
+        "snippet": body[:20],
+        "internalDate": "1700000000000",
+        "payload": {
+            "headers": [{"name": "From", "value": sender}, {"name": "Subject", "value": subject}],
+            "parts": [{
+                "mimeType": "text/plain",
+                "body": {"data": base64.urlsafe_b64encode(body.encode("utf-8")).decode("ascii")},
+            }],
+        },
+    }
+
+
+class FakeGmail:
+    """
+    Local stand-in for the Gmail REST API (list, get, profile, history, multipart batch).
+    `requests` records (method, path) for every call and `connections` the client
+    address of each TCP connection (it speaks keep-alive HTTP/1.1); ids in `rate_limited`
+    get a 429 inside batch responses. History ids before `oldest_history_id`
+    are treated as expired.
+    """
+
+    def __init__(self, messages):
+        self.messages = {message["id"]: message for message in messages}
+        self.order = [message["id"] for message in messages]
+        self.requests = []
+        self.connections = set()
+        self.rate_limited = set()
+        self.history_id = 100
+        self.oldest_history_id = 0
+        self.history = []  # (history_id, message id)
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                fake.connections.add(self.client_address)
+
+            def do_GET(self):
+                fake.requests.append(("GET", self.path))
+                url = urlparse(self.path)
+                if url.path == "/gmail/v1/users/me/messages":
+                    self._json(200, {"messages": [{"id": msg_id} for msg_id in fake.order]})
+                    return
+                if url.path == "/gmail/v1/users/me/profile":
+                    self._json(200, {"historyId": str(fake.history_id)})
+                    return
+                if url.path == "/gmail/v1/users/me/history":
+                    start = int(parse_qs(url.query)["startHistoryId"][0])
+                    if start < fake.oldest_history_id:
+                        self._json(404, {"error": "history expired"})
+                        return
+                    added = [
+                        {"id": str(history_id), "messagesAdded": [{"message": {
+                            "id": msg_id, "labelIds": ["INBOX", "CATEGORY_PERSONAL"],
+                        }}]}
+                        for history_id, msg_id in fake.history if history_id > start
+                    ]
+                    self._json(200, {"history": added, "historyId": str(fake.history_id)})
+                    return
+                match = re.fullmatch(r"/gmail/v1/users/me/messages/(\w+)", url.path)
+                if match and match.group(1) in fake.messages:
+                    self._json(200, fake.render(match.group(1), parse_qs(url.query)))
+                    return
+                self._json(404, {"error": "not found"})
+
+            def do_POST(self):
+                fake.requests.append(("POST", self.path))
+                body = self.rfile.read(int(self.headers["Content-Length"])).decode("utf-8")
+                boundary = "fake_batch_response"
+                parts = []
+                for msg_id, query in re.findall(r"GET /gmail/v1/users/me/messages/(\w+)\?(\S*)", body):
+                    if msg_id in fake.rate_limited:
+                        status, payload = "429 Too Many Requests", {"error": "rate limited"}
+                    else:
+                        status, payload = "200 OK", fake.render(msg_id, parse_qs(query))
+                    parts.append(
+                        f"--{boundary}\r\nContent-Type: application/http\r\n"
+                        f"Content-ID: <response-item-{msg_id}>\r\n\r\n"
+                        f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n\r\n"
+                        f"{json.dumps(payload)}\r\n"
+                    )
+                data = ("".join(parts) + f"--{boundary}--\r\n").encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", f"multipart/mixed; boundary={boundary}")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _json(self, status, payload):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def deliver(self, message):
+        """Simulates new mail: adds the message and a history record for it."""
+        self.history_id += 1
+        self.messages[message["id"]] = message
+        self.order.insert(0, message["id"])
+        self.history.append((self.history_id, message["id"]))
+
+    def render(self, msg_id, query):
+        message = self.messages[msg_id]
+        if query.get("format") == ["metadata"]:
+            wanted = set(query.get("metadataHeaders", []))
+            headers = [h for h in message["payload"]["headers"] if h["name"] in wanted]
+            return {**{key: message[key] for key in ("id", "snippet", "internalDate")}, "payload": {"headers": headers}}
+        return message
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
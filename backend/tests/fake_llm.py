@@ -0,0 +1,45 @@
+import asyncio
+import json
+import re
+
+
+class FakeLLMBackend:
+    """
+    Stand-in for llm_batch.OpenAIBackend. Answers "ANSWER(<prompt text>)", and multi-item
+    prompts with one such answer per item. `calls` records every prompt sent, `jobs`
+    every Batch API submission; `garble_multi` makes multi-item answers unparseable.
+    """
+
+    def __init__(self, latency=0.01, batch_polls=1):
+        self.latency = latency
+        self.batch_polls = batch_polls  # batch_results() calls before a job completes
+        self.calls = []
+        self.jobs = []
+        self.garble_multi = False
+
+    async def complete(self, prompt, max_tokens, json_mode=False):
+        self.calls.append(prompt)
+        await asyncio.sleep(self.latency)
+        if not json_mode:
+            return f"ANSWER({prompt.splitlines()[-1]})"
+        if self.garble_multi:
+            return "Sure! Here are your summaries:"
+        items = re.findall(r"### Item \d+\n(.*)", prompt)
+        return json.dumps({"results": [f"ANSWER({item})" for item in items]})
+
+    async def stream(self, prompt, max_tokens):
+        self.calls.append(prompt)
+        for word in f"ANSWER({prompt.splitlines()[-1]})".split(" "):
+            await asyncio.sleep(self.latency)
+            yield word + " "
+
+    async def submit_batch(self, prompts, max_tokens):
+        self.jobs.append({"prompts": prompts, "polls": 0})
+        return len(self.jobs) - 1
+
+    async def batch_results(self, job):
+        state = self.jobs[job]
+        state["polls"] += 1
+        if state["polls"] <= self.batch_polls:
+            return None
+        return [f"ANSWER({prompt.splitlines()[-1]})" for prompt in state["prompts"]]
@@ -0,0 +1,212 @@
+import asyncio
+import threading
+
+import pytest
+
+from backend.services.executor import execute_workflow, StepExecutionError
+from backend.services.plan import build_levels, compile_workflow, PlanCache
+
+
+def _steps(*ids):
+    return [{"id": step_id, "type": "action", "service": "fake"} for step_id in ids]
+
+
+def test_build_levels_groups_independent_branches():
+    steps = _steps("gmail", "openai", "notion", "report")
+    edges = [
+        {"source": "gmail", "target": "openai"},
+        {"source": "gmail", "target": "notion"},
+        {"source": "openai", "target": "report"},
+        {"source": "notion", "target": "report"},
+    ]
+    assert build_levels(steps, edges) == [["gmail"], ["openai", "notion"], ["report"]]
+
+
+def test_build_levels_rejects_cycles():
+    steps = _steps("a", "b")
+    edges = [{"source": "a", "target": "b"}, {"source": "b", "target": "a"}]
+    with pytest.raises(ValueError):
+        build_levels(steps, edges)
+
+
+@pytest.mark.asyncio
+async def test_execute_workflow_runs_level_concurrently():
+    steps = _steps("a", "b", "c")
+    barrier = threading.Barrier(3, timeout=2)
+
+    def handler(step, context, tokens):
+        barrier.wait()  # Only passes if all three steps run at the same time
+        return step["id"].upper()
+
+    order, context = await execute_workflow(steps, [], {}, {("action", "fake"): handler}, log=lambda m: None)
+    assert order == ["a", "b", "c"]
+    assert context == {"a_result": "A", "b_result": "B", "c_result": "C"}
+
+
+@pytest.mark.asyncio
+async def test_execute_workflow_awaits_coroutine_handlers():
+    steps = _steps("a", "b")
+    running = []
+
+    async def handler(step, context, tokens):
+        running.append(step["id"])
+        await asyncio.sleep(0.01)
+        assert len(running) == 2  # Both coroutines are in flight together
+        return step["id"]
+
+    order, context = await execute_workflow(steps, [], {}, {("action", "fake"): handler}, log=lambda m: None)
+    assert context == {"a_result": "a", "b_result": "b"}
+
+
+@pytest.mark.asyncio
+async def test_execute_workflow_stops_after_failing_level():
+    steps = _steps("a", "b")
+    calls = []
+
+    async def handler(step, context, tokens):
+        calls.append(step["id"])
+        if step["id"] == "a":
+            raise RuntimeError("boom")
+        return "ok"
+
+    with pytest.raises(StepExecutionError) as exc:
+        await execute_workflow(
+            steps,
+            [{"source": "a", "target": "b"}],
+            {},
+            {("action", "fake"): handler},
+            log=lambda m: None,
+        )
+    assert exc.value.step_id == "a"
+    assert calls == ["a"]
+
+
+def test_compile_workflow_rejects_dangling_edges():
+    with pytest.raises(ValueError):
+        compile_workflow(_steps("a"), [{"source": "a", "target": "missing"}], {})
+
+
+def test_plan_cache_evicts_least_recently_used():
+    cache = PlanCache(maxsize=2)
+    cache.put(1, 1, "plan-1")
+    cache.put(2, 1, "plan-2")
+    cache.get(1, 1)
+    cache.put(3, 1, "plan-3")
+    assert cache.get(2, 1) is None
+    assert cache.get(1, 1) == "plan-1"
+    cache.invalidate(1)
+    assert cache.get(1, 1) is None
+
+
+def test_plan_cache_compiles_once_per_version():
+    cache = PlanCache()
+    loads = []
+
+    def load():
+        loads.append(1)
+        return {"workflow": _steps("a", "b"), "edges": [{"source": "a", "target": "b"}]}
+
+    plan = cache.get_or_compile(7, 1, load, {})
+    assert cache.get_or_compile(7, 1, load, {}) is plan
+    assert plan.order == ("a", "b")
+    assert len(loads) == 1
+    cache.get_or_compile(7, 2, load, {})
+    assert len(loads) == 2
+
+
+@pytest.mark.asyncio
+async def test_execute_workflow_skips_checkpointed_steps():
+    steps = _steps("a", "b")
+    calls = []
+
+    def handler(step, context, tokens):
+        calls.append(step["id"])
+        return context["a_result"] + "!"
+
+    order, context = await execute_workflow(
+        steps,
+        [{"source": "a", "target": "b"}],
+        {},
+        {("action", "fake"): handler},
+        context={"a_result": "saved"},
+        log=lambda m: None,
+        completed={"a"},
+    )
+    assert calls == ["b"]
+    assert context["b_result"] == "saved!"
+
+
+@pytest.mark.asyncio
+async def test_streaming_source_feeds_consumers_per_item():
+    steps = [
+        {"id": "gmail", "type": "trigger", "service": "fake", "stream": True},
+        {"id": "openai", "type": "action", "service": "fake"},
+        {"id": "notion", "type": "action", "service": "fake"},
+    ]
+    edges = [{"source": "gmail", "target": "openai"}, {"source": "openai", "target": "notion"}]
+    first_page_done = threading.Event()
+
+    def source(step, context, tokens):
+        yield {"subject": "first"}
+        # The first item went through the whole chain before the second one was fetched
+        assert first_page_done.wait(timeout=2)
+        yield {"subject": "second"}
+
+    def handler(step, context, tokens):
+        if step["id"] == "openai":
+            return f"summary of {context['trigger_data'][0]['subject']}"
+        first_page_done.set()
+        return f"page for {context['openai_result']}"
+
+    registry = {("trigger", "fake", "stream"): source, ("action", "fake"): handler}
+    order, context = await execute_workflow(steps, edges, {}, registry, log=lambda m: None)
+    assert context["gmail_result"] == {"items": 2}
+    assert context["openai_result"] == ["summary of first", "summary of second"]
+    assert context["notion_result"] == ["page for summary of first", "page for summary of second"]
+
+
+def test_compile_workflow_rejects_mixed_stream_inputs():
+    steps = [
+        {"id": "gmail", "type": "trigger", "service": "fake", "stream": True},
+        {"id": "other", "type": "action", "service": "fake"},
+        {"id": "notion", "type": "action", "service": "fake"},
+    ]
+    edges = [{"source": "gmail", "target": "notion"}, {"source": "other", "target": "notion"}]
+    registry = {("trigger", "fake", "stream"): lambda step, context, tokens: iter(())}
+    with pytest.raises(ValueError):
+        compile_workflow(steps, edges, registry)
+
+
+@pytest.mark.asyncio
+async def test_map_step_isolates_item_errors_and_limits_concurrency():
+    running = []
+    peak = []
+
+    async def handler(step, context, tokens):
+        item = context["item"]
+        running.append(item)
+        peak.append(len(running))
+        await asyncio.sleep(0.01 * (5 - item))
+        running.remove(item)
+        if item == 2:
+            raise RuntimeError("bad email")
+        return item * 10
+
+    steps = [{
+        "id": "pages",
+        "type": "map",
+        "service": "fake",
+        "items": "emails",
+        "concurrency": 2,
+        "substep": {"type": "action", "service": "fake"},
+    }]
+    order, context = await execute_workflow(
+        steps, [], {}, {("action", "fake"): handler}, context={"emails": [0, 1, 2, 3]}, log=lambda m: None
+    )
+    assert max(peak) == 2
+    assert context["pages_result"] == [
+        {"index": 0, "result": 0},
+        {"index": 1, "result": 10},
+        {"index": 2, "error": "bad email"},
+        {"index": 3, "result": 30},
+    ]
@@ -0,0 +1,59 @@
+import asyncio
+import json
+
+import pytest
+from httpx import AsyncClient
+from httpx._transports.asgi import ASGITransport
+
+from backend.main import app, workflows  # The router module the app actually mounted
+from backend.services.llm_batch import Coalescer
+from backend.tests.fake_llm import FakeLLMBackend
+
+
+@pytest.fixture
+def fake_backend(monkeypatch):
+    backend = FakeLLMBackend()
+    coalescer = Coalescer(backend, window=0.01)
+    monkeypatch.setattr(workflows, "get_coalescer", lambda: coalescer)
+    monkeypatch.setattr(workflows, "get_cached", lambda service, action, key: (False, None))
+    monkeypatch.setattr(workflows, "set_cached", lambda key, value: None)
+    return backend
+
+
+def _events(text):
+    events = []
+    for block in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+@pytest.mark.asyncio
+async def test_generate_streams_server_sent_events(fake_backend):
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        async with ac.stream("POST", "/workflows/tools/openai/generate",
+                             json={"prompt": "tell me a joke", "stream": True}) as response:
+            assert response.headers["content-type"].startswith("text/event-stream")
+            chunks = [chunk async for chunk in response.aiter_text()]
+
+    events = _events("".join(chunks))
+    assert [name for name, _ in events[:-1]] == ["delta"] * (len(events) - 1)
+    assert events[-1] == ("done", {"result": "ANSWER(tell me a joke) "})
+    assert "".join(data["delta"] for _, data in events[:-1]) == "ANSWER(tell me a joke) "
+
+
+@pytest.mark.asyncio
+async def test_generate_keeps_json_contract_without_stream(fake_backend):
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        response = await ac.post("/workflows/tools/openai/generate", json={"prompt": "tell me a joke"})
+    assert response.json() == {"result": "ANSWER(tell me a joke)"}
+
+
+@pytest.mark.asyncio
+async def test_concurrent_generate_requests_are_not_coalesced(fake_backend):
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        responses = await asyncio.gather(
+            *(ac.post("/workflows/tools/openai/generate", json={"prompt": f"user {i} secret"}) for i in range(3))
+        )
+    assert [response.json() for response in responses] == [{"result": f"ANSWER(user {i} secret)"} for i in range(3)]
+    assert sorted(fake_backend.calls) == [f"user {i} secret" for i in range(3)]  # One plain request each
@@ -0,0 +1,100 @@
+from backend.services import gmail
+from backend.tests.fake_gmail import FakeGmail, make_message
+
+
+def test_check_new_email_fetches_details_in_one_batch(monkeypatch):
+    messages = [make_message(f"m{i}", f"Subject {i}") for i in range(10)]
+    with FakeGmail(messages) as fake:
+        monkeypatch.setattr(gmail, "GMAIL_API_BASE", fake.url)
+        emails = gmail.check_new_email("token", full=True)
+
+    assert [email["subject"] for email in emails] == [f"Subject {i}" for i in range(10)]
+    assert emails[0]["from"] == "alice@example.com"
+    assert emails[0]["body"] == "Hello from the fake Gmail server"
+    # One list call plus one batch call instead of 1 + 10 sequential GETs
+    assert [method for method, _ in fake.requests] == ["GET", "POST"]
+
+
+def test_calls_reuse_pooled_connections(monkeypatch):
+    messages = [make_message(f"m{i}", f"Subject {i}") for i in range(3)]
+    with FakeGmail(messages) as fake:
+        monkeypatch.setattr(gmail, "GMAIL_API_BASE", fake.url)
+        for _ in range(3):
+            gmail.check_new_email("token")
+    assert len(fake.requests) == 6
+    assert len(fake.connections) == 1
+
+
+def test_rate_limited_batch_items_are_refetched(monkeypatch):
+    messages = [make_message(f"m{i}", f"Subject {i}") for i in range(3)]
+    with FakeGmail(messages) as fake:
+        fake.rate_limited.add("m1")
+        monkeypatch.setattr(gmail, "GMAIL_API_BASE", fake.url)
+        emails = gmail.check_new_email("token")
+
+    assert [email["subject"] for email in emails] == ["Subject 0", "Subject 1", "Subject 2"]
+    assert any(method == "GET" and path.startswith("/gmail/v1/users/me/messages/m1?format=metadata")
+               for method, path in fake.requests)
+
+
+def test_metadata_first_fetch_loads_bodies_lazily(monkeypatch):
+    messages = [make_message(f"m{i}", f"Subject {i}", body=f"Body {i}") for i in range(3)]
+    with FakeGmail(messages) as fake:
+        monkeypatch.setattr(gmail, "GMAIL_API_BASE", fake.url)
+        emails = gmail.check_new_email("token")
+        assert [email["subject"] for email in emails] == ["Subject 0", "Subject 1", "Subject 2"]
+        assert all("body" not in email for email in emails)
+        assert emails[0]["snippet"] == "Body 0"
+
+        fake.requests.clear()
+        assert emails[1]["body"] == "Body 1"  # Reading the body fetches that one message
+        assert len(fake.requests) == 1
+
+        fake.requests.clear()
+        gmail.load_bodies(emails)  # The rest arrive in a single batch
+        assert [method for method, _ in fake.requests] == ["POST"]
+        assert [email.get("body") for email in emails] == ["Body 0", "Body 1", "Body 2"]
+
+
+def test_incremental_sync_only_fetches_new_mail(monkeypatch):
+    messages = [make_message(f"m{i}", f"Subject {i}") for i in range(3)]
+    with FakeGmail(messages) as fake:
+        monkeypatch.setattr(gmail, "GMAIL_API_BASE", fake.url)
+        emails, cursor = gmail.check_new_email_since("token")
+        assert len(emails) == 3 and cursor == "100"
+
+        fake.requests.clear()
+        emails, cursor = gmail.check_new_email_since("token", cursor)
+        assert emails == [] and cursor == "100"
+        assert [path.split("?")[0] for _, path in fake.requests] == ["/gmail/v1/users/me/history"]
+
+        fake.deliver(make_message("new1", "Fresh mail"))
+        emails, cursor = gmail.check_new_email_since("token", cursor)
+        assert [email["subject"] for email in emails] == ["Fresh mail"]
+        assert cursor == "101"
+
+
+def test_expired_cursor_falls_back_to_full_list(monkeypatch):
+    messages = [make_message(f"m{i}", f"Subject {i}") for i in range(2)]
+    with FakeGmail(messages) as fake:
+        fake.oldest_history_id = 50
+        monkeypatch.setattr(gmail, "GMAIL_API_BASE", fake.url)
+        emails, cursor = gmail.check_new_email_since("token", "10")
+    assert len(emails) == 2
+    assert cursor == "100"
+
+
+def test_sync_backlog_larger_than_the_limit_is_not_skipped(monkeypatch):
+    with FakeGmail([]) as fake:
+        monkeypatch.setattr(gmail, "GMAIL_API_BASE", fake.url)
+        monkeypatch.setattr(gmail, "GMAIL_SYNC_MAX_MESSAGES", 3)
+        for i in range(5):
+            fake.deliver(make_message(f"new{i}", f"Mail {i}"))
+
+        emails, cursor = gmail.check_new_email_since("token", "100")
+        assert [email["subject"] for email in emails] == ["Mail 2", "Mail 1", "Mail 0"]
+        assert cursor == "103"  # Only past the mail that was returned
+
+        emails, cursor = gmail.check_new_email_since("token", cursor)
+        assert [email["subject"] for email in emails] == ["Mail 4", "Mail 3"]
+        assert cursor == "105"
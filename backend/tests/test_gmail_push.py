@@ -0,0 +1,95 @@
+import base64
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend.main import app, workflows  # The router module the app actually mounted
+from backend.services import gmail_push
+
+
+def _notification(email_address, history_id):
+    data = json.dumps({"emailAddress": email_address, "historyId": history_id}).encode("utf-8")
+    return {"message": {"data": base64.b64encode(data).decode("ascii"), "messageId": "1"}, "subscription": "s"}
+
+
+@pytest.fixture
+def db(monkeypatch):
+    engine = create_engine("sqlite://")
+    gmail_push.GmailWatchDB.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    monkeypatch.setattr(gmail_push, "log_to_redis", lambda workflow_id, message, **kwargs: None)
+    yield session
+    session.close()
+
+
+def _user_with_workflows(db):
+    user = gmail_push.UserDB(username="alice@example.com")
+    db.add(user)
+    db.flush()
+    gmail_flow = {"workflow": [{"id": "t", "type": "trigger", "service": "gmail", "action": "new_email"}], "edges": []}
+    other_flow = {"workflow": [{"id": "a", "type": "action", "service": "notion", "action": "create_page"}], "edges": []}
+    for name, flow in (("mail", gmail_flow), ("other", other_flow)):
+        db.add(gmail_push.WorkflowDB(name=name, workflow_json=json.dumps(flow), owner_id=user.id))
+    db.add(gmail_push.GmailWatchDB(user_id=user.id, email_address="alice@example.com", history_id="100",
+                                   expiration=datetime.utcnow() + timedelta(days=7)))
+    db.commit()
+    return user
+
+
+def test_notification_enqueues_runs_of_gmail_triggered_workflows(db):
+    user = _user_with_workflows(db)
+    enqueued = []
+    email_address, history_id = gmail_push.decode_notification(_notification("alice@example.com", 101))
+
+    run_ids = gmail_push.dispatch_notification(db, email_address, history_id, enqueued.append)
+
+    assert run_ids == enqueued and len(run_ids) == 1
+    run = db.query(gmail_push.WorkflowRunDB).filter_by(id=run_ids[0]).first()
+    assert run.status == "queued" and run.owner_id == user.id
+    assert run.workflow_id == str(next(wf.id for wf in user.workflows if wf.name == "mail"))
+
+
+def test_redelivered_and_burst_notifications_are_coalesced(db):
+    _user_with_workflows(db)
+    enqueued = []
+    assert len(gmail_push.dispatch_notification(db, "alice@example.com", "101", enqueued.append)) == 1
+    # Pub/Sub redelivery of the same (or an older) change
+    assert gmail_push.dispatch_notification(db, "alice@example.com", "101", enqueued.append) == []
+    # Newer mail while the first run is still queued: that run's history sync covers it
+    assert gmail_push.dispatch_notification(db, "alice@example.com", "102", enqueued.append) == []
+    assert len(enqueued) == 1
+
+
+def test_unknown_mailbox_and_malformed_payloads(db):
+    assert gmail_push.dispatch_notification(db, "nobody@example.com", "5", lambda run_id: None) == []
+    with pytest.raises(ValueError):
+        gmail_push.decode_notification({"message": {"data": "not base64 json"}})
+
+
+def test_renew_watches_only_touches_expiring_ones(db, monkeypatch):
+    user = _user_with_workflows(db)
+    watch = db.query(gmail_push.GmailWatchDB).filter_by(user_id=user.id).first()
+    renewed = []
+    expiration_ms = int((datetime.utcnow() + timedelta(days=7)).timestamp() * 1000)
+    monkeypatch.setattr(gmail_push, "get_valid_gmail_token", lambda user: "token")
+    monkeypatch.setattr(gmail_push, "watch_mailbox", lambda headers, topic: renewed.append(topic) or {
+        "historyId": "200", "expiration": str(expiration_ms)})
+
+    assert gmail_push.renew_watches(db, "projects/p/topics/gmail") == 0
+    watch.expiration = datetime.utcnow() + timedelta(hours=2)
+    db.commit()
+    assert gmail_push.renew_watches(db, "projects/p/topics/gmail") == 1
+    assert renewed == ["projects/p/topics/gmail"] and watch.history_id == "200"
+
+
+@pytest.mark.parametrize("secret,token", [(None, None), (None, "anything"), ("s3cret", None), ("s3cret", "wrong")])
+def test_push_endpoint_rejects_unauthenticated_notifications(monkeypatch, secret, token):
+    monkeypatch.setattr(workflows.gmail_push, "GMAIL_PUSH_TOKEN", secret)
+    monkeypatch.setattr(workflows.gmail_push, "dispatch_notification", lambda *args, **kwargs: pytest.fail("dispatched"))
+    params = {"token": token} if token else {}
+    response = TestClient(app).post("/workflows/gmail/push", params=params, json=_notification("alice@example.com", "150"))
+    assert response.status_code == 403
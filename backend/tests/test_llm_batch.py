@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from backend.services import llm_batch
+from backend.services.llm_batch import Coalescer
+from backend.tests.fake_llm import FakeLLMBackend
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_one_completion():
+    backend = FakeLLMBackend()
+    coalescer = Coalescer(backend, window=0.02, max_items=10)
+
+    results = await asyncio.gather(*(coalescer.submit("Summarize:", f"email {i}") for i in range(4)))
+
+    assert results == [f"ANSWER(email {i})" for i in range(4)]
+    assert len(backend.calls) == 1
+    assert "each of the 4 items" in backend.calls[0]
+
+
+@pytest.mark.asyncio
+async def test_groups_split_by_size_and_instruction():
+    backend = FakeLLMBackend()
+    coalescer = Coalescer(backend, window=0.02, max_items=3)
+
+    results = await asyncio.gather(
+        *(coalescer.submit("Summarize:", f"email {i}") for i in range(5)),
+        coalescer.submit("Translate:", "hola"),
+    )
+
+    assert results[:5] == [f"ANSWER(email {i})" for i in range(5)]
+    assert results[5] == "ANSWER(hola)"
+    # 3 + 2 summaries, and the lone translation as a plain single-item prompt
+    assert len(backend.calls) == 3
+    assert "Translate:\n\nhola" in backend.calls
+
+
+@pytest.mark.asyncio
+async def test_different_owners_never_share_a_request():
+    backend = FakeLLMBackend()
+    coalescer = Coalescer(backend, window=0.02, max_items=10)
+
+    results = await asyncio.gather(
+        coalescer.submit("Summarize:", "alice mail", owner=1),
+        coalescer.submit("Summarize:", "bob mail", owner=2),
+    )
+
+    assert results == ["ANSWER(alice mail)", "ANSWER(bob mail)"]
+    assert sorted(backend.calls) == ["Summarize:\n\nalice mail", "Summarize:\n\nbob mail"]
+
+
+@pytest.mark.asyncio
+async def test_unsplittable_answer_falls_back_to_single_requests():
+    backend = FakeLLMBackend()
+    backend.garble_multi = True
+    coalescer = Coalescer(backend, window=0.01)
+
+    results = await asyncio.gather(*(coalescer.submit("Summarize:", f"email {i}") for i in range(3)))
+
+    assert results == [f"ANSWER(email {i})" for i in range(3)]
+    assert len(backend.calls) == 1 + 3
+
+
+@pytest.mark.asyncio
+async def test_offline_mode_submits_one_batch_job_without_waiting():
+    backend = FakeLLMBackend(batch_polls=1)
+    coalescer = Coalescer(backend, offline_window=0.01)
+
+    results = await asyncio.gather(
+        *(coalescer.submit("Summarize:", f"email {i}", mode="offline") for i in range(3)), return_exceptions=True
+    )
+
+    assert all(isinstance(result, llm_batch.BatchPending) for result in results)
+    jobs = llm_batch.BatchPending.merge(results).jobs
+    assert backend.calls == [] and len(backend.jobs) == 1 and len(jobs) == 1
+    assert backend.jobs[0]["prompts"][0] == "Summarize:\n\nemail 0"
+    assert await llm_batch.collect_batches(jobs, backend) is None  # Still running
+
+    answers = await llm_batch.collect_batches(jobs, backend)
+    results = await asyncio.gather(
+        *(coalescer.submit("Summarize:", f"email {i}", mode="offline", answers=answers) for i in range(3))
+    )
+    assert results == [f"ANSWER(email {i})" for i in range(3)]
+    assert len(backend.jobs) == 1  # Answered from the finished job, not submitted again
\ No newline at end of file
@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+from backend.services.log_hub import LogHub
+from backend.services.run_log import log_key
+
+
+class FakeStreams:
+    """In-memory subset of the redis.asyncio Streams API, counting blocking reads."""
+
+    def __init__(self):
+        self.streams = {}
+        self.readers = 0
+        self.changed = asyncio.Condition()
+
+    async def xadd(self, key, fields):
+        entries = self.streams.setdefault(key, [])
+        entry_id = f"{len(entries) + 1}-0"
+        entries.append((entry_id, dict(fields)))
+        async with self.changed:
+            self.changed.notify_all()
+        return entry_id
+
+    @staticmethod
+    def _after(entries, entry_id):
+        number = int(entry_id.split("-")[0])
+        return [entry for entry in entries if int(entry[0].split("-")[0]) > number]
+
+    async def xrevrange(self, key, count=None):
+        return list(reversed(self.streams.get(key, [])))[:count]
+
+    async def xrange(self, key, min="-", count=None):
+        number = int(min.split("-")[0])
+        return [entry for entry in self.streams.get(key, []) if int(entry[0].split("-")[0]) >= number][:count]
+
+    async def xread(self, streams, count=None, block=None):
+        (key, last), = streams.items()
+        self.readers += 1
+        try:
+            async with self.changed:
+                await asyncio.wait_for(
+                    self.changed.wait_for(lambda: self._after(self.streams.get(key, []), last)), block / 1000
+                )
+        except asyncio.TimeoutError:
+            return []
+        finally:
+            self.readers -= 1
+        return [[key, self._after(self.streams[key], last)[:count]]]
+
+
+async def _collect(subscription, count):
+    entries = []
+    async for entry in subscription:
+        entries.append((entry[0], entry[1]["message"]))
+        if len(entries) == count:
+            break
+    await subscription.aclose()  # Like a closed socket: unsubscribes right away
+    return entries
+
+
+@pytest.mark.asyncio
+async def test_viewers_share_one_reader_and_get_new_lines():
+    redis = FakeStreams()
+    hub = LogHub(client=redis, block_ms=1000)
+    await redis.xadd(log_key(7), {"message": "old line"})
+    viewers = [asyncio.ensure_future(_collect(hub.subscribe(7), 2)) for _ in range(3)]
+    await asyncio.sleep(0.05)
+    assert redis.readers == 1
+
+    await redis.xadd(log_key(7), {"message": "started"})
+    await redis.xadd(log_key(7), {"message": "done"})
+    results = await asyncio.wait_for(asyncio.gather(*viewers), 1)
+
+    assert all(result == [("2-0", "started"), ("3-0", "done")] for result in results)
+    await asyncio.sleep(0.01)
+    assert redis.readers == 0 and not hub._readers  # Reader stopped with the last viewer
+
+
+@pytest.mark.asyncio
+async def test_reconnecting_viewer_resumes_after_its_last_id():
+    redis = FakeStreams()
+    hub = LogHub(client=redis, block_ms=1000)
+    for i in range(1, 4):
+        await redis.xadd(log_key(7), {"message": f"line {i}"})
+    viewer = asyncio.ensure_future(_collect(hub.subscribe(7, after="1-0"), 3))
+    await asyncio.sleep(0.05)
+    await redis.xadd(log_key(7), {"message": "line 4"})
+
+    assert await asyncio.wait_for(viewer, 1) == [("2-0", "line 2"), ("3-0", "line 3"), ("4-0", "line 4")]
+
+
+@pytest.mark.asyncio
+async def test_slow_viewer_catches_up_from_the_stream():
+    redis = FakeStreams()
+    hub = LogHub(client=redis, block_ms=1000, queue_size=2)
+    subscription = hub.subscribe(7)
+    viewer = asyncio.ensure_future(subscription.__anext__())
+    await asyncio.sleep(0.05)
+    for i in range(1, 7):
+        await redis.xadd(log_key(7), {"message": f"line {i}"})
+    await asyncio.sleep(0.05)
+
+    first_id, first = await asyncio.wait_for(viewer, 1)
+    received = [first["message"]] + [message for _, message in await _collect(subscription, 5)]
+    assert received == [f"line {i}" for i in range(1, 7)]
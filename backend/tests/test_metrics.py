@@ -0,0 +1,94 @@
+import asyncio
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.benchmarks.fakes import FakeRedis
+from backend.services import metrics
+from backend.services.executor import execute_workflow, StepExecutionError
+
+
+def test_histogram_renders_cumulative_buckets():
+    hist = metrics.Histogram("test_latency_seconds", "Test latency", ("tool",), buckets=(0.1, 1))
+    hist.observe(0.05, tool="gmail")
+    hist.observe(0.5, tool="gmail")
+    lines = hist.render()
+    assert 'test_latency_seconds_bucket{tool="gmail",le="0.1"} 1' in lines
+    assert 'test_latency_seconds_bucket{tool="gmail",le="1"} 2' in lines
+    assert 'test_latency_seconds_bucket{tool="gmail",le="+Inf"} 2' in lines
+    assert 'test_latency_seconds_count{tool="gmail"} 2' in lines
+
+
+def test_record_step_counts_errors_by_service():
+    step = {"type": "action", "service": "metrics-test", "action": "run"}
+    metrics.record_step(step, 0.2)
+    metrics.record_step(step, 0.3, error=True)
+    labels = {"type": "action", "service": "metrics-test", "action": "run"}
+    assert metrics.STEP_DURATION.count(**labels) == 2
+    assert metrics.STEP_ERRORS.value(**labels) == 1
+    assert 'workflow_step_errors_total{type="action",service="metrics-test",action="run"} 1' in metrics.render()
+
+
+def test_flush_adds_only_new_values_to_redis():
+    fake = FakeRedis()
+    step = {"type": "action", "service": "flush-test", "action": "run"}
+    metrics.record_step(step, 0.2)
+    metrics.flush_metrics(fake)
+    metrics.flush_metrics(fake)  # Nothing new: must not count the step twice
+    metrics.record_step(step, 0.3, error=True)
+    metrics.flush_metrics(fake)
+
+    lines = metrics.render_shared(fake).splitlines()
+    assert 'workflow_step_duration_seconds_count{type="action",service="flush-test",action="run"} 2' in lines
+    assert 'workflow_step_errors_total{type="action",service="flush-test",action="run"} 1' in lines
+
+
+def test_api_metrics_include_steps_recorded_by_worker_tasks(monkeypatch):
+    from backend.main import app, metrics as api_metrics
+    from backend.routers.workflows import execute_run_task
+
+    fake = FakeRedis()
+    step = {"type": "action", "service": "worker-task", "action": "run"}
+
+    def execute_run(run_id, **kwargs):
+        api_metrics.record_step(step, 0.4)
+        return {"run_id": run_id, "status": "succeeded"}
+
+    monkeypatch.setattr(sys.modules[execute_run_task.run.__module__], "execute_run", execute_run)
+    execute_run_task.apply(args=["run-1"])
+    api_metrics.flush_metrics(fake)  # What the worker child's flusher does
+    # The API is another process: nothing of the worker's registry is visible locally
+    monkeypatch.setattr(api_metrics.STEP_DURATION, "_values", {})
+    monkeypatch.setattr(api_metrics, "_flushed", {})
+    monkeypatch.setattr(api_metrics, "_shared_client", lambda client: fake)
+
+    response = TestClient(app).get("/metrics")
+
+    assert response.status_code == 200
+    assert 'workflow_step_duration_seconds_count{type="action",service="worker-task",action="run"} 1' in response.text
+
+
+def test_streaming_sources_record_their_duration_and_errors():
+    def source(step, context, tokens):
+        yield {"subject": "first"}
+        if step["id"] == "broken":
+            raise RuntimeError("mailbox gone")
+
+    registry = {("trigger", "metrics-stream", "stream"): source, ("action", "fake"): lambda step, context, tokens: "ok"}
+    labels = {"type": "trigger", "service": "metrics-stream", "action": "list"}
+
+    def run(step_id):
+        steps = [{"id": step_id, "type": "trigger", "service": "metrics-stream", "action": "list", "stream": True},
+                 {"id": "consumer", "type": "action", "service": "fake"}]
+        edges = [{"source": step_id, "target": "consumer"}]
+        return asyncio.run(execute_workflow(steps, edges, {}, registry, log=lambda message: None))
+
+    run("working")
+    with pytest.raises(StepExecutionError):
+        run("broken")
+
+    # The metrics module the executor imported (not backend.services.metrics)
+    step_metrics = sys.modules[sys.modules[execute_workflow.__module__].record_step.__module__]
+    assert step_metrics.STEP_DURATION.count(**labels) == 2
+    assert step_metrics.STEP_ERRORS.value(**labels) == 1
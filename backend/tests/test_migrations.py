@@ -0,0 +1,46 @@
+import json
+import os
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, text
+
+command = pytest.importorskip("alembic.command")
+from alembic.autogenerate import compare_metadata  # noqa: E402
+from alembic.config import Config  # noqa: E402
+from alembic.migration import MigrationContext  # noqa: E402
+
+from backend.models.db import Base  # noqa: E402
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _config(url):
+    config = Config(os.path.join(BACKEND, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(BACKEND, "alembic"))
+    config.set_main_option("sqlalchemy.url", url)
+    return config
+
+
+def test_migrations_build_the_model_schema(tmp_path):
+    url = f"sqlite:///{tmp_path / 'app.db'}"
+    command.upgrade(_config(url), "head")
+    with create_engine(url).connect() as conn:
+        assert compare_metadata(MigrationContext.configure(conn), Base.metadata) == []
+
+
+def test_step_count_backfill_keeps_version_and_updated_at(tmp_path):
+    url = f"sqlite:///{tmp_path / 'app.db'}"
+    config = _config(url)
+    command.upgrade(config, "0006_run_history")
+    engine = create_engine(url)
+    saved = datetime(2025, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO workflows (id, name, workflow_json, version, updated_at) "
+                          "VALUES (1, 'wf', :json, 3, :saved)"),
+                     {"json": json.dumps({"workflow": [{"id": "a"}, {"id": "b"}]}), "saved": saved})
+
+    command.upgrade(config, "head")
+    with engine.connect() as conn:
+        row = conn.execute(text("SELECT step_count, version, updated_at FROM workflows")).one()
+    assert row.step_count == 2 and row.version == 3 and row.updated_at == str(saved)
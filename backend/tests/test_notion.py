@@ -0,0 +1,96 @@
+import json
+import time
+
+import httpx
+from notion_client import Client
+
+from backend.services import notion
+
+
+class FakeNotion:
+    """httpx transport standing in for api.notion.com; `responses` queues (status, headers) overrides."""
+
+    def __init__(self):
+        self.requests = []
+        self.responses = []
+
+    def handler(self, request):
+        body = json.loads(request.content or b"{}")
+        self.requests.append((request.method, request.url.path, body))
+        if self.responses:
+            status, headers = self.responses.pop(0)
+            return httpx.Response(status, headers=headers, json={"object": "error", "code": "rate_limited", "message": "slow down"})
+        if request.url.path == "/v1/pages":
+            if "invalid" in json.dumps(body.get("properties")):
+                return httpx.Response(400, json={"object": "error", "code": "validation_error", "message": "bad title"})
+            return httpx.Response(200, json={"object": "page", "id": f"page-{len(self.requests)}"})
+        return httpx.Response(200, json={"object": "list", "results": []})
+
+    def client(self, token):
+        return Client(auth=token, client=httpx.Client(transport=httpx.MockTransport(self.handler)), retry=False)
+
+
+def test_long_content_is_split_into_append_batches(monkeypatch):
+    fake = FakeNotion()
+    monkeypatch.setattr(notion, "get_notion_client", fake.client)
+    content = "x" * (notion.NOTION_TEXT_LIMIT * 250)
+
+    page = notion.create_notion_page("token-a", "Long", content, parent_id="21fa46cfaac28026912dc2e6a0539ea5")
+
+    assert page["id"] == "page-1"
+    assert [(method, path) for method, path, _ in fake.requests] == [
+        ("POST", "/v1/pages"), ("PATCH", "/v1/blocks/page-1/children"), ("PATCH", "/v1/blocks/page-1/children"),
+    ]
+    assert [len(body["children"]) for _, _, body in fake.requests] == [100, 100, 50]
+
+
+def test_rate_limited_requests_wait_for_retry_after(monkeypatch):
+    fake = FakeNotion()
+    fake.responses = [(429, {"Retry-After": "0.2"})]
+    monkeypatch.setattr(notion, "get_notion_client", fake.client)
+
+    start = time.monotonic()
+    page = notion.create_notion_page("token-b", "Retry", "hello", parent_id="21fa46cfaac28026912dc2e6a0539ea5")
+
+    assert page["id"] == "page-2"
+    assert len(fake.requests) == 2
+    assert time.monotonic() - start >= 0.2
+
+
+def test_token_bucket_limits_request_rate():
+    bucket = notion.TokenBucket(rate=20, capacity=2)
+    start = time.monotonic()
+    for _ in range(6):
+        bucket.acquire()
+    # Two from the burst, then four at 20/s
+    assert time.monotonic() - start >= 0.19
+
+
+def test_bulk_create_returns_per_item_results(monkeypatch):
+    fake = FakeNotion()
+    monkeypatch.setattr(notion, "get_notion_client", fake.client)
+    items = [{"subject": f"Mail {i}", "from": f"sender{i}@example.com", "body": f"Body {i}"} for i in range(5)]
+    items[2]["subject"] = "invalid"
+
+    results = notion.create_pages("token-c", items, "21fa46cfaac28026912dc2e6a0539ea5", parent_type="database_id",
+                                  concurrency=3, property_map={"from": "Sender"})
+
+    assert [entry["index"] for entry in results] == [0, 1, 2, 3, 4]
+    assert "error" in results[2] and all("result" in results[i] for i in (0, 1, 3, 4))
+    bodies = [body for _, _, body in fake.requests]
+    assert all(body["parent"] == {"database_id": "21fa46cfaac28026912dc2e6a0539ea5"} for body in bodies)
+    first = next(body for body in bodies if "Mail 0" in json.dumps(body))
+    assert first["properties"]["Name"]["title"][0]["text"]["content"] == "Mail 0"
+    assert first["properties"]["Sender"]["rich_text"][0]["text"]["content"] == "sender0@example.com"
+    assert first["children"][0]["paragraph"]["rich_text"][0]["text"]["content"] == "Body 0"
+
+
+def test_server_errors_on_create_are_not_retried(monkeypatch):
+    fake = FakeNotion()
+    fake.responses = [(502, {})]
+    monkeypatch.setattr(notion, "get_notion_client", fake.client)
+
+    page = notion.create_notion_page("token-d", "Maybe created", "hello", parent_id="21fa46cfaac28026912dc2e6a0539ea5")
+
+    assert page is None
+    assert len(fake.requests) == 1  # Retrying could create the page twice
@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+
+from backend.services import prompt_builder
+from backend.services.prompt_builder import chunk_texts, count_tokens, fits, map_reduce, serialize_records
+
+
+def test_emails_are_serialized_compactly():
+    records = serialize_records([
+        {"id": "m1", "from": "alice@example.com", "subject": "Lunch", "snippet": "Are you", "date": None,
+         "body": "Are you free at noon?"},
+        {"city": "Paris", "notes": None, "temp": 21},
+    ])
+    assert records == ["From: alice@example.com | Subject: Lunch\nAre you free at noon?", "city: Paris | temp: 21"]
+
+
+def test_chunks_respect_token_limit_and_truncate_oversized_records():
+    texts = ["word " * 100, "word " * 100, "word " * 1000]
+    chunks = chunk_texts(texts, chunk_tokens=300)
+    assert len(chunks) == 2
+    assert all(count_tokens(chunk) <= 300 + 2 for chunk in chunks)
+
+
+@pytest.mark.asyncio
+async def test_large_input_is_map_reduced_with_bounded_concurrency():
+    texts = [f"email {i} " + "lorem " * 200 for i in range(20)]
+    assert not fits("Summarize:", texts, budget=2000)
+    calls, running, peak = [], 0, 0
+
+    async def submit(instruction, text):
+        nonlocal running, peak
+        calls.append((instruction, text))
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return f"notes({count_tokens(text)})"
+
+    result = await map_reduce("Summarize:", texts, submit, budget=2000, chunk_tokens=600, concurrency=3)
+
+    map_calls, reduce_call = calls[:-1], calls[-1]
+    assert len(map_calls) == len(chunk_texts(texts, 600)) > 1
+    assert all(text.startswith("email") for _, text in map_calls)
+    assert peak == 3
+    assert reduce_call[0] == "Summarize:" and "Part 1:" in reduce_call[1]
+    assert result.startswith("notes(")
+
+
+def test_token_count_falls_back_to_character_estimate(monkeypatch):
+    monkeypatch.setattr(prompt_builder, "tiktoken", None)
+    monkeypatch.setattr(prompt_builder, "_encoding", None)
+    assert count_tokens("a" * 400) == 100
@@ -0,0 +1,109 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from backend.benchmarks.fakes import FakeRedis
+from backend.main import app, workflows  # The router module the app actually mounted
+from backend.models.db import Base, WorkflowRunDB
+from backend.services.run_log import RunLogger, log_key, read_run_log, run_log_key
+from backend.services.runner import list_runs
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    start = datetime(2025, 1, 1)
+    for i in range(7):
+        session.add(WorkflowRunDB(
+            id=f"run-{i}",
+            workflow_id="5" if i % 2 == 0 else "6",
+            status="succeeded",
+            workflow_json="{" + '"big": "snapshot"' * 10 + "}",
+            context_json='{"emails": []}',
+            created_at=start + timedelta(minutes=i // 2),  # Pairs share a timestamp
+            duration_ms=100 * i,
+            step_timings_json='{"s1": 40}',
+        ))
+    session.commit()
+    yield session
+    session.close()
+
+
+def test_runs_are_listed_newest_first_in_pages(db):
+    seen, cursor = [], None
+    while True:
+        runs, cursor = list_runs(db, limit=3, cursor=cursor)
+        seen.extend(run["run_id"] for run in runs)
+        if cursor is None:
+            break
+    assert seen == ["run-6", "run-5", "run-4", "run-3", "run-2", "run-1", "run-0"]
+
+    runs, cursor = list_runs(db, workflow_id=5, limit=10)
+    assert [run["run_id"] for run in runs] == ["run-6", "run-4", "run-2", "run-0"] and cursor is None
+    assert runs[0]["duration_ms"] == 600 and runs[0]["step_timings"] == {"s1": 40}
+    assert "context" not in runs[0]
+
+
+def test_each_run_has_its_own_paged_log():
+    redis = FakeRedis()
+    first, second = RunLogger(5, "run-a", client=redis), RunLogger(5, "run-b", client=redis)
+    for i in range(5):
+        first(f"a{i}")
+        second(f"b{i}")
+    first.close()
+    second.close()
+
+    assert len(redis.data[log_key(5)]) == 10  # Live viewers of the workflow still see both runs
+    assert [record["message"] for _, record in redis.data[run_log_key("run-a")]] == [f"a{i}" for i in range(5)]
+
+    page, after = read_run_log("run-b", limit=2, client=redis)
+    messages = [record["message"] for _, record in page]
+    while after:
+        page, after = read_run_log("run-b", after, limit=2, client=redis)
+        messages += [record["message"] for _, record in page]
+    assert messages == [f"b{i}" for i in range(5)]
+
+
+def test_a_run_is_only_queued_once_by_concurrent_resumes(monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add(WorkflowRunDB(id="run-x", workflow_id="5", status="failed", created_at=datetime(2025, 1, 1)))
+    session.commit()
+    queued = []
+    monkeypatch.setattr(workflows.execute_run_task, "delay", lambda run_id, **kwargs: queued.append(run_id))
+    monkeypatch.setattr(workflows, "log_to_redis", lambda *args, **kwargs: None)
+    app.dependency_overrides[workflows.get_db] = lambda: session
+    try:
+        client = TestClient(app)
+        first = client.post("/workflows/runs/run-x/resume")
+        second = client.post("/workflows/runs/run-x/resume")  # Lost the race: the run is already queued
+    finally:
+        app.dependency_overrides.pop(workflows.get_db, None)
+        session.close()
+
+    assert first.status_code == 200 and first.json()["status"] == "queued"
+    assert second.status_code == 409 and "queued" in second.json()["detail"]
+    assert queued == ["run-x"]
+
+
+def test_malformed_log_offset_is_a_bad_request():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add(WorkflowRunDB(id="run-x", workflow_id="5", status="succeeded", created_at=datetime(2025, 1, 1)))
+    session.commit()
+    app.dependency_overrides[workflows.get_db] = lambda: session
+    try:
+        response = TestClient(app).get("/workflows/runs/run-x/log", params={"after": "not-an-id"})
+    finally:
+        app.dependency_overrides.pop(workflows.get_db, None)
+        session.close()
+
+    assert response.status_code == 400  # Rejected before Redis is asked
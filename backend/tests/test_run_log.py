@@ -0,0 +1,43 @@
+from backend.benchmarks.fakes import FakeRedis
+from backend.services import run_log
+from backend.services.run_log import RunLogger, log_key
+
+
+class CountingRedis(FakeRedis):
+    def __init__(self):
+        super().__init__()
+        self.round_trips = 0
+
+    def pipeline(self, transaction=True):
+        self.round_trips += 1
+        return super().pipeline(transaction)
+
+
+def test_run_log_records_are_buffered_and_written_in_batches():
+    redis = CountingRedis()
+    log = RunLogger(42, run_id="run-1", client=redis, flush_interval=60, batch_size=50)
+    for i in range(120):
+        log(f"line {i}")
+    log("Workflow failed", step="s2", level="error")
+    log.close()
+
+    entries = redis.data[log_key(42)]
+    assert [record["message"] for _, record in entries] == [f"line {i}" for i in range(120)] + ["Workflow failed"]
+    assert redis.round_trips < 10  # Pipelined batches, not one round trip per line
+    assert entries[-1][1]["run_id"] == "run-1"
+    assert entries[-1][1]["step"] == "s2" and entries[-1][1]["level"] == "error"
+
+
+def test_large_messages_are_truncated_and_streams_are_capped(monkeypatch):
+    monkeypatch.setattr(run_log, "RUN_LOG_MAXLEN", 10)
+    redis = FakeRedis()
+    log = RunLogger(42, client=redis, flush_interval=0.01)
+    log("x" * 100000)
+    for i in range(20):
+        log(f"line {i}")
+    log.close()
+
+    entries = redis.data[log_key(42)]
+    assert len(entries) == 10
+    big = run_log.log_record("x" * 100000)
+    assert len(big["message"]) == run_log.RUN_LOG_MAX_MESSAGE + 1 and big["size"] == "100000"
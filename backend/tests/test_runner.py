@@ -0,0 +1,159 @@
+import json
+import sys
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from backend.models.db import Base, WorkflowRunDB
+from backend.services import runner
+from backend.services.plan import PlanCache
+from backend.services.runner import create_run, execute_run, resume_waiting_runs, run_to_dict
+from backend.tests.fake_llm import FakeLLMBackend
+
+
+class FakeLogger:
+    def __init__(self, workflow_id, run_id=None):
+        self.lines = []
+
+    def __call__(self, message, step=None, level="info"):
+        self.lines.append(message)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def session_factory(monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(runner, "SessionLocal", factory)
+    monkeypatch.setattr(runner, "RunLogger", FakeLogger)
+    monkeypatch.setattr(runner, "log_to_redis", lambda *args, **kwargs: None)
+    monkeypatch.setattr(runner, "plan_cache", PlanCache())
+    return factory
+
+
+def _workflow():
+    steps = [{"id": step_id, "type": "action", "service": "fake"} for step_id in ("a", "b")]
+    return json.dumps({"workflow": steps, "edges": [{"source": "a", "target": "b"}]})
+
+
+def test_run_fails_then_resumes_from_its_checkpoint(session_factory, monkeypatch):
+    calls = []
+    fail = {"b": True}
+
+    def handler(step, context, tokens):
+        calls.append(step["id"])
+        if fail.get(step["id"]):
+            raise RuntimeError("boom")
+        return {"from": step["id"]}
+
+    monkeypatch.setattr(runner, "STEP_REGISTRY", {("action", "fake"): handler})
+    db = session_factory()
+    run_id = create_run(db, "wf-1", _workflow()).id
+    db.close()
+
+    assert execute_run(run_id) == "failed"
+    db = session_factory()
+    run = run_to_dict(db.query(WorkflowRunDB).filter_by(id=run_id).one())
+    db.close()
+    assert run["steps"] == {"a": "completed", "b": "failed"}
+    assert run["context"]["a_result"] == {"from": "a"}
+    assert "boom" in run["error"] and run["finished_at"] and run["duration_ms"] is not None
+
+    fail["b"] = False
+    assert execute_run(run_id, resume=True) == "succeeded"
+    assert calls == ["a", "b", "b"]  # The completed step is not run again
+    db = session_factory()
+    run = run_to_dict(db.query(WorkflowRunDB).filter_by(id=run_id).one())
+    db.close()
+    assert run["status"] == "succeeded" and run["error"] is None
+    assert run["context"]["b_result"] == {"from": "b"}
+    assert set(run["step_timings"]) == {"a", "b"}
+
+
+def test_unexpected_errors_fail_the_run(session_factory, monkeypatch):
+    monkeypatch.setattr(runner, "STEP_REGISTRY", {("action", "fake"): lambda step, context, tokens: "ok"})
+
+    async def broken_plan(*args, **kwargs):
+        raise OSError("disk I/O error")
+
+    monkeypatch.setattr(runner, "execute_plan", broken_plan)
+    db = session_factory()
+    run_id = create_run(db, "wf-1", _workflow()).id
+    db.close()
+
+    assert execute_run(run_id) == "failed"
+    db = session_factory()
+    run = db.query(WorkflowRunDB).filter_by(id=run_id).one()
+    assert run.status == "failed" and "disk I/O error" in run.error and run.finished_at
+    db.close()
+
+
+def test_offline_batch_step_waits_without_blocking_and_resumes(session_factory, monkeypatch):
+    llm_batch = sys.modules[runner.collect_batches.__module__]  # The module the runner actually uses
+    backend = FakeLLMBackend(batch_polls=1)
+    coalescer = llm_batch.Coalescer(backend, offline_window=0.01)
+    monkeypatch.setattr(llm_batch, "get_coalescer", lambda: coalescer)
+    calls = []
+
+    async def handler(step, context, tokens):
+        calls.append(step["id"])
+        if step["id"] == "a":
+            return "mail"
+        return await coalescer.submit("Summarize:", context["a_result"], mode="offline",
+                                      answers=tokens.get("batch_answers"))
+
+    monkeypatch.setattr(runner, "STEP_REGISTRY", {("action", "fake"): handler})
+    db = session_factory()
+    run_id = create_run(db, "wf-1", _workflow()).id
+    db.close()
+
+    assert execute_run(run_id) == "waiting"  # Returns right after submitting the job
+    db = session_factory()
+    run = db.query(WorkflowRunDB).filter_by(id=run_id).one()
+    assert run_to_dict(run)["steps"] == {"a": "completed", "b": "waiting"}
+    assert run.pending_batches_json and run.finished_at is None
+    db.close()
+
+    assert resume_waiting_runs() == 0  # The job is still running
+    assert resume_waiting_runs() == 1
+    db = session_factory()
+    run = db.query(WorkflowRunDB).filter_by(id=run_id).one()
+    assert run.status == "succeeded" and run.pending_batches_json is None
+    assert run_to_dict(run)["context"]["b_result"] == "ANSWER(mail)"
+    db.close()
+    assert calls == ["a", "b", "b"] and len(backend.jobs) == 1
+
+
+def test_step_that_waits_on_two_batch_rounds_finishes(session_factory, monkeypatch):
+    llm_batch = sys.modules[runner.collect_batches.__module__]
+    backend = FakeLLMBackend(batch_polls=0)
+    coalescer = llm_batch.Coalescer(backend, offline_window=0.01)
+    monkeypatch.setattr(llm_batch, "get_coalescer", lambda: coalescer)
+
+    async def handler(step, context, tokens):
+        if step["id"] == "a":
+            return "mail"
+        # Like map_reduce: the second prompt needs the answer to the first
+        answers = tokens.get("batch_answers")
+        notes = await coalescer.submit("Condense:", context["a_result"], mode="offline", answers=answers)
+        return await coalescer.submit("Summarize:", notes, mode="offline", answers=answers)
+
+    monkeypatch.setattr(runner, "STEP_REGISTRY", {("action", "fake"): handler})
+    db = session_factory()
+    run_id = create_run(db, "wf-1", _workflow()).id
+    db.close()
+
+    assert execute_run(run_id) == "waiting"
+    assert resume_waiting_runs() == 0  # Condensed, now waiting on the summary job
+    assert resume_waiting_runs() == 1
+    db = session_factory()
+    run = db.query(WorkflowRunDB).filter_by(id=run_id).one()
+    assert run.status == "succeeded" and run.batch_answers_json is None
+    assert run_to_dict(run)["context"]["b_result"] == "ANSWER(ANSWER(mail))"
+    db.close()
+    assert len(backend.jobs) == 2
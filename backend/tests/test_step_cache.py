@@ -0,0 +1,145 @@
+import asyncio
+import itertools
+import json
+import sys
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from backend.benchmarks.fakes import FakeRedis
+from backend.main import app, workflows  # The router module the app actually mounted
+from backend.models.db import Base, UserDB, WorkflowDB
+from backend.services.executor import execute_workflow
+from backend.services import step_cache, step_registry
+from backend.services.step_cache import cache_key, cache_stats, cached_step, get_cached, set_cached
+
+# step_registry decorates its handlers with the step_cache module it imported itself
+registry_cache = sys.modules[step_registry.cached_step.__module__]
+
+
+class TTLRedis(FakeRedis):
+    """FakeRedis that remembers the expiry each key was set with."""
+
+    def __init__(self):
+        super().__init__()
+        self.ttls = {}
+
+    def set(self, key, value, ex=None):
+        self.ttls[key] = ex
+        return super().set(key, value, ex)
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    client = TTLRedis()
+    clock = itertools.count(1)
+    for module in {step_cache, registry_cache}:
+        monkeypatch.setattr(module, "r", client)
+        monkeypatch.setattr(module, "time", SimpleNamespace(time=lambda: next(clock)))  # Distinct access times
+    return client
+
+
+def test_hit_and_miss_are_counted(redis):
+    key = cache_key("openai", "summarize", {"prompt": "p"}, ["mail"])
+    assert get_cached("openai", "summarize", key) == (False, None)
+    set_cached(key, {"summary": "short"}, ttl=60)
+    assert get_cached("openai", "summarize", key) == (True, {"summary": "short"})
+    assert get_cached("openai", "summarize", key) == (True, {"summary": "short"})
+
+    stats = cache_stats()
+    assert stats["entries"] == 1
+    assert stats["counters"] == {"openai:summarize:misses": 1, "openai:summarize:hits": 2}
+    assert redis.ttls[step_cache.ENTRY_KEY.format(key)] == 60
+
+
+def test_least_recently_used_entry_is_evicted(redis, monkeypatch):
+    monkeypatch.setattr(step_cache, "STEP_CACHE_MAX_ENTRIES", 2)
+    set_cached("a", 1)
+    set_cached("b", 2)
+    assert get_cached("s", "a", "a") == (True, 1)  # "b" is now the least recently used
+    set_cached("c", 3)
+
+    assert get_cached("s", "b", "b") == (False, None)
+    assert get_cached("s", "a", "a") == (True, 1)
+    assert get_cached("s", "c", "c") == (True, 3)
+    assert cache_stats()["entries"] == 2
+
+
+def test_steps_can_opt_out_and_override_the_ttl(redis):
+    calls = []
+
+    @cached_step(ttl=100)
+    def handler(step, context, tokens):
+        calls.append(step["id"])
+        return f"result {len(calls)}"
+
+    context = {"trigger_data": ["mail"]}
+    step = {"id": "s1", "service": "openai", "action": "run", "cache_ttl": 30}
+    assert handler(step, context, {}) == handler(dict(step, id="s2"), context, {}) == "result 1"
+    assert list(redis.ttls.values()) == [30]
+
+    redis.data.clear()
+    opted_out = {"id": "s3", "service": "openai", "action": "run", "cache": False}
+    assert handler(opted_out, context, {}) == "result 2"
+    assert handler(opted_out, context, {}) == "result 3"
+    assert redis.data == {}  # Not even a miss is recorded
+
+
+def test_openai_step_results_are_cached(redis, monkeypatch):
+    prompts = []
+
+    class RecordingCoalescer:
+        async def submit(self, instruction, text, **kwargs):
+            prompts.append(text)
+            return f"summary {len(prompts)}"
+
+    monkeypatch.setattr(step_registry, "get_coalescer", lambda: RecordingCoalescer())
+    step = {"id": "s1", "type": "action", "service": "openai", "prompt": "Summarize:"}
+    context = {"trigger_data": [{"subject": "Lunch", "from": "alice@example.com", "body": "Noon?"}]}
+
+    async def run_twice():
+        return [await step_registry.handle_openai_action(step, context, {}) for _ in range(2)]
+
+    assert asyncio.run(run_twice()) == ["summary 1", "summary 1"]
+    assert len(prompts) == 1
+    assert cache_stats()["counters"] == {"openai:None:misses": 1, "openai:None:hits": 1}
+
+
+def test_saved_workflows_keep_their_cache_settings(redis):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    db.add(UserDB(username="ada@example.com", password="pw"))
+    db.commit()
+    steps = [
+        {"id": "uncached", "type": "action", "service": "openai", "action": "summarize", "cache": False},
+        {"id": "short", "type": "action", "service": "openai", "action": "translate", "cache_ttl": 30},
+    ]
+    app.dependency_overrides[workflows.get_db] = lambda: db
+    try:
+        response = TestClient(app).post("/workflows/save", json={
+            "name": "cached", "workflow": steps, "edges": [], "owner": "ada@example.com",
+        })
+    finally:
+        app.dependency_overrides.pop(workflows.get_db, None)
+    assert response.status_code == 200
+    stored = json.loads(db.query(WorkflowDB.workflow_json).scalar())
+    db.close()
+
+    calls = []
+
+    @cached_step(ttl=100)
+    def handler(step, context, tokens):
+        calls.append(step["id"])
+        return f"{step['id']} result"
+
+    for _ in range(2):
+        asyncio.run(execute_workflow(stored["workflow"], stored["edges"], {}, {("action", "openai"): handler},
+                                     context={"trigger_data": ["mail"]}, log=lambda *args, **kwargs: None))
+
+    assert calls == ["uncached", "short", "uncached"]  # The opted-out step ran both times
+    assert list(redis.ttls.values()) == [30]
@@ -0,0 +1,75 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from backend.services import token_manager as tm
+
+
+@pytest.fixture
+def setup():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    tm.UserDB.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    refreshes = []
+
+    def refresh(refresh_token):
+        refreshes.append(refresh_token)
+        time.sleep(0.05)
+        return {"access_token": f"access-{len(refreshes)}", "expires_in": 3600}
+
+    manager = tm.TokenManager(session_factory=Session, margin=timedelta(minutes=5))
+    manager.register("gmail", refresh, "gmail_access_token", "gmail_refresh_token", "gmail_token_expiry")
+
+    def make_user(expires_in):
+        db = Session()
+        user = tm.UserDB(username="alice", gmail_access_token="access-0", gmail_refresh_token="refresh",
+                         gmail_token_expiry=datetime.utcnow() + timedelta(seconds=expires_in))
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+        db.expunge(user)
+        db.close()
+        return user
+
+    return manager, refreshes, make_user, Session
+
+
+def test_concurrent_callers_share_one_refresh_and_it_is_persisted(setup):
+    manager, refreshes, make_user, Session = setup
+    user = make_user(-60)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(manager.get_token("gmail", user))) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["access-1"] * 10
+    assert refreshes == ["refresh"]
+    saved = Session().query(tm.UserDB).filter_by(id=user.id).first()
+    assert saved.gmail_access_token == "access-1"
+    assert saved.gmail_token_expiry > datetime.utcnow() + timedelta(minutes=50)
+    assert manager.get_token("gmail", user) == "access-1" and len(refreshes) == 1
+
+
+def test_valid_token_is_served_without_refresh(setup):
+    manager, refreshes, make_user, _ = setup
+    user = make_user(3600)
+    assert manager.get_token("gmail", user) == "access-0"
+    assert refreshes == []
+
+
+def test_token_close_to_expiry_is_refreshed_in_background(setup):
+    manager, refreshes, make_user, _ = setup
+    user = make_user(60)  # Inside the 5 minute margin
+    assert manager.get_token("gmail", user) == "access-0"  # No waiting on the refresh
+    deadline = time.time() + 2
+    while manager.get_token("gmail", user) != "access-1" and time.time() < deadline:
+        time.sleep(0.01)
+    assert manager.get_token("gmail", user) == "access-1"
+    assert refreshes == ["refresh"]
@@ -0,0 +1,61 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from backend.main import app, workflows  # The router module the app actually mounted
+from backend.models.db import Base, UserDB, WorkflowDB
+from backend.services.workflow_store import list_workflows
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    session = Session()
+    user = UserDB(username="ada@example.com", password="pw")
+    session.add(user)
+    session.commit()
+    for i in range(5):
+        definition = {"name": f"wf{i}", "workflow": [{"id": f"s{n}"} for n in range(i + 1)], "edges": []}
+        session.add(WorkflowDB(name=f"wf{i}", workflow_json=json.dumps(definition), owner_id=user.id,
+                               step_count=i + 1))
+    session.commit()
+    yield session
+    session.close()
+
+
+def test_workflow_summaries_are_paged_without_writes(db):
+    user_id = db.query(UserDB.id).scalar()
+    pages, cursor = [], None
+    while True:
+        page, cursor = list_workflows(db, user_id, limit=2, cursor=cursor)
+        pages.append(page)
+        if cursor is None:
+            break
+
+    assert [[wf["name"] for wf in page] for page in pages] == [["wf0", "wf1"], ["wf2", "wf3"], ["wf4"]]
+    assert [wf["step_count"] for page in pages for wf in page] == [1, 2, 3, 4, 5]
+    assert set(pages[0][0]) == {"id", "name", "step_count", "version", "updated_at"}
+    # Listing never writes: the version keys the plan cache and updated_at is shown to users
+    assert db.query(WorkflowDB.version).filter_by(name="wf0").scalar() == 1
+
+
+def test_list_endpoint_returns_summaries_and_definitions_on_demand(db):
+    app.dependency_overrides[workflows.get_db] = lambda: db
+    try:
+        client = TestClient(app)
+        listing = client.get("/workflows/user/ada@example.com/list", params={"limit": 3}).json()
+        assert len(listing["workflows"]) == 3 and listing["next_cursor"]
+        assert "workflow" not in listing["workflows"][0]
+
+        first = listing["workflows"][0]
+        definition = client.get(f"/workflows/definition/{first['id']}").json()
+        assert definition["id"] == first["id"] and definition["workflow"] == [{"id": "s0"}]
+        assert client.get("/workflows/user/nobody/list").status_code == 404
+    finally:
+        app.dependency_overrides.pop(workflows.get_db, None)
@@ -294,11 +294,26 @@ const handleGmailSignOut = () => {
   useEffect(() => {
     if (!props.currentWorkflowId) return;
     setLogOutput([]); // Clear previous logs
-    wsRef.current = new WebSocket(`ws://localhost:8000/workflows/ws/workflow_log/${props.currentWorkflowId}`);
-    wsRef.current.onmessage = (event) => {
-      setLogOutput((prev) => [...prev, event.data]);
+    let lastId: string | null = null;
+    let closed = false;
+    let retry: ReturnType<typeof setTimeout>;
+    const connect = () => {
+      // After a dropped connection, resume from the last line we received
+      const query = lastId ? `?after=${encodeURIComponent(lastId)}` : '';
+      wsRef.current = new WebSocket(`ws://localhost:8000/workflows/ws/workflow_log/${props.currentWorkflowId}${query}`);
+      wsRef.current.onmessage = (event) => {
+        const entry = JSON.parse(event.data);
+        lastId = entry.id;
+        setLogOutput((prev) => [...prev, entry.message]);
+      };
+      wsRef.current.onclose = () => {
+        if (!closed) retry = setTimeout(connect, 1000);
+      };
     };
+    connect();
     return () => {
+      closed = true;
+      clearTimeout(retry);
       wsRef.current?.close();
     };
   }, [props.currentWorkflowId]);
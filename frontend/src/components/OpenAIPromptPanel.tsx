@@ -25,10 +25,37 @@ function OpenAIPromptPanel({ node, setNodes }: { node: any, setNodes?: any }) {
       const res = await fetch('http://localhost:8000/workflows/tools/openai/generate', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ prompt }),
+        body: JSON.stringify({ prompt, stream: true }),
       });
-      const data = await res.json();
-      setOutput(data.result || data.error || 'No response');
+      if (!res.body) {
+        const data = await res.json();
+        setOutput(data.result || data.error || 'No response');
+      } else {
+        // Server-sent events: show each "delta" as it arrives, "done"/"error" end the stream
+        const reader = res.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let text = '';
+        while (true) {
+          const { done, value } = await reader.read();
+          if (done) break;
+          buffer += decoder.decode(value, { stream: true });
+          const events = buffer.split('\n\n');
+          buffer = events.pop() || '';
+          for (const block of events) {
+            const event = block.match(/^event: (.*)$/m)?.[1];
+            const data = JSON.parse(block.match(/^data: (.*)$/m)?.[1] || '{}');
+            if (event === 'delta') {
+              text += data.delta;
+              setOutput(text);
+            } else if (event === 'done') {
+              setOutput(data.result || 'No response');
+            } else if (event === 'error') {
+              setOutput(data.error);
+            }
+          }
+        }
+      }
     } catch (err) {
       setOutput('Error contacting backend');
     }
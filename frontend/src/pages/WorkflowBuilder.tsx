@@ -20,14 +20,23 @@ const WorkflowBuilder = ({ username, mode, setMode }: { username: string, mode:
    const [currentWorkflow, setCurrentWorkflow] = useState<any | null>(null);
    const [currentWorkflowId, setCurrentWorkflowId] = useState<string | null>(null);
 
-  // Fetch saved workflows for this user
+  // Fetch saved workflow summaries (id, name, step_count, updated_at) for this user, page by page
+  const fetchWorkflowList = async () => {
+    const workflows: any[] = [];
+    let cursor: string | null = null;
+    do {
+      const query: string = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+      const res: Response = await fetch(`http://localhost:8000/workflows/user/${username}/list${query}`);
+      const data = await res.json();
+      workflows.push(...(Array.isArray(data.workflows) ? data.workflows : []));
+      cursor = data.next_cursor || null;
+    } while (cursor);
+    return workflows;
+  };
+
 useEffect(() => {
-  fetch(`http://localhost:8000/workflows/user/${username}`)
-    .then(res => res.json())
-    .then(data => {
-      console.log("[FRONTEND] Received workflows from backend:", data); // <-- LO
-      setSavedWorkflows(Array.isArray(data) ? data : []); // <-- Ensure array
-    })
+  fetchWorkflowList()
+    .then(workflows => setSavedWorkflows(workflows))
     .catch(err => {
       console.error("Failed to load workflows", err);
       setSavedWorkflows([]); // fallback to empty array on error
@@ -49,13 +58,10 @@ useEffect(() => {
       const data = await res.json();
       alert(`✅ Saved: ${data.message}`);
 
-      // Reload workflows from backend and set the latest as current
-      const wfRes = await fetch(`http://localhost:8000/workflows/user/${username}`);
-      const wfList = await wfRes.json();
-      setSavedWorkflows(Array.isArray(wfList) ? wfList : []);
-      // Set the last workflow (most recently saved) as current
-      if (Array.isArray(wfList) && wfList.length > 0) {
-        setCurrentWorkflow(wfList[wfList.length - 1]);
+      // Add the new workflow to the list and make it current
+      if (data.workflow) {
+        setSavedWorkflows(prev => [...prev, data.workflow]);
+        setCurrentWorkflow(data.workflow);
       }
     } catch (err) {
       alert("❌ Failed to save workflow");
@@ -103,7 +109,10 @@ useEffect(() => {
     }
   };
 
-  const loadWorkflow = (wf: any) => {
+  const loadWorkflow = async (summary: any) => {
+    // The list only has summaries, fetch the full definition on demand
+    const res = await fetch(`http://localhost:8000/workflows/definition/${summary.id}`);
+    const wf = await res.json();
     console.log("[FRONTEND] Loading workflow to canvas:", wf); // <-- LOG
       let parsedWorkflow = wf;
   if (typeof wf.workflow === "string") {
@@ -65,13 +65,64 @@ import re
 import base64
 import re
 import openai
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+
+# Summaries are memoized per email text so repeated clicks don't re-call OpenAI
+SUMMARY_CACHE_TTL = 6 * 3600  # seconds
+SUMMARY_CACHE_MAX_ENTRIES = 500
+_summary_cache = OrderedDict()  # sha256(text) -> (expires_at, summary)
+
+
+_openai_client = None  # one pooled client for the whole process, not one per summary
+
+
+def get_openai_client():
+    global _openai_client
+    if _openai_client is None:
+        import httpx
+        from openai import OpenAI
+        _openai_client = OpenAI(
+            api_key=app.config["OPENAI_API_KEY"],
+            http_client=httpx.Client(
+                limits=httpx.Limits(max_connections=10, max_keepalive_connections=10),
+                timeout=httpx.Timeout(60, connect=5),
+            ),
+        )
+    return _openai_client
+
+
+SUMMARY_PROMPT = "Summarize the following , point out who/when/what to do , make it in a format that  sounds like human speak. \n for example a summary can be :Susan just shared the Annie scene video from show :"
+
+
+def _cached_summary(key):
+    cached = _summary_cache.get(key)
+    if cached and cached[0] > time.time():
+        _summary_cache.move_to_end(key)
+        return cached[1]
+    return None
+
+
+def _store_summary(key, summary):
+    _summary_cache[key] = (time.time() + SUMMARY_CACHE_TTL, summary)
+    _summary_cache.move_to_end(key)
+    while len(_summary_cache) > SUMMARY_CACHE_MAX_ENTRIES:
+        _summary_cache.popitem(last=False)
 
 
 def smart_summarize(text):
+    key = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    cached = _cached_summary(key)
+    if cached is not None:
+        return cached
 
-    from openai import OpenAI
-    client = OpenAI(api_key=app.config["OPENAI_API_KEY"])
-    prompt = f"Summarize the following , point out who/when/what to do , make it in a format that  sounds like human speak. \n for example a summary can be :Susan just shared the Annie scene video from show :\n\n{text}"
+    client = get_openai_client()
+    prompt = f"{SUMMARY_PROMPT}\n\n{text}"
     response = client.chat.completions.create(
         model="gpt-4.1-mini",
           messages=[{"role": "user", "content": prompt}],
@@ -87,7 +138,40 @@ def smart_summarize(text):
 #         temperature=0.6,
 #         max_tokens=100
 #     )
-    return response.choices[0].message.content.strip()
+    summary = response.choices[0].message.content.strip()
+    _store_summary(key, summary)
+    return summary
+
+
+def smart_summarize_many(texts):
+    """
+    Summaries for several emails from one chat completion instead of one call per
+    email. Cached texts are skipped; if the answer can't be split per email, the
+    remaining ones are summarized one at a time.
+    """
+    keys = [hashlib.sha256(text.encode("utf-8")).hexdigest() for text in texts]
+    summaries = [_cached_summary(key) for key in keys]
+    missing = [i for i, summary in enumerate(summaries) if summary is None]
+    if len(missing) > 1:
+        items = "\n\n".join(f"### Email {n}\n{texts[i]}" for n, i in enumerate(missing, 1))
+        prompt = (f"{SUMMARY_PROMPT}\n\nDo this for each of the {len(missing)} emails below separately. "
+                  f"Return a JSON object {{\"summaries\": [...]}} with exactly {len(missing)} strings, in order.\n\n{items}")
+        try:
+            response = get_openai_client().chat.completions.create(
+                model="gpt-4.1-mini",
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.6,
+                max_tokens=300 * len(missing),
+                response_format={"type": "json_object"},
+            )
+            answers = json.loads(response.choices[0].message.content)["summaries"]
+            if len(answers) == len(missing):
+                for i, answer in zip(missing, answers):
+                    summaries[i] = str(answer).strip()
+                    _store_summary(keys[i], summaries[i])
+        except Exception as e:
+            print("Batched summary failed, summarizing one by one:", e)
+    return [summary if summary is not None else smart_summarize(text) for text, summary in zip(texts, summaries)]
 
 from gtts import gTTS
 import uuid
@@ -109,6 +193,31 @@ def generate_voice(text, lang="en"):
 
     return f"/static/audio/{filename}"  # URL path for HTML <audio>
 
+GMAIL_FETCH_CONCURRENCY = 10
+_gmail_http = requests.Session()  # keep-alive pool shared by the fetch threads
+_gmail_http.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=GMAIL_FETCH_CONCURRENCY))
+
+
+def fetch_message_details(message_ids, access_token):
+    """
+    Yields message detail responses in order. Details are fetched GMAIL_FETCH_CONCURRENCY
+    at a time, so stopping early (after 10 clean summaries) doesn't download the rest.
+    """
+    headers = {"Authorization": f"Bearer {access_token}"}
+
+    def fetch(msg_id):
+        return _gmail_http.get(
+            f"https://gmail.googleapis.com/gmail/v1/users/me/messages/{msg_id}",
+            headers=headers,
+            params={"format": "full"},
+            timeout=(5, 30),
+        )
+
+    with ThreadPoolExecutor(max_workers=GMAIL_FETCH_CONCURRENCY) as pool:
+        for start in range(0, len(message_ids), GMAIL_FETCH_CONCURRENCY):
+            yield from pool.map(fetch, message_ids[start:start + GMAIL_FETCH_CONCURRENCY])
+
+
 @app.route("/summarize-emails", methods=["POST"])
 def summarize_emails():
     if not google.authorized:
@@ -128,9 +237,7 @@ def summarize_emails():
     messages = resp.json().get("messages", [])
     summaries = []
 
-    for msg in messages:
-        msg_id = msg["id"]
-        msg_detail = google.get(f"https://gmail.googleapis.com/gmail/v1/users/me/messages/{msg_id}?format=full")
+    for msg_detail in fetch_message_details([msg["id"] for msg in messages], google.token["access_token"]):
         if not msg_detail.ok:
             continue
 
@@ -177,14 +284,13 @@ def summarize_emails():
 
         
         raw_summary = f"From: {sender}, Subject: {subject}. {body_preview}"
-        ai_summary = smart_summarize(raw_summary)
 
      
         summaries.append({
             "subject": subject,
             "body": body_preview,
             "date": internal_ts,
-             "summary": ai_summary
+             "raw": raw_summary
         })
 
         
@@ -193,6 +299,10 @@ def summarize_emails():
         if len(summaries) >= 10:
             break
 
+    # One OpenAI request for all the clean emails instead of one per email
+    for item, ai_summary in zip(summaries, smart_summarize_many([item.pop("raw") for item in summaries])):
+        item["summary"] = ai_summary
+
     # Handle empty result
     if not summaries:
         summaries = ["✅ all promotional emails found. You're all clear!"]